@@ -87,8 +87,7 @@ def dump_fracture_info(self, filename):
             name of file
     """
     self.print_log(f"--> Writing {filename}")
-    connections = np.genfromtxt("dfnGen_output/fracture_info.dat",
-                                skip_header=1)[:, 0].astype(int)
+    connections = self.get_fracture_properties().connections
     with open(filename, "w+") as fp:
         fp.write("num_connections perm aperture\n")
         for i in range(self.num_frac):
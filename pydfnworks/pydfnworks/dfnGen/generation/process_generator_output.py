@@ -2,6 +2,9 @@
 import numpy as np 
 import os 
 import pandas as pd 
+from collections.abc import Mapping
+
+from pydfnworks.general.dfngen_output_cache import load_dfngen_file
 
 def parse_params_file(self, quiet=False):
     """ Reads params.txt file from DFNGen and parses information
@@ -91,18 +94,17 @@ def gather_dfn_gen_output(self):
     ------
         Both fractures in the final network and those removed due to being isolated are included in the list. 
 
+        Files are read through load_dfngen_file, so after the first call the parsed arrays come from the binary cache dfnGen_output/dfnGen_output_cache.h5.
+
     """
     self.print_log("--> Parsing dfnWorks output and adding to object")
     self.parse_params_file(quiet=False)
 
     ## load radii
-    data = np.genfromtxt('dfnGen_output/radii_Final.dat', skip_header=2)
+    data = load_dfngen_file('dfnGen_output/radii_Final.dat')
     ## populate radius array
     self.radii = np.zeros((self.num_frac, 3))
     # First Column is x, second is y, 3rd is max
-    if self.num_frac == 1:
-        data = np.array([data])
-    
     self.radii[:, :2] = data[:, :2]
     for i in range(self.num_frac):
         self.radii[i, 2] = max(self.radii[i, 0], self.radii[i, 1])
@@ -111,24 +113,14 @@ def gather_dfn_gen_output(self):
     self.families = data[:, 2].astype(int)
 
     ## load surface area
-    self.surface_area = np.genfromtxt('dfnGen_output/surface_area_Final.dat', skip_header=1)
+    self.surface_area = load_dfngen_file('dfnGen_output/surface_area_Final.dat')
     ## load normal vectors
-    self.normal_vectors = np.genfromtxt('dfnGen_output/normal_vectors.dat')
+    self.normal_vectors = load_dfngen_file('dfnGen_output/normal_vectors.dat')
     # Get fracture centers
-    centers = []
-    with open('dfnGen_output/translations.dat', "r") as fp:
-        fp.readline()  # header
-        for i, line in enumerate(fp.readlines()):
-            if "R" not in line:
-                line = line.split()
-                centers.append(
-                    [float(line[0]),
-                     float(line[1]),
-                     float(line[2])])
-    self.centers = np.array(centers)
+    self.centers = load_dfngen_file('dfnGen_output/translations.dat')
 
     # Grab Polygon information
-    self.poly_info = np.genfromtxt('poly_info.dat')
+    self.poly_info = load_dfngen_file('poly_info.dat')
 
     # write polygon information to class
     if self.store_polygon_data == True:
@@ -148,10 +140,10 @@ def gather_dfn_gen_output(self):
         self.family.append(idx)
 
     # get fracture_info
-    self.fracture_info = np.genfromtxt('dfnGen_output/fracture_info.dat', skip_header = 1)
+    self.fracture_info = load_dfngen_file('dfnGen_output/fracture_info.dat')
     
     # get intersection_list
-    self.intersection_list = np.genfromtxt('dfnGen_output/intersection_list.dat', skip_header = 1)
+    self.intersection_list = load_dfngen_file('dfnGen_output/intersection_list.dat')
     
     # get boundary_files
     self.back = read_boundaries('dfnGen_output/back.dat')
@@ -159,7 +151,7 @@ def gather_dfn_gen_output(self):
     self.left = read_boundaries('dfnGen_output/left.dat')
     self.right = read_boundaries('dfnGen_output/right.dat')
     self.top = read_boundaries('dfnGen_output/top.dat')
-    self.bottom = read_boundaries('dfnGen/bottom.dat')
+    self.bottom = read_boundaries('dfnGen_output/bottom.dat')
     
     self.compute_fracture_p21()
 
@@ -179,15 +171,10 @@ def read_boundaries(file_path):
     '''
 
     if os.path.isfile(file_path) and os.path.getsize(file_path) > 0:
-        data = np.genfromtxt(file_path)
+        data = load_dfngen_file(file_path)
     else:
         data = np.array([])
 
-    try:
-        array_length = len(data)
-    except:
-        data = np.array([data])
-
     return data
 
 
@@ -338,9 +325,58 @@ def assign_hydraulic_properties(self):
     # self.dump_hydraulic_values()
     self.print_log("--> Assign hydraulic properties: Complete ")
 
+class PolygonVertices(Mapping):
+    """ Read only dictionary view of the polygon vertices, keyed fracture-1, ..., fracture-N
+
+    Attributes
+    ----------
+        vertices : numpy array
+            (total number of vertices, 3) array, polygons stored one after the other
+
+        offsets : numpy array
+            vertices of fracture i (1-based) are rows offsets[i-1] to offsets[i] - 1 of vertices
+
+    Notes
+    -----
+        self.polygons[f'fracture-{i}'] returns a view of the rows of fracture i, so the vertices are stored once in a single array.
+    """
+
+    def __init__(self, vertices, offsets):
+        self.vertices = vertices
+        self.offsets = offsets
+
+    @property
+    def num_vertices(self):
+        return np.diff(self.offsets)
+
+    def _index(self, key):
+        if isinstance(key, str) and key.startswith('fracture-'):
+            i = key[len('fracture-'):]
+            if i.isdigit() and 0 < int(i) < len(self.offsets):
+                return int(i)
+        raise KeyError(key)
+
+    def __getitem__(self, key):
+        i = self._index(key)
+        return self.vertices[self.offsets[i - 1]:self.offsets[i]]
+
+    def __contains__(self, key):
+        try:
+            self._index(key)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        return (f'fracture-{i}' for i in range(1, len(self.offsets)))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
 def grab_polygon_data(self):
-    '''If flag self.store_polygon_data is set to True, the information stored in polygon.dat is written to a dictionary self.polygons. 
-    To access the points that define an individual polygon, call self.polygons[f'poly{i}'] where i is a number between 1 and the number of defined polygons. This returns an array of coordinates in the format np.array([x1,y1,z1],[x2,y2,z2],...[xn,yn,zn])
+    '''If flag self.store_polygon_data is set to True, the information stored in polygon.dat is written to self.polygons. 
+    To access the points that define an individual polygon, call self.polygons[f'fracture-{i}'] where i is a number between 1 and the number of defined polygons. This returns an array of coordinates in the format np.array([x1,y1,z1],[x2,y2,z2],...[xn,yn,zn])
 
     Parameters
     -----------
@@ -352,63 +388,42 @@ def grab_polygon_data(self):
 
     Notes
     ------
-        None
+        self.polygons is a PolygonVertices object. The vertices of all polygons are in the flat array self.polygons.vertices, and self.polygons.offsets gives the rows of each polygon. dict(self.polygons) gives a plain dictionary of the same views.
         '''
 
     self.print_log("--> Loading Polygon information onto DFN object")
-    self.polygons = {}
-
-    polygon_data = np.genfromtxt('dfnGen_output/polygons.dat', dtype = str, delimiter = 'dummy', skip_header = 1) #weird format, so read data in as strings
-    
-    if self.num_frac == 1:
-        polygon_data = np.array([polygon_data])
-
-
-    for i in range(len(polygon_data)):
-        poly_dat = polygon_data[i] #read in data for one polygon
-        poly_dat = poly_dat.replace('}', '') #get rid of weird characters
-        poly_dat = poly_dat.replace('{', '')
-        poly_dat = poly_dat.replace(',', '')
-        poly_dat = poly_dat.split() #convert string to list, and then array
-        poly_dat = np.array(poly_dat)
-        poly_dat = poly_dat.astype(float)
-        poly = []
-        for j in range(int(poly_dat[0])): #loop through and reformat individual coordinates
-            poly.append(poly_dat[3*j+1:3*j+4])
-        poly = np.array(poly)
-        self.polygons[f'fracture-{i+1}'] = poly #store in dictionary
+    polygon_data = load_dfngen_file('dfnGen_output/polygons.dat')
+    self.polygons = PolygonVertices(polygon_data["vertices"],
+                                    polygon_data["offsets"])
     self.print_log('--> Data from polygons.dat stored on class in self.polygons\n')
 
 
-def _get_intersection_length(fracture_id: int, df: pd.DataFrame) -> float:
-        """
-        Compute the total intersection length for a given fracture ID.
-        Only counts intersections where both f1 and f2 are > 0.
-        """
-        mask = (
-            ((df['f1'] == fracture_id) | (df['f2'] == fracture_id))
-            & (df['f1'] > 0)
-            & (df['f2'] > 0)
-        )
-        return df.loc[mask, 'length'].sum()
-
 def compute_fracture_p21(self):
     """
     Compute P21 per fracture:
     P21[i] = (sum of intersection lengths involving fracture i+1) / surface_area[i]
     Assumes fracture IDs are 1..self.num_frac.
+    Only intersections between two fractures (f1 > 0 and f2 > 0) are counted. The lengths are accumulated with np.bincount over f1 and f2.
     """
     print("--> Computing P21 per fracture")
-    # Convert intersection list into DataFrame
-    df = pd.DataFrame(self.intersection_list, columns=['f1', 'f2', 'x', 'y', 'z', 'length'])
-
-    # Initialize array for results
-    self.p21 = np.zeros(self.num_frac, dtype=float)
-
-    for i in range(1, self.num_frac + 1):
-        total_length = _get_intersection_length(i, df)
-        self.p21[i - 1] = total_length / self.surface_area[i - 1]
-        # print(f"Fracture ID: {i:3d} | P21: {self.p21[i - 1]:.2e}")
+    total_length = np.zeros(self.num_frac)
+    # a network without intersections has zero P21 everywhere
+    if np.size(self.intersection_list) > 0:
+        intersections = np.atleast_2d(self.intersection_list)
+        f1 = intersections[:, 0].astype(int)
+        f2 = intersections[:, 1].astype(int)
+        length = intersections[:, 5]
+        internal = (f1 > 0) & (f2 > 0)
+
+        total_length += np.bincount(f1[internal] - 1,
+                                    weights=length[internal],
+                                    minlength=self.num_frac)[:self.num_frac]
+        # an intersection is counted once per fracture
+        second = internal & (f2 != f1)
+        total_length += np.bincount(f2[second] - 1,
+                                    weights=length[second],
+                                    minlength=self.num_frac)[:self.num_frac]
+    self.p21 = total_length / self.surface_area[:self.num_frac]
 
     # Also create a DataFrame view for convenience
     self.p21_table = pd.DataFrame({
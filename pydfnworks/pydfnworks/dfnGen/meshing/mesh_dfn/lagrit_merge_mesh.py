@@ -1,41 +1,99 @@
 import os
 import numpy as np
 
+from pydfnworks.general.logging import local_print_log
 
-def create_merge_poly_scripts(self):
-    """ Creates a LaGriT script that reads in each fracture mesh, appends it to the main mesh, and then deletes that mesh object. Then duplicate points are removed from the main mesh using EPS_FILTER.  The points are compressed, and then written to file.
+
+def balanced_groups(weights, num_groups, max_size):
+    """ Split a list of items into consecutive groups of about equal weight
+
+    Parameters
+    ----------
+        weights : numpy array
+            weight of each item
+
+        num_groups : int
+            number of groups
+
+        max_size : int
+            maximum number of items in a group
+
+    Returns
+    -------
+        groups : list
+            lists of item indices, in order. Groups are never empty.
+
+    Notes
+    -----
+        Each item goes to the group that contains the middle of its weight on the cumulative weight, so an item heavier than the average group ends up (nearly) on its own. Groups with more than max_size items are split, so there can be more than num_groups groups.
+    """
+    weights = np.asarray(weights, dtype=float)
+    num_items = len(weights)
+    total = weights.sum()
+    if total > 0:
+        middle = np.cumsum(weights) - 0.5 * weights
+        group = np.floor(middle / total * num_groups).astype(int)
+    else:
+        group = np.arange(num_items) * num_groups // max(num_items, 1)
+    groups = []
+    for items in np.split(np.arange(num_items),
+                          np.nonzero(np.diff(group))[0] + 1):
+        for start in range(0, len(items), max_size):
+            groups.append(items[start:start + max_size].tolist())
+    return groups
+
+
+def merge_tree(weights, fan_in):
+    """ Reduction tree that merges the fracture meshes in levels
+
+    Parameters
+    ----------
+        weights : numpy array
+            size of each fracture mesh
+
+        fan_in : int
+            maximum number of meshes merged by one job
+
+    Returns
+    -------
+        levels : list
+            groups of each level (see balanced_groups). Groups of the first level hold fracture indices, groups of the next levels hold indices of the groups of the level before. The last level has at most fan_in groups, which are merged by the final merge.
+    """
+    if fan_in < 2:
+        error = f"Error. The merge fan in must be at least 2, got {fan_in}.\nExiting"
+        local_print_log(error, 'error')
+    weights = np.asarray(weights, dtype=float)
+    levels = []
+    while True:
+        num_groups = int(np.ceil(len(weights) / fan_in))
+        groups = balanced_groups(weights, num_groups, fan_in)
+        levels.append(groups)
+        if len(groups) <= fan_in:
+            return levels
+        weights = np.array([weights[group].sum() for group in groups])
+
+
+def create_merge_poly_scripts(self, fan_in=8):
+    """ Creates the LaGriT scripts that merge the fracture meshes in a tree of partial merges. A job of the first level reads in each of its fracture meshes, appends it to the main mesh, and then deletes that mesh object. Jobs of the next levels do the same with the partial meshes of the level before.
 
     Parameters
     ----------
         self : object 
             DFN Class
 
-        ncpu : int 
-            Number of Processors used for meshing
-        
-        fracture_list : list of int
-            List of fracture numbers in the DFN
-        
-        h : float 
-            Meshing length scale
-        
-        visual_mode : bool
-            If True, reduced_mesh.inp will be output. If False, full_mesh.inp is output
-        
-        domain : dict
-            Dictionary of x,y,z domain size
-        
-        flow_solver : string
-            Name of target flow solver (Changes output files)
+        fan_in : int
+            maximum number of meshes merged by one job
 
     Returns
     -------
-        n_jobs : int
-            number of merge jobs
+        jobs : list
+            names of the merge jobs of each level. Job {job} runs lagrit_scripts/merge_part_{job}.lgi and writes part_{job}.lg
 
     Notes
     -----
-        1. Fracture mesh objects are read into different part_*.lg files. This allows for merging of the mesh to be performed in batches.  
+        1. Fracture meshes are grouped by the size of their files, which grows with the number of nodes, so each job of a level merges about the same number of nodes. Fractures stay in the order of self.fracture_list.
+
+        2. LaGriT copies the main mesh each time a mesh is appended, so merging many meshes in one process takes time quadratic in their number. With at most fan_in meshes per job, every level takes about the same time and the number of levels grows with the logarithm of the number of fractures.
     """
     self.print_log("--> Writting partial merge scripts")
 
@@ -61,46 +119,67 @@ cmo / addatt / cmo_tmp / volume / evol_all
 math / sum / cmo_tmp / evol_sum / 1 0 0 / cmo_tmp / evol_all """
     lagrit_input_2 += """ 
 cmo select cmo_tmp
-dump lagrit part{0}.lg cmo_tmp
+dump lagrit part_{0}.lg cmo_tmp
+finish
+"""
+
+    # partial meshes are read in as cmo_tmp, merged into mo_part, and written out as cmo_tmp again
+    part_input = """
+read / lagrit / part_{0}.lg / junk / binary
+addmesh / merge / mo_part / mo_part / cmo_tmp
+cmo / delete / cmo_tmp
+"""
+    part_input_2 = """
+# Writing out merged parts
+cmo / move / cmo_tmp / mo_part
+cmo select cmo_tmp
+dump lagrit part_{0}.lg cmo_tmp
 finish
 """
 
     # get leading digits
     digits = len(str(self.num_frac))
-    part_size = int(
-        max(np.floor(self.num_frac / self.ncpu) + 1, 1)
-    )  # number of fractures in each part / have to add 1 due to indexing starting from 1 not 0.
-
-    self.print_log(f"--> There are {part_size} fractures in each part")
-
-    frac_index = 0
-    for cpu in range(self.ncpu):
-        # grab the fractures for this cpu
-        current_fractures = list(self.fracture_list[frac_index:frac_index +
-                                                    part_size])
-        # self.print_log(f"cpu: {cpu}")
-        # self.print_log(current_fractures)
-        frac_index += part_size
-        # skip CPUs that received no fractures
-        # if not current_fractures:
-        #     continue
-        # write script to merge them in batch
-        with open(f'lagrit_scripts/merge_part_{cpu+1}.lgi', 'w') as fout:
-            for frac_id in current_fractures:
-                filename = f'mesh_{frac_id:0{digits}d}.lg'
-                fout.write(lagrit_input.format(filename, frac_id))
-            fout.write(lagrit_input_2.format(cpu + 1))
+    fracture_list = list(self.fracture_list)
+    filenames = [f'mesh_{frac_id:0{digits}d}.lg' for frac_id in fracture_list]
+    weights = [
+        os.path.getsize(filename) if os.path.isfile(filename) else 0
+        for filename in filenames
+    ]
+    levels = merge_tree(weights, fan_in)
+
+    jobs = []
+    for level, groups in enumerate(levels):
+        jobs.append([f"{level + 1}_{k + 1}" for k in range(len(groups))])
+        self.print_log(
+            f"--> Merge level {level + 1}: {len(groups)} jobs of up to {max(map(len, groups), default=0)} meshes"
+        )
+        for job, group in zip(jobs[-1], groups):
+            # write script to merge them in batch
+            with open(f'lagrit_scripts/merge_part_{job}.lgi', 'w') as fout:
+                if level == 0:
+                    for i in group:
+                        fout.write(
+                            lagrit_input.format(filenames[i], fracture_list[i]))
+                    fout.write(lagrit_input_2.format(job))
+                else:
+                    for i in group:
+                        fout.write(part_input.format(jobs[level - 1][i]))
+                    fout.write(part_input_2.format(job))
 
     self.print_log("--> Writting merge scripts: Complete ")
+    return jobs
 
 
-def create_final_merge_script(self):
+def create_final_merge_script(self, parts):
     """
     Parameters
     ------------
         self : object 
             DFN Class
 
+        parts : list
+            names of the merge jobs of the last level, see create_merge_poly_scripts
+
     Returns
     ---------
         None
@@ -114,15 +193,13 @@ def create_final_merge_script(self):
     eps = self.h * 10**-3
     ## Write LaGriT file for merge parts of the mesh and remove duplicate points
     lagrit_input = """
-read / lagrit / part{0}.lg / junk / binary
+read / lagrit / part_{0}.lg / junk / binary
 addmesh / merge / mo_all / mo_all / cmo_tmp 
 cmo / delete / cmo_tmp 
     """
     with open('lagrit_scripts/merge_network.lgi', 'w') as f:
-        for j in range(1, self.ncpu + 1):
-            if not os.path.isfile(f'lagrit_scripts/merge_part_{j}.lgi'):
-                continue
-            f.write(lagrit_input.format(j))
+        for job in parts:
+            f.write(lagrit_input.format(job))
 
         # Append meshes complete
         if not self.visual_mode:
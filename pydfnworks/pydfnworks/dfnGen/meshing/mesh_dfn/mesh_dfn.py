@@ -27,7 +27,10 @@ def mesh_network(self,
                  well=False,
                  cleanup=True,
                  strict=True,
-                 quiet=True):
+                 quiet=True,
+                 resume=True,
+                 retry_relaxed=True,
+                 merge_fan_in=8):
     """
       Mesh fracture network using LaGriT
 
@@ -60,6 +63,15 @@ def mesh_network(self,
         quiet : bool
             Toggle to turn on/off verbose information to screen about meshing. Default is true, does not print to screen
 
+        resume : bool
+            If True, fractures that were meshed successfully by an earlier run with the same inputs are not meshed again. Default is True
+
+        retry_relaxed : bool
+            If True, fractures that fail to mesh are meshed again with a uniform resolution of h/2. Default is True
+
+        merge_fan_in : int
+            Maximum number of meshes merged by one LaGriT run when the fracture meshes are merged (see merge_network). Default is 8
+
     Returns
     -------
         None
@@ -68,6 +80,8 @@ def mesh_network(self,
     ------
         1. All fractures in self.prune_file must intersect at least 1 other fracture
 
+        2. The inputs and result of each fracture are recorded in mesh_manifest.jsonl (see mesh_fractures_header). If some fractures fail, fixing them and calling mesh_network again only meshes those fractures. Meshes are removed by cleanup, so a run with cleanup=True meshes every fracture the next time.
+
     """
 
     self.print_log('=' * 80)
@@ -137,11 +151,16 @@ def mesh_network(self,
         )
         self.ncpu = self.num_frac
 
-    if self.mesh_fractures_header(quiet):
+    if self.mesh_fractures_header(quiet,
+                                  slope=slope,
+                                  intercept=intercept,
+                                  max_resolution_factor=max_resolution_factor,
+                                  resume=resume,
+                                  retry_relaxed=retry_relaxed):
         self.print_log("One or more fractures failed to mesh properly.", "error")
 
     # ### Parallel runs
-    self.merge_network()
+    self.merge_network(merge_fan_in)
 
     ## checking and clean up
     if (not self.visual_mode and not self.prune_file and not self.r_fram):
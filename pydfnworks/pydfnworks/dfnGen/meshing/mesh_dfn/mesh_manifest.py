@@ -0,0 +1,218 @@
+"""
+.. module:: mesh_manifest.py
+   :synopsis: Manifest of the inputs and meshes of each fracture, used to skip fractures whose mesh is current when meshing is rerun
+.. moduleauthor:: Jeffrey Hyman <jhyman@lanl.gov>
+
+"""
+
+import os
+import json
+
+from pydfnworks.general.dfngen_output_cache import file_sha1
+from pydfnworks.general.logging import local_print_log
+
+MESH_MANIFEST_VERSION = 1
+mesh_manifest_name = "mesh_manifest.jsonl"
+
+
+def mesh_file_name(fracture_id, digits):
+    """ Name of the LaGriT mesh of a fracture """
+    return f"mesh_{fracture_id:0{digits}d}.lg"
+
+
+def fracture_input_files(fracture_id, digits, visual_mode):
+    """ Files read by LaGriT to mesh a fracture """
+    files = [
+        f"polys/poly_{fracture_id}.inp",
+        f"lagrit_scripts/parameters_{fracture_id:0{digits}d}.mlgi",
+        f"lagrit_scripts/mesh_poly_{fracture_id:0{digits}d}.lgi",
+        "user_resolution.mlgi"
+    ]
+    if not visual_mode:
+        files.append(f"intersections/intersections_{fracture_id}.inp")
+    return files
+
+
+def fracture_inputs(fracture_id, digits, visual_mode, parameters):
+    """ Description of everything that determines the mesh of a fracture
+
+    Parameters
+    ----------
+        fracture_id : int
+            Fracture ID number
+
+        digits : int
+            number of digits in total number of fractures
+
+        visual_mode : bool
+            True/False for reduced meshing
+
+        parameters : dict
+            meshing parameters, e.g., h, slope, intercept, and max_resolution_factor
+
+    Returns
+    -------
+        inputs : dict
+            parameters : the meshing parameters
+            files : sha1 of each input file, None if the file does not exist
+
+    Notes
+    -----
+        The LaGriT scripts must be written before this is called. Two fractures with equal inputs are meshed the same way, up to the random Poisson disc sampling.
+    """
+    files = {}
+    for filename in fracture_input_files(fracture_id, digits, visual_mode):
+        files[filename] = file_sha1(filename) if os.path.isfile(
+            filename) else None
+    return {"parameters": parameters, "files": files}
+
+
+def mesh_entry(fracture_id, digits, inputs, status, relaxed=False):
+    """ Manifest entry of a meshing run
+
+    Parameters
+    ----------
+        fracture_id : int
+            Fracture ID number
+
+        digits : int
+            number of digits in total number of fractures
+
+        inputs : dict
+            output of fracture_inputs
+
+        status : int
+            error index returned by mesh_fracture, 0 if the run was successful
+
+        relaxed : bool
+            True if the fracture was meshed with the relaxed parameters
+
+    Returns
+    -------
+        entry : dict
+            one line of the manifest. Entries of successful runs include the size, modification time, and sha1 of the mesh.
+    """
+    entry = {
+        "fracture_id": int(fracture_id),
+        "inputs": inputs,
+        "status": int(status),
+        "relaxed": relaxed,
+        "mesh": mesh_file_name(fracture_id, digits)
+    }
+    if status == 0 and os.path.isfile(entry["mesh"]):
+        st = os.stat(entry["mesh"])
+        entry["mesh_size"] = st.st_size
+        entry["mesh_mtime_ns"] = st.st_mtime_ns
+        entry["mesh_sha1"] = file_sha1(entry["mesh"])
+    return entry
+
+
+def mesh_is_current(entry, inputs):
+    """ True if the entry records a successful run with these inputs whose mesh is unchanged
+
+    Parameters
+    ----------
+        entry : dict
+            manifest entry of the fracture, or None
+
+        inputs : dict
+            current output of fracture_inputs
+
+    Returns
+    -------
+        current : bool
+
+    Notes
+    -----
+        The mesh is compared by size and modification time, and by sha1 if it was touched or copied.
+    """
+    if entry is None or entry["status"] != 0 or entry["inputs"] != inputs:
+        return False
+    mesh = entry["mesh"]
+    if "mesh_sha1" not in entry or not os.path.isfile(mesh):
+        return False
+    st = os.stat(mesh)
+    if st.st_size != entry["mesh_size"]:
+        return False
+    if st.st_mtime_ns == entry["mesh_mtime_ns"]:
+        return True
+    return file_sha1(mesh) == entry["mesh_sha1"]
+
+
+def read_mesh_manifest(filename=mesh_manifest_name):
+    """ Read the manifest written during earlier meshing runs
+
+    Parameters
+    ----------
+        filename : string
+            name of the manifest
+
+    Returns
+    -------
+        entries : dict
+            latest entry of each fracture, keyed by fracture id. Empty if there is no manifest or it has a different version.
+
+    Notes
+    -----
+        The manifest is one JSON object per line, starting with a header that holds the version. Entries are appended as fractures finish, so later lines replace earlier ones, and a line cut off by a crash is ignored.
+    """
+    entries = {}
+    if not os.path.isfile(filename):
+        return entries
+    with open(filename, "r") as fp:
+        try:
+            header = json.loads(fp.readline())
+        except ValueError:
+            header = {}
+        if header.get("version") != MESH_MANIFEST_VERSION:
+            local_print_log(
+                f"--> Ignoring {filename}, it is not a mesh manifest of version {MESH_MANIFEST_VERSION}",
+                'warning')
+            return entries
+        for line in fp:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            entries[entry["fracture_id"]] = entry
+    return entries
+
+
+class MeshManifest():
+    """ Manifest file that entries are appended to as fractures finish meshing
+
+    Parameters
+    ----------
+        entries : dict
+            entries kept from an earlier run, keyed by fracture id
+
+        filename : string
+            name of the manifest
+
+    Notes
+    -----
+        The manifest is rewritten with the kept entries when it is opened, so it does not grow with each rerun. Each appended entry is flushed, so a run that is killed keeps the fractures that finished.
+    """
+
+    def __init__(self, entries=None, filename=mesh_manifest_name):
+        self.filename = filename
+        tmp = f"{filename}.tmp"
+        with open(tmp, "w") as fp:
+            fp.write(json.dumps({"version": MESH_MANIFEST_VERSION}) + "\n")
+            for entry in (entries or {}).values():
+                fp.write(json.dumps(entry) + "\n")
+        os.replace(tmp, filename)
+        self.fp = open(filename, "a")
+
+    def append(self, entry):
+        self.fp.write(json.dumps(entry) + "\n")
+        self.fp.flush()
+
+    def close(self):
+        self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -11,15 +11,17 @@ import sys
 import timeit
 import glob
 
-import numpy as np
 import multiprocessing as mp
 
-mp.set_start_method("fork")
+# only pick the start method if nobody has yet. Workers started with spawn
+# import this module after their context is already set.
+if mp.get_start_method(allow_none=True) is None:
+    mp.set_start_method("fork")
 
 from shutil import copy, rmtree
-from numpy import genfromtxt
 from pydfnworks.general import helper_functions as hf
 from pydfnworks.dfnGen.meshing.mesh_dfn import mesh_dfn_helper as mh
+from pydfnworks.dfnGen.meshing.mesh_dfn import mesh_manifest as mm
 from pydfnworks.general.logging import local_print_log 
 
 
@@ -308,13 +310,75 @@ def mesh_fracture(fracture_id, visual_mode, num_frac, r_fram, quiet):
     return (fracture_id, 0)
 
 
-def mesh_fractures_header(self, quiet=True):
+def _mesh_fractures(fracture_list, ncpu, visual_mode, num_frac, r_fram, quiet,
+                    record):
+    """ Mesh fractures on a process pool
+
+    Parameters
+    ----------
+        fracture_list : list
+            Fractures to be meshed
+
+        ncpu : int
+            Number of processes
+
+        visual_mode : bool
+            True/False for reduced meshing
+
+        num_frac : int
+            Total Number of Fractures
+
+        r_fram : boolean
+            relaxed fram
+
+        quiet : boolean
+            toggles for quiet mode.
+
+        record : function
+            called with (fracture_id, error index) as each fracture finishes
+
+    Returns
+    -------
+        results : dict
+            error index of each fracture, see mesh_fracture. Fractures whose worker raised an exception have error index -2.
+    """
+    results = {}
+    if len(fracture_list) == 0:
+        return results
+
+    pool = mp.Pool(min(len(fracture_list), ncpu))
+
+    def log_result(result):
+        # called in the main process whenever a worker returns a result.
+        results[result[0]] = result[1]
+        record(*result)
+
+    try:
+        for i in fracture_list:
+            pool.apply_async(mesh_fracture,
+                             args=(i, visual_mode, num_frac, r_fram, quiet),
+                             callback=log_result)
+    finally:
+        pool.close()
+        pool.join()
+
+    for i in fracture_list:
+        if i not in results:
+            log_result((i, -2))
+    return results
+
+
+def mesh_fractures_header(self,
+                          quiet=True,
+                          slope=None,
+                          intercept=None,
+                          max_resolution_factor=None,
+                          resume=True,
+                          retry_relaxed=True):
     """ Header function for Parallel meshing of fractures
     
-    Creates a queue of fracture numbers ranging from 1, num_frac
-    
-    Each fractures is meshed using mesh_fracture called within the
-    worker function.
+    Each fracture in self.fracture_list is meshed using mesh_fracture
+    called within a pool of workers.
 
     If any fracture fails to mesh properly, then a folder is created with 
     that fracture information and the fracture number is written into
@@ -328,64 +392,123 @@ def mesh_fractures_header(self, quiet=True):
         quiet : bool
             toggle quite mode. Default is True
 
-        fracture_list : list
-            Fractures to be meshed
-        
-        visual_mode : bool
-            True/False for reduced meshing
-        
-        num_frac : int
-            Total Number of Fractures
+        slope : float 
+            slope of the linear function of the mesh resolution
+
+        intercept : float 
+            Intercept of the linear function of the mesh resolution
+
+        max_resolution_factor : float
+            Maximum factor of the mesh resolultion (max_resolution *h).
+
+        resume : bool
+            If True, fractures whose inputs and mesh are unchanged since a successful earlier run (see mesh_manifest.jsonl) are not meshed again. Default is True
+
+        retry_relaxed : bool
+            If True, fractures that fail are meshed again with a uniform resolution of h/2. Default is True
 
     Returns
     -------
         True/False : bool
-            True - If failure.txt is empty then all fractures have been meshed correctly
-            False - If failure.txt is not empty, then at least one fracture failed.  
+            True - If at least one fracture failed, or too many intersection edges were lost with relaxed FRAM.
+            False - All fractures have been meshed correctly
 
     Notes
     -----
-        If one fracture fails meshing, program will exit. 
+        The inputs of each fracture (poly file, intersection file, LaGriT scripts, and meshing parameters) are recorded with their sha1 in mesh_manifest.jsonl together with the error index and the mesh file. The manifest is written as fractures finish, so a run that fails or is killed can be rerun and only fractures that failed or whose inputs changed are meshed.
 
+        Failures do not stop the other fractures. With retry_relaxed, the variable mesh resolution is replaced by the resolution along the intersections for the failed fractures, which removes the grading that most often keeps LaGriT from preserving the lines of intersection. The parameter files of the retry are replaced by the original ones once it is done, and the manifest entry of the retry is marked relaxed, so a rerun with the same inputs keeps the relaxed mesh. The LaGriT scripts must be written before this is called.
     """
     t_all = timeit.default_timer()
     self.print_log('=' * 80)
-    self.print_log(
-        f"--> Triangulating {self.num_frac} fractures using {self.ncpu} processors\n"
-    )
-
-    pool = mp.Pool(min(self.num_frac, self.ncpu))
-    result_list = []
-
-    def log_result(result):
-        # This is called whenever foo_pool(i) returns a result.
-        # result_list is modified only by the main process, not the pool workers.
-        result_list.append(result)
-        if result[1] != 0:
-            pool.terminate()
-            # If a run fails, kill all other processes, and clean up the directory
-            names = [
-                "poly_*.inp",
-                "mesh_poly_*.lgi",
-                "parameters_*.mlgi",
-                "intersections_*.inp",
-            ]
-            for name in names:
-                files_to_remove = glob.glob(name)
-                for f in files_to_remove:
-                    os.remove(f)
 
     # get leading digits
     digits = len(str(self.num_frac))
+    fracture_list = [int(i) for i in self.fracture_list]
+    parameters = {
+        "h": float(self.h),
+        "slope": None if slope is None else float(slope),
+        "intercept": None if intercept is None else float(intercept),
+        "max_resolution_factor":
+        None if max_resolution_factor is None else
+        float(max_resolution_factor),
+        "visual_mode": bool(self.visual_mode),
+        "r_fram": bool(self.r_fram)
+    }
+    inputs = {
+        i: mm.fracture_inputs(i, digits, self.visual_mode, parameters)
+        for i in fracture_list
+    }
+    manifest = mm.read_mesh_manifest() if resume else {}
+    current = {
+        i: manifest[i]
+        for i in fracture_list if mm.mesh_is_current(manifest.get(i), inputs[i])
+    }
+    todo = [i for i in fracture_list if i not in current]
+    if current:
+        self.print_log(
+            f"--> {len(current)} fractures are unchanged since the last run and are not meshed again"
+        )
+
+    # failures of earlier runs, and meshes of fractures that are meshed again
+    if os.path.isfile("failure.txt"):
+        os.remove("failure.txt")
+    for i in todo:
+        if os.path.isfile(mm.mesh_file_name(i, digits)):
+            os.remove(mm.mesh_file_name(i, digits))
 
-    for i in self.fracture_list:
-        pool.apply_async(mesh_fracture,
-                         args=(i, self.visual_mode, self.num_frac, self.r_fram,
-                               quiet),
-                         callback=log_result)
+    self.print_log(
+        f"--> Triangulating {len(todo)} fractures using {self.ncpu} processors\n"
+    )
+    with mm.MeshManifest(current) as manifest_file:
 
-    pool.close()
-    pool.join()
+        def record(fracture_id, status, relaxed=False):
+            manifest_file.append(
+                mm.mesh_entry(fracture_id, digits, inputs[fracture_id],
+                              status, relaxed))
+
+        results = _mesh_fractures(todo, self.ncpu, self.visual_mode,
+                                  self.num_frac, self.r_fram, quiet, record)
+        failed = [i for i in todo if results[i] != 0]
+
+        if failed and retry_relaxed:
+            self.print_log(
+                f"--> Meshing {len(failed)} failed fractures again with uniform resolution h/2",
+                'warning')
+            index = {i: k + 1 for k, i in enumerate(fracture_list)}
+            # the manifest records the inputs of the original run, so the
+            # relaxed parameter files are only kept for the retry
+            originals = {}
+            for i in failed:
+                params_file = f"lagrit_scripts/parameters_{i:0{digits}d}.mlgi"
+                originals[params_file] = None
+                if os.path.isfile(params_file):
+                    with open(params_file, "rb") as fp:
+                        originals[params_file] = fp.read()
+            try:
+                for i in failed:
+                    self.create_lagrit_parameters_file(i, index[i], digits, 0,
+                                                       0.5 * self.h, 1)
+                    if os.path.isfile(mm.mesh_file_name(i, digits)):
+                        os.remove(mm.mesh_file_name(i, digits))
+                retry = _mesh_fractures(
+                    failed, self.ncpu, self.visual_mode, self.num_frac,
+                    self.r_fram, quiet, lambda fracture_id, status: record(
+                        fracture_id, status, True))
+            finally:
+                for params_file, data in originals.items():
+                    if data is None:
+                        if os.path.isfile(params_file):
+                            os.remove(params_file)
+                    else:
+                        with open(params_file, "wb") as fp:
+                            fp.write(data)
+            for i in failed:
+                if retry[i] == 0:
+                    self.print_log(
+                        f"--> Fracture {i} was meshed with uniform resolution h/2 after failing with error {results[i]}",
+                        'warning')
+                results[i] = retry[i]
 
     elapsed = timeit.default_timer() - t_all
     self.print_log('--> Triangulating Polygons: Complete\n')
@@ -399,12 +522,12 @@ def mesh_fractures_header(self, quiet=True):
     self.print_log('=' * 80)
 
     self.print_log("* Checking for meshing issues.")
-    for result in result_list:
-        if result[1] != 0:
+    failed = [i for i in todo if results[i] != 0]
+    if failed:
+        for i in failed:
             self.print_log(
-                f"--> Fracture number {result[0]} failed with error {result[1]}\n"
-            )
-            details = """
+                f"--> Fracture number {i} failed with error {results[i]}\n")
+        details = """
         Error index: 
 0 - run was successful
 -1 - error making symbolic link
@@ -412,16 +535,10 @@ def mesh_fractures_header(self, quiet=True):
 -3 - mesh file created but empty
 -4 - line of intersection not preserved
         """
-            self.print_log(details)
-            return False
-
-    if os.path.isfile("failure.txt"):
-        failure_list = genfromtxt("failure.txt")
-        if type(failure_list) is list:
-            failure_list = np.sort(failure_list)
-        else:
-            self.print_log('--> Fractures:', failure_list, 'Failed', 'warning')
-        self.print_log('--> Main process exiting.')
+        self.print_log(details)
+        self.print_log(
+            f"--> {len(failed)} fractures failed. Fix them and rerun meshing, the other {len(fracture_list) - len(failed)} fractures will not be meshed again."
+        )
         return True
 
     ## check for meshing errors in r_fram
@@ -431,6 +548,8 @@ def mesh_fractures_header(self, quiet=True):
 
     self.print_log("* No meshing issues detected. Heck yeah!")
     self.print_log('=' * 80)
+    return False
+
 
 def check_for_missing_edges(self):
     """ Checks for missing edges that can occur with relaxed FRAM.
@@ -501,8 +620,8 @@ def merge_worker(job, quiet=True):
 
     Parameters
     ----------
-        job : int
-            job number
+        job : string
+            name of the merge job, see create_merge_poly_scripts
 
         quiet : bool
             toggle quite mode. Default is True
@@ -533,22 +652,16 @@ def merge_worker(job, quiet=True):
     return False
 
 
-def merge_the_fractures(ncpu):
+def merge_the_fractures(ncpu, jobs):
     """ Runs the LaGrit Scripts to merge meshes into final mesh 
 
     Parameters
     ----------
-        num_frac : int
-            Number of Fractures
-        
         ncpu : int
             Number of Processors
-        
-        n_jobs : int
-            Number of mesh pieces
-        
-        visual_mode : bool
-            True/False for reduced meshing
+
+        jobs : list
+            names of the merge jobs of each level, see create_merge_poly_scripts
 
     Returns
     -------
@@ -556,7 +669,7 @@ def merge_the_fractures(ncpu):
 
     Notes
     -----
-        Meshes are merged in batches for efficiency  
+        Meshes are merged in batches for efficiency. The jobs of a level run in parallel once the level before is complete.
     """
     local_print_log('=' * 80)
     if ncpu == 1:
@@ -568,21 +681,26 @@ def merge_the_fractures(ncpu):
             f"--> Merging triangulated fracture meshes using {ncpu} processors."
         )
 
-    jobs = range(1, ncpu + 1)
     tic = timeit.default_timer()
-    pool = mp.Pool(ncpu)
-    outputs = pool.map(merge_worker, jobs)
-    pool.close()
-    pool.join()
-    pool.terminate()
+    pool = mp.Pool(max(1, min(ncpu, len(jobs[0]))))
+    try:
+        for level, level_jobs in enumerate(jobs):
+            tic_level = timeit.default_timer()
+            outputs = pool.map(merge_worker, level_jobs, chunksize=1)
+            elapsed = timeit.default_timer() - tic_level
+            local_print_log(
+                f"--> Merge level {level + 1} of {len(jobs)} complete ({len(level_jobs)} jobs). Time elapsed: {elapsed:.2e} seconds."
+            )
+            if any(outputs):
+                error = "Error!!! One of the merges failed\nExiting\n"
+                local_print_log(error, 'error')
+    finally:
+        pool.close()
+        pool.join()
     elapsed = timeit.default_timer() - tic
     local_print_log(
         f"--> Initial merging complete. Time elapsed: {elapsed:.2e} seconds."
     )
-    for output in outputs:
-        if output:
-            error = "Error!!! One of the merges failed\nExiting\n"
-            local_print_log(error,'error')
 
 
 def merge_final_mesh():
@@ -642,13 +760,16 @@ def check_for_final_mesh(visual_mode):
         )
 
 
-def merge_network(self):
-    """ Merges the individual meshed fractures into a single mesh objection. This is done in stages. First, individual fractures are merged into sub-networks, then those sub-networks are merged to form the whole network. 
+def merge_network(self, fan_in=8):
+    """ Merges the individual meshed fractures into a single mesh objection. This is done in stages. First, individual fractures are merged into sub-networks, then those sub-networks are merged into larger ones, level by level, and the last level is merged to form the whole network. 
 
     Parameters
     ----------------
         self : DFN Object
 
+        fan_in : int
+            maximum number of meshes merged by one LaGriT run. Default is 8
+
     Returns
     ----------------
         Notes
@@ -660,9 +781,9 @@ def merge_network(self):
     """
     local_print_log('=' * 80)
     self.print_log("* Merging the mesh: Starting")
-    self.create_merge_poly_scripts()
-    self.create_final_merge_script()
-    merge_the_fractures(self.ncpu)
+    jobs = self.create_merge_poly_scripts(fan_in)
+    self.create_final_merge_script(jobs[-1])
+    merge_the_fractures(self.ncpu, jobs)
     merge_final_mesh()
     check_for_final_mesh(self.visual_mode)
     self.print_log("* Merging the mesh: Complete")
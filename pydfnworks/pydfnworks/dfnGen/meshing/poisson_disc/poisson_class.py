@@ -73,11 +73,12 @@ class Poisson_Variables():
         # number of the next already accepted node to be center of
         # a sampling. Stored here, so main_sampling can continue,
         # where it left off, if interrupted.
-        self.no_of_nodes = 0  # current length of Coordinate-list
-        self.coordinates = []
-        # list of coordinates. Every entry is an array with the first
-        # two components being x/y-coordinates and the third entry being
-        # the local exclusion radius of the node.
+        self.no_of_nodes = 0  # number of accepted nodes
+        self.coordinates = np.zeros((0, 3))
+        # array of coordinates, allocated ahead of the sampling. The first
+        # no_of_nodes rows are accepted nodes, with the first two components
+        # being x/y-coordinates and the third entry being the local exclusion
+        # radius of the node.
 
         # Geometry of Polygon
         self.vertices = []  # corner vertices of the polygon,
@@ -97,6 +98,10 @@ class Poisson_Variables():
         # boundary function. requires convexity of polygon to be well-def
         self.slope_lower_boundary = 0  # boundaries of polygon are piecewise linear
         self.slope_upper_boundary = 0
+        self.lower_chain = np.zeros((0, 2))
+        # vertices of the lower/upper boundary from x_min to x_max,
+        # used to test many points at once
+        self.upper_chain = np.zeros((0, 2))
 
         # Neighbor-grid variables
         self.neighbor_cell_size = self.H / 2 / np.sqrt(2)
@@ -104,26 +109,20 @@ class Poisson_Variables():
         self.no_of_horizontal_neighbor_cells = 1
         self.no_of_horizontal_neighbor_cells = 1
         self.neighbor_grid = np.zeros(1)
+        self.neighbor_offsets = {}
+        # cell offsets searched for conflicting nodes, keyed by the
+        # search distance in cells
 
         # Intersection-related variables
         self.intersect_range_sq = ((self.R + self.F) * self.H)**2
         # distance along which an intersection affects the local
         # exclusion radius  (squared)
-        if (self.intersect_range_sq) != 0:
-            self.intersect_grid_inv = 1 / (self.R * self.H + self.F * self.H)
-            # inverse cell-size of intersection-grid
-        else:
-            self.intersect_grid_inv = 1
-            # inverse cell-size of intersection-grid
         self.intersect_endpts = []
-        self.intersect_cells = {}
-        # key (i,j) contains numbers of intersection within a distance
-        # of intersect-range or less to the intersect-cell (i,j)
-        self.square_nodes = np.array([[1, 0], [1, 1], [0, 1], [0, 0], [1, 0]])
-        # (k-1)-th and k-th row contain nodes of a square bounding the
-        # edge of that square in direction k, where k in [1,2,3,4]
-        # and the numbers corresponding to directions as follows:
-        # 1->right, 3->left, 2->up, 4->down.
+        self.intersect_start = np.zeros((0, 2))
+        # start and end points of the intersections as arrays
+        self.intersect_end = np.zeros((0, 2))
+        self.intersect_index = None
+        # SegmentGrid of the intersections, answers distance queries
 
         # Occupancy-grid variables
         self.occupancy_grid_side_length_inv = 1 / self.occupancy_grid_side_length
@@ -1,9 +1,11 @@
 # func.py
 from pydfnworks.dfnGen.meshing.poisson_disc import poisson_class as pc
+from pydfnworks.dfnGen.meshing.poisson_disc.segment_index import SegmentGrid
 from pydfnworks.general.logging import local_print_log, print_log
 
+import numpy as np
 from numpy import arange, array, ogrid, nonzero, zeros, append
-from random import random, shuffle
+from random import random
 from math import sqrt, floor, ceil, cos, sin, pi
 from matplotlib import pyplot as plt
 from scipy.sparse import lil_matrix
@@ -29,23 +31,21 @@ The contained functions in order are:
 *called by other functions:
     - neighbor_cell()
     - neighbor_grid_init()
+    - add_nodes()
     - new_candidate()
+    - new_candidates()
     - accept_candidate()
+    - accept_candidates()
+    - neighbor_conflicts()
+    - exclusion_radii()
+    - in_domain_mask()
     - exclusion_radius()
-    - intersect_distance()
     - not_in_domain()
     - neighboring_cells()
     - read_vertices()
     - read_intersections()
     - boundary_sampling()
     - sampling_along_line()
-    - intersect_cell()
-    - intersect_grid_init()
-    - intersect_mark_start_cells()
-    - intersect_direction()
-    - intersect_mark_next_cells()
-    - intersect_crossing_cell_wall()
-    - intersect_cell_sign()
     - occupancy_cell()
     - occupancy_undersampled()
     - occupancy_grid_update()
@@ -94,10 +94,22 @@ def main_init(c):  # polygons, intersections):
             c.intersect_endpts.append(well_pts[i])
             #print(c.intersect_endpts)
 
-    intersect_grid_init(c)
-    c.coordinates = boundary_sampling(c)
+    c.intersect_start = array(c.intersect_endpts[0::2]).reshape(-1, 2)
+    c.intersect_end = array(c.intersect_endpts[1::2]).reshape(-1, 2)
+    c.intersect_index = SegmentGrid(c.intersect_start, c.intersect_end,
+                                    sqrt(c.intersect_range_sq))
+    boundary_points = boundary_sampling(c)
+
+    # allocate room for about as many nodes as a hexagonal packing at the
+    # largest exclusion radius, add_nodes grows the array if more are needed
+    x, y = array(c.vertices_x), array(c.vertices_y)
+    area = 0.5 * abs(np.dot(x, np.roll(y, 1)) - np.dot(y, np.roll(x, 1)))
+    capacity = len(boundary_points) + int(
+        1.2 * area / c.max_exclusion_radius**2)
+    c.coordinates = zeros((capacity, 3))
+    c.no_of_nodes = 0
+    add_nodes(c, array(boundary_points).reshape(-1, 3))
     c.neighbor_grid = neighbor_grid_init(c)
-    c.no_of_nodes = len(c.coordinates)
 
 
 #####################################################################
@@ -107,9 +119,9 @@ def main_init(c):  # polygons, intersections):
 def main_sample(c):
     """ Runs over already accepted nodes and samples new candidates  on an
     annulus around them. valid candidates are added to c.coordinates
-    c.k candidates are sampled at once. If all k
-    are rejected, move on to next already accepted node. Terminate
-    after their are no new already accepted nodes.
+    c.k candidates are sampled at once and tested together, see
+    accept_candidates. If all k are rejected, move on to next already
+    accepted node. Terminate after their are no new already accepted nodes.
 
 
     Parameters
@@ -129,12 +141,10 @@ def main_sample(c):
     while c.current_node < c.no_of_nodes:  # sample around all accepted nodes
         next_node = False
         while not next_node:
-            next_node = True
-            for j in range(0, c.k):  # sample k candidates around node
-                candidate = new_candidate(c, c.coordinates[c.current_node])
-                if accept_candidate(c, candidate):
-                    c.no_of_nodes = c.no_of_nodes + 1
-                    next_node = False  # stay at  node unless all k candidates are rejected
+            # sample k candidates around node
+            candidates = new_candidates(c, c.coordinates[c.current_node])
+            # stay at  node unless all k candidates are rejected
+            next_node = not accept_candidates(c, candidates).any()
         c.current_node = c.current_node + 1
 
 
@@ -142,7 +152,7 @@ def main_sample(c):
 
 
 #@profile
-def search_undersampled_cells(c):
+def search_undersampled_cells(c, batch_size=256):
     """ Creates the occupancy-grid, searches for empty cells in it and
     uniformly samples candidates in those empty cells. Accepted cells
     are added to c.coordinates.
@@ -152,29 +162,30 @@ def search_undersampled_cells(c):
         c : Poisson Disc Class
             contains input parameters and widely used variables
 
+        batch_size : int
+            number of empty cells whose candidates are tested at once
+
     Returns
     ---------
         None
 
     Notes
     -----
+        Candidates are tested in batches with accept_candidates, which
+        gives the same nodes as testing them one at a time in the same order.
     """
 
     undersampled_x, undersampled_y = occupancy_undersampled(c)
     # indices of empty cells
-    no_of_undersampled = len(undersampled_x)
-    random_permutation = [m for m in range(0, no_of_undersampled)]
-    shuffle(random_permutation)
     # go through empty cells in random order
     # (due to the way empty cells defined, nodes sampled into
     # empty cells only conflict with each other not any nodes
     # sampled in main_sample)
-    while random_permutation:
-        random_integer = random_permutation.pop()
-        candidate = resample(c, undersampled_x[random_integer],
-                             undersampled_y[random_integer])
-        if accept_candidate(c, candidate):
-            c.no_of_nodes = c.no_of_nodes + 1
+    random_permutation = np.random.permutation(len(undersampled_x))
+    candidates = resample(c, undersampled_x[random_permutation],
+                          undersampled_y[random_permutation])
+    for start in range(0, len(candidates), batch_size):
+        accept_candidates(c, candidates[start:start + batch_size])
 
 
 #######################################################################
@@ -202,7 +213,7 @@ def dump_coordinates(c, output_file="points.xyz"):
     col_format = "{:<30}" * 3 + "\n"
     z = c.z_plane
     with open(output_file, 'w') as file_o:
-        for element in c.coordinates:
+        for element in c.coordinates[:c.no_of_nodes].tolist():
             file_o.write(col_format.format(*[element[0], element[1], z]))
 
 
@@ -231,8 +242,8 @@ def plot_coordinates(c, output_file=""):
 
     """
 
-    xcoord = [x[0] for x in c.coordinates]
-    ycoord = [x[1] for x in c.coordinates]
+    xcoord = c.coordinates[:c.no_of_nodes, 0]
+    ycoord = c.coordinates[:c.no_of_nodes, 1]
     plt.axis([
         c.x_min - c.max_exclusion_radius, c.x_max + c.max_exclusion_radius,
         c.y_min - c.max_exclusion_radius, c.y_max + c.max_exclusion_radius
@@ -306,14 +317,73 @@ def neighbor_grid_init(c):
         (c.y_max - c.y_min) * c.neighbor_cell_size_inv)
     neighbor_grid = zeros((c.no_horizontal_neighbor_cells + 1,
                            c.no_vertical_neighbor_cells + 1)).astype(int)
-    for node_number in range(0, len(c.coordinates)):
-        neighbor_grid[neighbor_cell(
-            c, c.coordinates[node_number])] = node_number + 1
-        # every occupied cells is labelled with the node-number (start at 1)
-        # of the node occupying it. empty cells are 0.
+    cells = neighbor_cells(c, c.coordinates[:c.no_of_nodes])
+    neighbor_grid[cells[:, 0], cells[:, 1]] = arange(1, c.no_of_nodes + 1)
+    # every occupied cells is labelled with the node-number (start at 1)
+    # of the node occupying it. empty cells are 0.
     return neighbor_grid
 
 
+#######################################################################
+
+
+def neighbor_cells(c, X):
+    """ Returns look up-Grid indices of the points X
+
+    Parameters
+    -----------
+        c : Poisson Disc Class
+            contains input parameters and widely used variables
+        
+        X : ndarray(float)
+            array with the x,y-coordinates of a point inside the
+            neighbor-grid in the first two columns of each row
+
+    Returns
+    ---------
+        cells : ndarray(int)
+            horizontal and vertical neighbor-cell number of each point
+
+    Notes
+    -----
+
+    """
+    return np.floor((X[:, :2] - array([c.x_min, c.y_min])) *
+                    c.neighbor_cell_size_inv).astype(int)
+
+
+#######################################################################
+
+
+def add_nodes(c, nodes):
+    """ Appends accepted nodes to c.coordinates
+
+    Parameters
+    -----------
+        c : Poisson Disc Class
+            contains input parameters and widely used variables
+        
+        nodes : ndarray(float)
+            x,y-coordinates and local exclusion radius of each node
+
+    Returns
+    ---------
+        None
+
+    Notes
+    -----
+        c.coordinates is allocated ahead of the sampling and doubled in
+        size when it is full, so nodes are not appended one at a time.
+    """
+    end = c.no_of_nodes + len(nodes)
+    if end > len(c.coordinates):
+        grown = zeros((max(end, 2 * len(c.coordinates)), 3))
+        grown[:c.no_of_nodes] = c.coordinates[:c.no_of_nodes]
+        c.coordinates = grown
+    c.coordinates[c.no_of_nodes:end] = nodes
+    c.no_of_nodes = end
+
+
 #######################################################################
 ###########___Functions related to primary Sampling___#################
 
@@ -352,6 +422,37 @@ def new_candidate(c, X):
 #######################################################################
 
 
+def new_candidates(c, X):
+    """ Returns c.k random points in a annular neighborhood of X
+
+    Parameters
+    ------------
+        c : Poisson Disc Class
+            contains input parameters and widely used variables
+        
+        X : ndarray(float)
+            first two entries: x,y-coordinates of a already accepted node.
+            last entry: local exclusion_radius of that node.
+
+    Returns
+    ---------
+        candidates : ndarray(float)
+            c.k x 2 array of x,y- coordinates of potential new nodes.
+
+    Notes
+    -----
+        Same distribution as c.k calls of new_candidate.
+    """
+    samples = np.random.random((c.k, 2))
+    radius = samples[:, 0] * c.max_exclusion_radius + X[2]
+    angle = samples[:, 1] * pi * 2
+    return X[0:2] + np.column_stack((radius * np.cos(angle),
+                                     radius * np.sin(angle)))
+
+
+#######################################################################
+
+
 def accept_candidate(c, candidate):
     """ accepts a candidate p, if no conflicts with domain or already accepted nodes arise
 
@@ -373,50 +474,160 @@ def accept_candidate(c, candidate):
     -----
         If the candidate is accepted, it is added to c.coordinates
         (including its local_exclusion_radius) and the neighbor grid
-        is updated.
+        is updated. See accept_candidates.
 
     """
+    return bool(accept_candidates(c, array(candidate).reshape(1, 2))[0])
 
-    # Checks if candidate is within rectangle defined by polygon
-    if candidate[0] < c.x_min:
-        return False
-    if candidate[0] > c.x_max:
-        return False
-    if candidate[1] < c.y_min:
-        return False
-    if candidate[1] > c.y_max:
-        return False
-        # neighbor_grid[neigbor_cell(...)] causes error if candidate
-        # is outside of rectangle bounded by x/y_min/max.
-
-    # Checks if neighbor-cell is already occupied
-    candidates_neighbor_cell = neighbor_cell(c, candidate)
-    if c.neighbor_grid[candidates_neighbor_cell] != 0:
-        return False
-
-    # Checks if p is within polygon
-    if not in_domain(c, candidate):
-        return False
 
-    # Checks if any closeby points conflict
-    candidates_ex_rad = exclusion_radius(c, candidate)
-    candidates_ex_rad_sq = candidates_ex_rad**2
-    for node_number in neighboring_cells(c, candidates_neighbor_cell,
-                                         candidates_ex_rad):
+#######################################################################
 
-        closeby_node = c.coordinates[node_number - 1]
 
-        # last entry contains loc. ex_rad.
-        closeby_ex_rad_sq = closeby_node[2]**2
-        if distance_sq(candidate, closeby_node) < min(candidates_ex_rad_sq,
-                                                      closeby_ex_rad_sq):
-            return False
+def accept_candidates(c, candidates):
+    """ accepts the candidates that have no conflicts with the domain, already
+    accepted nodes, or the candidates before them
 
-    # Appends candidate and its loc. ex-rad to accepted nodes and updates
+    Parameters
+    ------------
+        c : Poisson Disc Class
+            contains input parameters and widely used variables
+        
+        candidates : ndarray(float)
+            n x 2 array of x,y-coordinates of potential new nodes
+
+    Returns
+    ---------
+        accepted : ndarray(bool)
+            True for every candidate accepted as new node
+
+    Notes
+    -----
+        The accepted candidates are the same as if the candidates were
+        tested one at a time in order. Each test is done for all candidates
+        at once, dropping the rejected ones before the next test: the
+        bounding rectangle, the neighbor cell, the polygon, and the
+        distance to already accepted nodes. The remaining candidates are
+        then checked against each other in order.
+
+        Accepted candidates are added to c.coordinates (including their
+        local exclusion radius), c.no_of_nodes and the neighbor grid are
+        updated.
+    """
+    accepted = zeros(len(candidates), dtype=bool)
+    # Checks if candidates are within rectangle defined by polygon
+    # neighbor_grid[...] causes error if candidate
+    # is outside of rectangle bounded by x/y_min/max.
+    index = nonzero((candidates[:, 0] >= c.x_min)
+                    & (candidates[:, 0] <= c.x_max)
+                    & (candidates[:, 1] >= c.y_min)
+                    & (candidates[:, 1] <= c.y_max))[0]
+    X = candidates[index]
+
+    if len(index) == 0:
+        return accepted
+
+    # Checks if neighbor-cells are already occupied
+    cells = neighbor_cells(c, X)
+    keep = c.neighbor_grid[cells[:, 0], cells[:, 1]] == 0
+    index, X, cells = index[keep], X[keep], cells[keep]
+    if len(index) == 0:
+        return accepted
+
+    # Checks if candidates are within polygon
+    keep = in_domain_mask(c, X)
+    index, X, cells = index[keep], X[keep], cells[keep]
+    if len(index) == 0:
+        return accepted
+
+    # Checks if any closeby points conflict
+    ex_rad = exclusion_radii(c, X)
+    keep = ~neighbor_conflicts(c, X, cells, ex_rad)
+    index, X, cells, ex_rad = index[keep], X[keep], cells[keep], ex_rad[keep]
+
+    # Candidates conflict with each other if they are too close or share a
+    # neighbor-cell. Go through them in order, keeping those without a
+    # conflict with a kept candidate
+    if len(index) > 1:
+        diff = X[:, None, :] - X[None, :, :]
+        ex_rad_sq = np.minimum(ex_rad[:, None], ex_rad[None, :])**2
+        conflict = ((diff[:, :, 0]**2 + diff[:, :, 1]**2) < ex_rad_sq) | (
+            (cells[:, None, 0] == cells[None, :, 0]) &
+            (cells[:, None, 1] == cells[None, :, 1]))
+        kept = []
+        for i, row in enumerate(conflict.tolist()):
+            if not any(row[j] for j in kept):
+                kept.append(i)
+        index, X, cells, ex_rad = index[kept], X[kept], cells[kept], ex_rad[
+            kept]
+
+    # Appends candidates and their loc. ex-rad to accepted nodes and updates
     # neighbor-cells
-    c.coordinates.append(append(candidate, candidates_ex_rad))
-    c.neighbor_grid[candidates_neighbor_cell] = c.no_of_nodes + 1
-    return True
+    c.neighbor_grid[cells[:, 0],
+                    cells[:, 1]] = c.no_of_nodes + 1 + arange(len(index))
+    add_nodes(c, np.column_stack((X, ex_rad)))
+    accepted[index] = True
+    return accepted
+
+
+#######################################################################
+
+
+def neighbor_conflicts(c, X, cells, ex_rad):
+    """ Checks candidates against the already accepted nodes
+
+    Parameters
+    ------------
+        c : Poisson Disc Class
+            contains input parameters and widely used variables
+        
+        X : ndarray(float)
+            n x 2 array of x,y-coordinates of candidates
+
+        cells : ndarray(int)
+            neighbor-cell index (x,y) of each candidate
+
+        ex_rad : ndarray(float)
+            local exclusion radius of each candidate
+
+    Returns
+    ---------
+        conflict : ndarray(bool)
+            True for every candidate closer to an accepted node than
+            the smaller of their exclusion radii
+
+    Notes
+    -----
+        Looks at the same neighbor-cells as neighboring_cells for the
+        largest exclusion radius among the candidates, skipping cells that are
+        too far away to hold a conflicting node.
+    """
+    max_cell_distance = ceil(ex_rad.max() * c.neighbor_cell_size_inv)
+    if max_cell_distance not in c.neighbor_offsets:
+        # cells whose closest point is at least the exclusion radius away
+        # cannot contain a conflicting node
+        offset = arange(-max_cell_distance, max_cell_distance + 1)
+        dx, dy = np.meshgrid(offset, offset, indexing='ij')
+        gap_sq = np.maximum(abs(dx) - 1, 0)**2 + np.maximum(abs(dy) - 1,
+                                                            0)**2
+        close = gap_sq < max_cell_distance**2
+        c.neighbor_offsets[max_cell_distance] = (dx[close], dy[close])
+    dx, dy = c.neighbor_offsets[max_cell_distance]
+
+    cell_x = cells[:, 0, None] + dx
+    cell_y = cells[:, 1, None] + dy
+    valid = (cell_x >= 0) & (cell_x <= c.no_horizontal_neighbor_cells) & (
+        cell_y >= 0) & (cell_y <= c.no_vertical_neighbor_cells)
+    node_number = c.neighbor_grid[np.where(valid, cell_x, 0),
+                                  np.where(valid, cell_y, 0)]
+    node_number[~valid] = 0
+    row, col = nonzero(node_number)
+    closeby_node = c.coordinates[node_number[row, col] - 1]
+    dist_sq = (X[row, 0] - closeby_node[:, 0])**2 + (X[row, 1] -
+                                                     closeby_node[:, 1])**2
+    too_close = dist_sq < np.minimum(ex_rad[row], closeby_node[:, 2])**2
+    conflict = zeros(len(X), dtype=bool)
+    conflict[row[too_close]] = True
+    return conflict
 
 
 #######################################################################
@@ -444,81 +655,44 @@ def exclusion_radius(c, X):
 
         """
 
-    try:
-        closeby_intersections = c.intersect_cells[intersect_cell(c, X)]
-        # if accessing c.intersect_cells raises a KeyError nothing was
-        # assigned to the key intersect_cell(c,X) i.e. no intersection is
-        # close enough to influence the exclusion radius at X
-        # otherwise a list of intersection numbers is returned.
-        closest_intersect_distance_sq = intersect_distance_sq(
-            c, X, closeby_intersections)
-        if closest_intersect_distance_sq >= c.intersect_range_sq:
-            local_exclusion_radius = c.max_exclusion_radius
-            return local_exclusion_radius
-        else:
-            D = sqrt(closest_intersect_distance_sq)
-            # delaying this sqrt till here, means many cases didn't pass the
-            # if-statements reducing the overall times a sqrt is calculated
-            local_exclusion_radius = max(c.A * (D - c.F * c.H) + .5 * c.H,
-                                         .5 * c.H)
-            return local_exclusion_radius
-    except KeyError:
-        local_exclusion_radius = c.max_exclusion_radius
-        return local_exclusion_radius
+    return exclusion_radii(c, np.asarray(X, dtype=float)[None, :2])[0]
 
 
 ###################################################################
 
 
-def intersect_distance_sq(c, X, closeby_intersections):
-    """ returns square distance to closest intersection
+def exclusion_radii(c, X):
+    """ returns the local min-distance of each point in X
 
     Parameters
-    -----------
+    ------------
         c : Poisson Disc Class
             contains input parameters and widely used variables
         
         X : ndarray(float)
-            x,y-coordinates of a node
-        
-        closeby_intersections : list(int)
-            numbers of intersections, that pass X in a distance of 2*(H*(R+F)) or less
+            n x 2 array of x,y-coordinates of nodes
 
     Returns
     ---------
-        suqare_dist : float
-            square of the distance to the closest intersection
-            of 'inf', if no intersection is closeby.
-
+        local_exclusion_radius : ndarray(float)
+            exclusion radius at each point, same as exclusion_radius
     Notes
     -----
-    """
-    possible_output = []  # min of this list will be output
-    for i in closeby_intersections:
-        intersect_start = c.intersect_endpts[2 * i]
-        intersect_end = c.intersect_endpts[2 * i + 1]
-        projection_on_intersection = dot_product(
-            X - intersect_start, intersect_end - intersect_start)
-        length_of_intersection_sq = distance_sq(intersect_end, intersect_start)
-        if projection_on_intersection <= 0 or projection_on_intersection >= length_of_intersection_sq:
-            # If one of the endpoints is closest to X
-            possible_output = possible_output + \
-                [distance_sq(intersect_start, X), distance_sq(intersect_end, X)]
-            # put distances to either end point on poss.output list
-        else:
-            dist_to_line_sq = norm_sq((X - intersect_start) -
-                                      (intersect_end - intersect_start) *
-                                      projection_on_intersection /
-                                      (length_of_intersection_sq))
-            # square distance from point to infinite line defined by start and
-            # end point
-            possible_output.append(dist_to_line_sq)
-
-    square_dist = min(possible_output)
-    return square_dist
+        The distance to the closest intersection is looked up for all
+        points at once in c.intersect_index, intersections further away than
+        intersect_range do not change the exclusion radius.
+        """
+    local_exclusion_radius = np.full(len(X), c.max_exclusion_radius)
+    closest_intersect_distance_sq = c.intersect_index.distance_sq(
+        X, sqrt(c.intersect_range_sq))
+    near = closest_intersect_distance_sq < c.intersect_range_sq
+    D = np.sqrt(closest_intersect_distance_sq[near])
+    local_exclusion_radius[near] = np.maximum(c.A * (D - c.F * c.H) + .5 * c.H,
+                                              .5 * c.H)
+    return local_exclusion_radius
 
 
-####################################################################
+###################################################################
 
 
 def in_domain(c, X):
@@ -588,6 +762,37 @@ def in_domain(c, X):
 #######################################################################
 
 
+def in_domain_mask(c, X):
+    """ Tests which of the nodes X are within the polyon defined by c.vertices.
+
+    Parameters
+    -----------
+        c : Poisson Disc Class
+            contains input parameters and widely used variables
+        
+        X : ndarray(float)
+            n x 2 array of x,y-coordinates of nodes
+
+    Returns
+    ---------
+        inside : ndarray(bool)
+            True for every node that lies within the polygon, same as
+            in_domain
+
+    Notes
+    -----
+        The lower and upper boundary are piecewise linear functions of x,
+        evaluated for all nodes with np.interp.
+    """
+    x, y = X[:, 0], X[:, 1]
+    lower = np.interp(x, c.lower_chain[:, 0], c.lower_chain[:, 1])
+    upper = np.interp(x, c.upper_chain[:, 0], c.upper_chain[:, 1])
+    return (y >= lower) & (y <= upper)
+
+
+#######################################################################
+
+
 def neighboring_cells(c, center_cell, exclusion_radius):
     """ Returns the coordinate number of all non-empty cells neighboring
     the input-index
@@ -695,6 +900,19 @@ def read_vertices(c, path_to_polygon):
             (i - 1) % c.no_of_vertices] - c.vertices_y[i]) / (c.vertices_x[
                 (i - 1) % c.no_of_vertices] - c.vertices_x[i])
         i = (i - 1) % c.no_of_vertices
+
+    # vertices along the lower and upper boundary in order of increasing x
+    for step in [1, -1]:
+        i = c.last_x_min_index if step == 1 else c.first_x_min_index
+        chain = [i]
+        while c.vertices_x[i] < c.x_max:
+            i = (i + step) % c.no_of_vertices
+            chain.append(i)
+        chain = array([vertices[i] for i in chain])
+        if step == 1:
+            c.lower_chain = chain
+        else:
+            c.upper_chain = chain
     del lines
     return vertices
 
@@ -927,336 +1145,6 @@ def sampling_along_line(c, x, y):
     return line_sample
 
 
-#######################################################################
-###########___Functions related to Intersection look up___#############
-
-
-def intersect_cell(c, X):
-    """ Returns Intersect-Grid index of the point X
-
-    Parameters
-    ------------
-        c : Poisson Disc Class
-            contains input parameters and widely used variables
-        
-        X : ndarray(float)
-            x,y-coordinates of the point C
-
-    Returns
-    ---------
-        x,y : int
-            horizontal and vertical intersection_cell_index
-
-    Notes
-    -----
-    """
-    x = floor((X[0] - c.x_min) * c.intersect_grid_inv)
-    y = floor((X[1] - c.y_min) * c.intersect_grid_inv)
-    return x, y
-
-
-#########################################################################
-
-
-#@profile
-def intersect_grid_init(c):
-    """ Initialize Intersect-Grid, looks at all intersections as 
-    directed arrows from start to end and marks cell that are crossed by it and neighboring cells
-
-    Parameters
-    ------------
-        c : Poisson Disc Class
-            contains input parameters and widely used variables
-
-    Returns
-    ---------
-        None
-
-    Notes
-    -----
-        The domain is split into square-cells of side length intersect_range.
-        The cells are numbered by integer indexes (i,j). This function add the
-        number (i,j):m to the dictionary c.intersect_cells if the m-th intersection
-        crosses the cell with index (i,j) are a neighboring cell.
-
-    """
-    c.intersect_cells = {}
-    for intersect_number in range(0, int(len(c.intersect_endpts) / 2)):
-        Start, End = c.intersect_endpts[
-            2 * intersect_number], c.intersect_endpts[2 * intersect_number + 1]
-        current_intersect_cell = intersect_cell(c, Start)
-        final_intersect_cell = intersect_cell(c, End)
-        intersect_mark_start_cells(c, current_intersect_cell, intersect_number)
-        delta_x, delta_y = End[0] - Start[0], End[1] - Start[1]
-        if delta_x != 0:
-            y_intercept = Start[1] - Start[0] * delta_y / delta_x
-        else:
-            y_intercept = Start[0]
-            # if the intersection is parallel to the y-axis, its x-value is
-            # stored
-        directions = intersect_direction(c, delta_x, delta_y)
-        # Does intersection point north, west, northwest,... ?
-        while (current_intersect_cell[0] != final_intersect_cell[0]
-               or current_intersect_cell[1] != final_intersect_cell[1]):
-            for direction in directions:
-                if intersect_crossing_cell_wall(c, direction,
-                                                current_intersect_cell,
-                                                delta_x, delta_y, y_intercept):
-                    current_intersect_cell = intersect_mark_next_cells(
-                        c, direction, current_intersect_cell, intersect_number)
-                    # next cell the intersection passes
-                    break
-
-
-#######################################################################
-
-
-def intersect_mark_start_cells(c, center_cell, intersect_number):
-    """ Adds the intersection number to the center cell and all its 8 neighbor cells in
-    the dictionary c.intersect_cells. Marks 3x3 cells
-
-    Parameters
-    ------------
-        c : Poisson Disc Class
-            contains input parameters and widely used variables
-        
-        center_cell : ndarrya(int)
-            index-pair of an intersection-cell
-        
-        intersect_number : int
-            contains the number of an intersection if the are enumerated starting at 1.
-
-    Returns
-    ---------
-
-    Notes
-    -----
-        Adds the intersection number to the center cell and all its 8 neighbor cells in
-        the dictionary c.intersect_cells
-    """
-
-    for j in range(0, 9):  # loop through 3x3 grid around center cell
-        try:
-            c.intersect_cells[center_cell[0] - 1 + floor(j / 3),
-                              center_cell[1] - 1 +
-                              (j % 3)].append(intersect_number)
-            # if key already contains a list append current intersection number
-            # else exception is raised and a list is created for that key.
-        except BaseException:
-            c.intersect_cells[center_cell[0] - 1 + floor(j / 3),
-                              center_cell[1] - 1 +
-                              (j % 3)] = [intersect_number]
-
-
-#######################################################################
-
-
-def intersect_direction(c, delta_x, delta_y):
-    """ Determines the direction and intersection is pointing if interpreted as an arrow from start to end.( right, left, up, down, combinations possible)
-
-    Parameters
-    ---------
-        c : Poisson Disc Class
-            contains input parameters and widely used variables
-        
-        delta_x/delta_y : float
-            x/y distance between start and end point of an intersection
-
-    Returns
-    ---------
-        directions : list(int)
-            up to 2 numbers between 1 and 4 corresponding to the directions
-            1-> right, 3->left, 2->up and 4->down.
-
-    Notes
-    -----
-    This is used to determine which sides of a intersect-cell an intersection
-    could cross.
-
-    """
-
-    directions = []
-    if delta_x > 0:
-        directions.append(1)  # right
-    elif delta_x < 0:
-        directions.append(3)  # left
-    if delta_y > 0:
-        directions.append(2)  # up
-    elif delta_y < 0:
-        directions.append(4)  # down
-    return directions
-
-
-#######################################################################
-
-
-def intersect_mark_next_cells(c, direction, center_cell, intersect_number):
-    """ Determines the next intersect-cell the current intersection is crossing
-    and adds all neighboring cells of that cell to the dictionary
-    c.intersect_cells.
-
-    Parameters
-    -----------
-        c : Poisson Disc Class
-            contains input parameters and widely used variables
-        
-        direction : list(int)
-            integer between 1 and 4 corresponding to directions
-                right,left,up,down (1,3,2,4)
-        
-        center_cell : ndarray(int)
-            index-pair of an intersection-cell
-        
-        intersect_number : int
-            number of an intersection if they were enumerated starting at 1
-
-    Returns
-    ---------
-        new_center_cell : ndarray(int)
-            index-pair of the most recent cell known to be crossed by the
-            current intersection
-
-    Notes
-    -----
-        5 of the 8 neighboring cells of new_center_cell are already added to
-        c.intersect_cells, so it is sufficient to only add the remaining 3.
-
-    """
-
-    x_shift = (direction % 2) * (-1)**(int((direction - 1) / 2))
-    y_shift = ((direction - 1) % 2) * (-1)**(int(direction / 2) + 1)
-    # x_shift =+-1 for left/right movement, y_shift =+-1 for up/down movement
-    if x_shift == 0:
-        for j in range(0, 3):
-            # label the 3 cells below/above the 3x3 grid around current cell
-            try:
-                c.intersect_cells[center_cell[0] - 1 + j, center_cell[1] +
-                                  2 * y_shift].append(intersect_number)
-                # if the key for any of those cells already contains a list the
-                # current intersection number is added otherwise an exception is
-                # raised an a list is created for that key instead
-            except BaseException:
-                c.intersect_cells[center_cell[0] - 1 + j, center_cell[1] +
-                                  2 * y_shift] = [intersect_number]
-    else:
-        for j in range(0, 3):
-            # label the 3 cells left/right of the the 3x3 grid around current
-            # cell
-            try:
-                c.intersect_cells[center_cell[0] + 2 * x_shift,
-                                  center_cell[1] - 1 +
-                                  j].append(intersect_number)
-                # if the key for any of those cells already contains a list the
-                # current intersection number is added otherwise an exception is
-                # raised an a list is created for that key instead
-            except BaseException:
-                c.intersect_cells[center_cell[0] + 2 * x_shift,
-                                  center_cell[1] - 1 + j] = [intersect_number]
-    new_center_cell = center_cell + array([x_shift, y_shift])
-    return new_center_cell
-
-
-#######################################################################
-
-
-def intersect_crossing_cell_wall(c, direction, current_cell, delta_x, delta_y,
-                                 y_intercept):
-    """ Determines if intersection crosses cell in given direction
-
-    Parameters
-    -----------
-        c : Poisson Disc Class
-            contains input parameters and widely used variables
-        
-        direction : list(int)
-            integer between 1 and 4 corresponding to the
-            directions right,left,up,down (1,3,2,4)
-        
-        delta_x/delta_y : ndarray(float)
-            x/y distance between start and end point of current intersection
-        
-        y_intercept : float
-            y-value of the y-axis interception of the intersection if extended
-            to an infinite line.
-            x-value of the intersection, if it is parallel to the y-axis
-
-    Returns
-    ---------
-        True/False : bool
-            True if the two nodes of the current intersection-cell into the
-            input direction are on different sides of the intersection
-            (or if one of those nodes lies on the intersection), i.e. if the
-            intersection crosses the side of the cell in that direction.
-            False otherwise.
-
-    Notes
-    -----
-
-
-     """
-
-    cell_nodes_k = c.square_nodes[direction - 1:direction + 1, :]
-    # c.square contains nodes of a unit square
-    # we select the two nodes at the edge of the cell, that
-    # bounds it in the direction the intersection is moving.
-    square_node_1 = (array(current_cell) + cell_nodes_k[0, :]) * (c.R * c.H +
-                                                                  c.F * c.H)
-    square_node_2 = (array(current_cell) + cell_nodes_k[1, :]) * (c.R * c.H +
-                                                                  c.F * c.H)
-    # translates unit-square node into actual nodes of the cell
-    return intersect_cell_sign(c, square_node_1 + array([c.x_min, c.y_min]),
-                               square_node_2 + array([c.x_min, c.y_min]),
-                               delta_x, delta_y, y_intercept)
-
-
-#######################################################################
-
-
-def intersect_cell_sign(c, X, Y, dx, dy, yshift):
-    """ Check intersection cell sign. Returns True if X& Y are on the same side of the line determined by dx,dy and yshift
-    
-    Parameters
-    -----------
-        c : Poisson Disc Class
-            contains input parameters and widely used variables
-        
-        X/Y : ndarray(float)
-            coordinates of two points
-        
-        dx/dy : float
-            x/y distance between start and end points of a line segment
-        
-        yshift : float
-            y-intercept of an infinite line in 2d or x-value of line
-             is parallel to y axis
-    Returns
-    ---------
-        True/False : bool
-            True, if X and Y are on the same side of the line determined by dx,dy,yshift
-            or if one of the points lies on the line
-            False otherwise.
-    Notes
-    -----
-
-    """
-    if dx != 0:
-        sgn_x = dy * (X[0]) - dx * (X[1] - yshift)
-        # right-hand side ==0 if X lies on intersection
-        # <0 if above and >0 of below intersection
-        sgn_y = dy * (Y[0]) - dx * (Y[1] - yshift)
-    else:
-        # if intersection is parallel to y-axis just check if
-        # X, Y are left or right of it
-        sgn_x = X[0] - yshift
-        sgn_y = Y[0] - yshift
-    if sgn_x == 0 or sgn_y == 0:
-        return True
-    if (sgn_x < 0 and sgn_y < 0) or (sgn_x > 0 and sgn_y > 0):
-        return False
-    else:
-        return True
-
-
 #######################################################################
 #############___Functions related to Occupancy Grid___#################
 
@@ -1348,7 +1236,7 @@ def occupancy_undersampled(c):
                 boundary_cell[1])]) = True  # (
             #c.occupancy_grid[boundary_cell[0], :(boundary_cell[1])]) + 1
     # marks cells around boundary points
-    for i in range(0, len(c.coordinates)):
+    for i in range(0, c.no_of_nodes):
         occupancy_mark(c, c.coordinates[i])
     undersampled_cells = nonzero(c.occupancy_grid == 0)
     del c.occupancy_grid
@@ -1401,31 +1289,31 @@ def occupancy_mark(c, node):
 
 
 def resample(c, cell_x, cell_y):
-    """ Uniformly samples a point from an under-sampled cell
+    """ Uniformly samples a point from each under-sampled cell
 
     Parameters
     -----------
         c : Poisson Disc Class
             contains input parameters and widely used variables
         
-        cell_x/cell_y : int
-            x,y index of an empty occupancy cell
+        cell_x/cell_y : ndarray(int)
+            x,y indices of empty occupancy cells
 
     Returns
     ---------
-        candidate : ndarray(float)
-            coordinates of a point within the empty occupancy cell
+        candidates : ndarray(float)
+            coordinates of a point within each empty occupancy cell
 
     Notes
     -----
         by choice of the empty cells, points sampled by this function
         can only conflict with each other.
     """
-    candidate = array([
-        c.x_min + (cell_x + random()) * c.occupancy_grid_side_length,
-        c.y_min + (cell_y + random()) * c.occupancy_grid_side_length
-    ])
-    return candidate
+    samples = np.random.random((len(cell_x), 2))
+    candidates = np.column_stack(
+        (c.x_min + (cell_x + samples[:, 0]) * c.occupancy_grid_side_length,
+         c.y_min + (cell_y + samples[:, 1]) * c.occupancy_grid_side_length))
+    return candidates
 
 
 #######################################################################
@@ -1684,33 +1572,31 @@ def dump_poisson_params(h, coarse_factor, slope, min_dist, max_dist,
     pickle.dump(params, open("poisson_params.p", "wb"))
 
 
-def single_fracture_poisson(fracture_id):
-    """ Generates a point distribution for meshing fracture {fracture_id} using Poisson Disc
-    Sampling. Resulting points are written into 'points/points_{fracture_id}.xyz' file with format:
-
-    x_0 y_0 z_0
-    x_1 y_1 z_1
-    ...
-    x_n y_n z_n
+def sample_fracture(fracture_id, params):
+    """ Poisson Disc Sampling of fracture {fracture_id}
 
     Parameters
     -----------
         fracture_id : int
             fracture index
 
+        params : dict
+            Parameters for point generation, as written by dump_poisson_params
+
     Returns
     ---------
-        None
+        points : numpy array
+            (number of nodes, 3) array of x, y, z coordinates in the plane of the polygon
+
+        runtime : float
+            time used for the sampling in seconds
 
     Notes
     -----
-        Parameters for point generation are in a pickled python dictionary "poisson_params.p"
-        created by dump_poisson_params. 
+        Reads the polygon from 'polys/poly_{fracture_id}.inp' and the intersections
+        from 'intersections/intersections_{fracture_id}.inp'.
 
         """
-
-    local_print_log(f"--> Starting Poisson sampling for fracture number {fracture_id}")
-    params = pickle.load(open("poisson_params.p", "rb"))
     c = pc.Poisson_Variables(fracture_id, f"polys/poly_{fracture_id}.inp",\
                            f"intersections/intersections_{fracture_id}.inp", \
                             params["h"], params["R"], params["A"],\
@@ -1739,10 +1625,48 @@ def single_fracture_poisson(fracture_id):
     ############################################
     ############################################
 
+    points = np.empty((c.no_of_nodes, 3))
+    points[:, :2] = c.coordinates[:c.no_of_nodes, :2]
+    points[:, 2] = c.z_plane
+    runtime = timeit.default_timer() - start
+    return points, runtime
+
+
+def single_fracture_poisson(fracture_id):
+    """ Generates a point distribution for meshing fracture {fracture_id} using Poisson Disc
+    Sampling. Resulting points are written into 'points/points_{fracture_id}.xyz' file with format:
+
+    x_0 y_0 z_0
+    x_1 y_1 z_1
+    ...
+    x_n y_n z_n
+
+    Parameters
+    -----------
+        fracture_id : int
+            fracture index
+
+    Returns
+    ---------
+        None
+
+    Notes
+    -----
+        Parameters for point generation are in a pickled python dictionary "poisson_params.p"
+        created by dump_poisson_params. 
+
+        """
+
+    local_print_log(f"--> Starting Poisson sampling for fracture number {fracture_id}")
+    params = pickle.load(open("poisson_params.p", "rb"))
+    points, runtime = sample_fracture(fracture_id, params)
+
     # write coordinates to file
-    dump_coordinates(c, f'points/points_{fracture_id}.xyz')
+    col_format = "{:<30}" * 3 + "\n"
+    with open(f'points/points_{fracture_id}.xyz', 'w') as file_o:
+        for element in points.tolist():
+            file_o.write(col_format.format(*element))
 
-    runtime = timeit.default_timer() - start
     local_print_log(
         f"--> Poisson sampling for fracture {fracture_id} took {runtime:0.2f} seconds"
     )
@@ -0,0 +1,290 @@
+"""
+.. module:: poisson_network.py
+   :synopsis: Poisson disc sampling of all fractures of a network on a process pool, with the point sets written into one HDF5 file
+.. moduleauthor:: Jeffrey Hyman <jhyman@lanl.gov>
+
+"""
+
+import os
+import pickle
+import random
+import timeit
+import multiprocessing as mp
+import numpy as np
+import h5py
+
+from pydfnworks.dfnGen.meshing.poisson_disc.poisson_functions import sample_fracture
+from pydfnworks.general.logging import local_print_log
+
+POISSON_POINTS_FILE_VERSION = 1
+
+# sampling parameters shared by the workers, set by _init_worker
+_params = {}
+
+
+def _init_worker(params, reseed=False):
+    # forked workers inherit the random state of the parent, draw a fresh one
+    if reseed:
+        random.seed()
+        np.random.seed()
+    _params.clear()
+    _params.update(params)
+
+
+def _sample(fracture_id):
+    """ Sample one fracture with the parameters of the worker. Returns (fracture_id, points, runtime) """
+    points, runtime = sample_fracture(fracture_id, _params)
+    return fracture_id, points, runtime
+
+
+def schedule_by_area(fracture_list, surface_area):
+    """ Order fractures by decreasing surface area, so the most expensive fractures are started first
+
+    Parameters
+    ----------
+        fracture_list : list
+            fracture ids (1-based)
+
+        surface_area : numpy array
+            surface area of each fracture, fracture i is entry i - 1
+
+    Returns
+    -------
+        order : list
+            fracture ids, largest first. Fractures of equal area keep the order of fracture_list.
+    """
+    ids = np.asarray(fracture_list, dtype=int)
+    area = np.asarray(surface_area, dtype=float)[ids - 1]
+    return ids[np.argsort(-area, kind="stable")].tolist()
+
+
+class PoissonPointsWriter():
+    """ Writer of the point sets of several fractures into one HDF5 file, one fracture at a time
+
+    Layout:
+        * points : points of all fractures one after the other, shape (number of points, 3)
+        * offsets : points of the i-th fracture written are rows offsets[i] to offsets[i+1] - 1 of points
+        * fracture_id : fracture id of the i-th point set
+        * time : sampling time of the i-th point set in seconds
+        * index : maps a fracture id to i (-1 if the fracture was not sampled), written by close
+
+    Each fracture is appended to the resizable datasets as it arrives, so only one point set is held in memory. The file version is set by close, so read_poisson_points rejects a file that was not finished.
+    """
+
+    def __init__(self, filename, chunk_size=65536):
+        self.filename = filename
+        self.f5file = h5py.File(filename, "w")
+        self.f5file.create_dataset("points",
+                                   shape=(0, 3),
+                                   maxshape=(None, 3),
+                                   chunks=(chunk_size, 3),
+                                   dtype="float64")
+        self.f5file.create_dataset("offsets",
+                                   data=np.zeros(1, dtype="int64"),
+                                   maxshape=(None, ),
+                                   chunks=(chunk_size, ))
+        self.f5file.create_dataset("fracture_id",
+                                   shape=(0, ),
+                                   maxshape=(None, ),
+                                   chunks=(chunk_size, ),
+                                   dtype="int64")
+        self.f5file.create_dataset("time",
+                                   shape=(0, ),
+                                   maxshape=(None, ),
+                                   chunks=(chunk_size, ),
+                                   dtype="float64")
+        self.num_fractures = 0
+        self.num_points = 0
+
+    def append(self, fracture_id, points, runtime):
+        """ Add the point set of one fracture to the file
+
+        Parameters
+        ----------
+            fracture_id : int
+                fracture id
+
+            points : array-like
+                (number of nodes, 3) points of the fracture
+
+            runtime : float
+                sampling time in seconds
+
+        Returns
+        -------
+            None
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        i = self.num_fractures
+        start = self.num_points
+        self.num_fractures += 1
+        self.num_points += len(points)
+        for name, value in [("fracture_id", fracture_id), ("time", runtime),
+                            ("offsets", self.num_points)]:
+            dset = self.f5file[name]
+            dset.resize((len(dset) + 1, ))
+            dset[-1] = value
+        dset = self.f5file["points"]
+        dset.resize((self.num_points, 3))
+        dset[start:self.num_points] = points
+
+    def close(self):
+        """ Write the fracture index and the file version, and close the file """
+        fracture_ids = self.f5file["fracture_id"][()]
+        index = -np.ones(fracture_ids.max() + 1 if len(fracture_ids) else 0,
+                         dtype=np.int64)
+        index[fracture_ids] = np.arange(len(fracture_ids))
+        self.f5file.create_dataset("index", data=index)
+        self.f5file.attrs["version"] = POISSON_POINTS_FILE_VERSION
+        self.f5file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.f5file.close()
+
+
+def write_poisson_points(filename, fracture_ids, points, runtimes):
+    """ Write the point sets of several fractures into one HDF5 file
+
+    Parameters
+    ----------
+        filename : string
+            name of the HDF5 file
+
+        fracture_ids : list
+            fracture ids, in the order the point sets are stored
+
+        points : list
+            (number of nodes, 3) array of each fracture
+
+        runtimes : list
+            sampling time of each fracture in seconds
+
+    Returns
+    -------
+        None
+
+    Notes
+    -----
+        See PoissonPointsWriter for the layout of the file.
+    """
+    with PoissonPointsWriter(filename) as writer:
+        for fracture_id, p, runtime in zip(fracture_ids, points, runtimes):
+            writer.append(fracture_id, p, runtime)
+
+
+def read_poisson_points(filename, fracture_id=None):
+    """ Read point sets written by write_poisson_points
+
+    Parameters
+    ----------
+        filename : string
+            name of the HDF5 file
+
+        fracture_id : int
+            If provided, only the points of this fracture are read
+
+    Returns
+    -------
+        points : numpy array or dict
+            (number of nodes, 3) array of fracture_id, or a dictionary of these arrays keyed by fracture id
+    """
+    with h5py.File(filename, "r") as f5:
+        if f5.attrs.get("version") != POISSON_POINTS_FILE_VERSION:
+            error = f"Error. {filename} is not a Poisson points file of version {POISSON_POINTS_FILE_VERSION}.\nExiting"
+            local_print_log(error, 'error')
+        offsets = f5["offsets"][()]
+        if fracture_id is not None:
+            index = f5["index"]
+            i = int(index[fracture_id]) if 0 <= fracture_id < len(index) else -1
+            if i < 0:
+                error = f"Error. Fracture {fracture_id} is not in {filename}.\nExiting"
+                local_print_log(error, 'error')
+            return f5["points"][offsets[i]:offsets[i + 1]]
+        points = f5["points"][()]
+        fracture_ids = f5["fracture_id"][()].tolist()
+    return {
+        fid: points[offsets[i]:offsets[i + 1]]
+        for i, fid in enumerate(fracture_ids)
+    }
+
+
+def poisson_sample_network(self, filename="points.h5", ncpu=None):
+    """ Poisson Disc Sampling of all fractures in self.fracture_list on a process pool
+
+    Parameters
+    ----------
+        self : object
+            DFN Class
+
+        filename : string
+            name of the HDF5 file the point sets are written into
+
+        ncpu : int
+            Number of processes. Default is self.ncpu.
+
+    Returns
+    -------
+        None
+
+    Notes
+    -----
+        poisson_params.p (see dump_poisson_params) is read once and handed to each worker when it starts. Fractures are scheduled largest surface area first (self.surface_area), so that the most expensive fractures do not start last and leave the other workers idle. The sampling time and number of points of each fracture are logged, and the points of each fracture are appended to one file as soon as the fracture is sampled (see PoissonPointsWriter), instead of one points/points_{id}.xyz file per fracture.
+    """
+    if not os.path.isfile("poisson_params.p"):
+        error = "Error. Cannot find poisson_params.p. Run dump_poisson_params first.\nExiting"
+        self.print_log(error, 'error')
+    with open("poisson_params.p", "rb") as fp:
+        params = pickle.load(fp)
+
+    fracture_list = [int(fid) for fid in self.fracture_list]
+    surface_area = getattr(self, "surface_area", None)
+    if surface_area is not None and len(surface_area) >= max(fracture_list,
+                                                            default=0):
+        order = schedule_by_area(fracture_list, surface_area)
+    else:
+        self.print_log(
+            "--> Fracture surface areas are not available for all fractures, sampling fractures in the order of fracture_list",
+            'warning')
+        order = fracture_list
+    if ncpu is None:
+        ncpu = self.ncpu
+    ncpu = max(1, min(ncpu, len(order)))
+
+    self.print_log(
+        f"--> Poisson sampling of {len(order)} fractures using {ncpu} processors"
+    )
+    tic = timeit.default_timer()
+    runtimes = []
+    with PoissonPointsWriter(filename) as writer:
+
+        def record(fracture_id, points, runtime):
+            self.print_log(
+                f"--> Fracture {fracture_id}: {len(points)} points in {runtime:0.2f} seconds"
+            )
+            writer.append(fracture_id, points, runtime)
+            runtimes.append(runtime)
+
+        if ncpu > 1:
+            # one fracture per task so the pool hands out fractures in the scheduled order
+            with mp.Pool(ncpu, initializer=_init_worker,
+                         initargs=(params, True)) as pool:
+                for result in pool.imap_unordered(_sample, order,
+                                                  chunksize=1):
+                    record(*result)
+        else:
+            _init_worker(params)
+            for fracture_id in order:
+                record(*_sample(fracture_id))
+
+    elapsed = timeit.default_timer() - tic
+    runtimes = np.array(runtimes)
+    self.print_log(
+        f"--> Poisson sampling complete in {elapsed:0.2f} seconds. Total sampling time {runtimes.sum():0.2f} seconds, longest fracture {runtimes.max(initial=0):0.2f} seconds"
+    )
+    self.print_log(f"--> Points written into {filename}")
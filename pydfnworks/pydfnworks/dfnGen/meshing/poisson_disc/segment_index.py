@@ -0,0 +1,353 @@
+"""
+.. module:: segment_index.py
+   :synopsis: Uniform grid over line segments for batched distance queries, used for the distance to the lines of intersection
+.. moduleauthor:: Jeffrey Hyman <jhyman@lanl.gov>
+
+"""
+
+import numpy as np
+
+# number of (point, segment) pairs evaluated at once
+_max_pairs = 1 << 20
+# largest number of grid cells
+_max_cells = 1 << 20
+
+
+def segment_distances_sq(x, y, start_x, start_y, delta_x, delta_y,
+                         inv_length_sq):
+    """ Square distance of points to line segments, element-wise (broadcasting)
+
+    Parameters
+    ----------
+        x, y : ndarray(float)
+            coordinates of the points
+
+        start_x, start_y : ndarray(float)
+            coordinates of the start points of the segments
+
+        delta_x, delta_y : ndarray(float)
+            end point minus start point of the segments
+
+        inv_length_sq : ndarray(float)
+            1 / squared length of the segments, 0 for segments of length 0
+
+    Returns
+    -------
+        square_dist : ndarray(float)
+            square of the distance from each point to its segment
+    """
+    to_start_x, to_start_y = x - start_x, y - start_y
+    # closest point of the segment is start + fraction * delta
+    fraction = (to_start_x * delta_x + to_start_y * delta_y) * inv_length_sq
+    np.clip(fraction, 0.0, 1.0, out=fraction)
+    to_start_x -= fraction * delta_x
+    to_start_y -= fraction * delta_y
+    return to_start_x * to_start_x + to_start_y * to_start_y
+
+
+def _crossings(a, b, segment):
+    """ Parameters t in (0, 1) where the segments from a to b cross integer grid lines of one axis
+
+    Returns
+    -------
+        owner, t : ndarray
+            segment number and parameter of each crossing
+    """
+    lo, hi = np.minimum(a, b), np.maximum(a, b)
+    first = np.floor(lo) + 1
+    count = np.maximum(np.floor(hi) - first + 1, 0).astype(int)
+    owner = np.repeat(segment, count)
+    # k-th crossing of each segment is grid line first + k
+    k = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+    line = np.repeat(first, count) + k
+    t = (line - a[owner]) / (b[owner] - a[owner])
+    return owner, t
+
+
+class SegmentGrid():
+    """ Line segments sorted into the cells of a uniform grid
+
+    Parameters
+    ----------
+        start, end : ndarray(float)
+            n x 2 arrays of the end points of the segments
+
+        cell_size : float
+            side length of the grid cells. Default is chosen so that a cell holds about one segment.
+
+    Notes
+    -----
+        Each segment is stored in every cell it passes through, found by
+        splitting the segments where they cross the grid lines. A query looks
+        at the cells around each point that can hold a segment within the
+        search distance, and computes the distances to those segments for all
+        points at once.
+    """
+
+    def __init__(self, start, end, cell_size=None):
+        self.start = np.asarray(start, dtype=float).reshape(-1, 2)
+        self.end = np.asarray(end, dtype=float).reshape(-1, 2)
+        n = len(self.start)
+        self.delta = self.end - self.start
+        length_sq = (self.delta * self.delta).sum(axis=1)
+        # columns of the segment data, gathered by the queries
+        self._start_x = self.start[:, 0].copy()
+        self._start_y = self.start[:, 1].copy()
+        self._delta_x = self.delta[:, 0].copy()
+        self._delta_y = self.delta[:, 1].copy()
+        self._inv_length_sq = np.divide(1.0,
+                                        length_sq,
+                                        out=np.zeros(n),
+                                        where=length_sq > 0)
+        if n > 0:
+            points = np.vstack((self.start, self.end))
+            self.origin = points.min(axis=0)
+            extent = points.max(axis=0) - self.origin
+        else:
+            self.origin = np.zeros(2)
+            extent = np.zeros(2)
+        if cell_size is None or cell_size <= 0:
+            cell_size = np.sqrt(extent[0] * extent[1] / max(n, 1))
+            if cell_size <= 0:
+                cell_size = max(extent.max(), 1.0)
+        # bound the number of cells, the cell lists are stored for all cells
+        cell_size = max(cell_size,
+                        np.sqrt(extent[0] * extent[1] / _max_cells),
+                        extent.max() / _max_cells)
+        self.cell_size = float(cell_size)
+        self.shape = (np.floor(extent / self.cell_size).astype(int) + 1)
+
+        # pieces of the segments between consecutive grid line crossings
+        a = (self.start - self.origin) / self.cell_size
+        b = (self.end - self.origin) / self.cell_size
+        segment = np.arange(n)
+        owner_x, t_x = _crossings(a[:, 0], b[:, 0], segment)
+        owner_y, t_y = _crossings(a[:, 1], b[:, 1], segment)
+        owner = np.concatenate((segment, segment, owner_x, owner_y))
+        t = np.concatenate((np.zeros(n), np.ones(n), t_x, t_y))
+        order = np.lexsort((t, owner))
+        owner, t = owner[order], t[order]
+        piece = owner[1:] == owner[:-1]
+        owner = owner[:-1][piece]
+        t_mid = 0.5 * (t[:-1] + t[1:])[piece]
+        mid = a[owner] + (b[owner] - a[owner]) * t_mid[:, None]
+        cells = np.clip(np.floor(mid).astype(int), 0, self.shape - 1)
+        keys = np.unique(
+            (cells[:, 0] * self.shape[1] + cells[:, 1]) * max(n, 1) + owner)
+        # cells and segment of each (cell, segment) pair
+        self.cells = np.column_stack(
+            (keys // max(n, 1) // self.shape[1],
+             keys // max(n, 1) % self.shape[1]))
+        self.cell_segments = keys % max(n, 1)
+        self._cell_lists = {}
+
+    def __len__(self):
+        return len(self.start)
+
+    def _reach(self, radius):
+        """ Number of cells around a cell that can hold segments within radius (in cells) """
+        return int(np.floor(radius)) + 1
+
+    def _small_enough(self, radius):
+        """ True if the cell lists of radius (in cells) have a bounded size """
+        if radius in self._cell_lists:
+            return True
+        reach = self._reach(radius)
+        cells = (self.shape[0] + 2 * reach) * (self.shape[1] + 2 * reach)
+        pairs = (2 * reach + 1)**2 * len(self.cell_segments)
+        return cells <= 4 * _max_cells and pairs <= 16 * _max_pairs
+
+    def cell_lists(self, radius):
+        """ Segments that can be within radius of the points of each cell
+
+        Parameters
+        ----------
+            radius : float
+                search distance in units of cell_size
+
+        Returns
+        -------
+            start : ndarray(int)
+                segments of cell k are segments[start[k]:start[k+1]]. With reach = floor(radius) + 1, the grid is extended by reach cells on each side, and cell (i,j), where i and j can be from -reach to shape + reach - 1, is k = (i + reach) * (shape[1] + 2 reach) + (j + reach).
+
+            segments : ndarray(int)
+                segment numbers
+
+        Notes
+        -----
+            A segment is listed for every cell that is within radius of a cell
+            it passes through. Lists are computed once for each radius and then
+            reused, so a query only has to look up the cell of each point.
+        """
+        if radius not in self._cell_lists:
+            reach = self._reach(radius)
+            grid = np.arange(-reach, reach + 1)
+            offsets = np.stack(np.meshgrid(grid, grid, indexing="ij"),
+                               axis=-1).reshape(-1, 2)
+            # distance between the closed cells, in cells
+            gap = np.maximum(np.abs(offsets) - 1, 0)
+            offsets = offsets[(gap * gap).sum(axis=1) <= radius * radius]
+            n = max(len(self), 1)
+            shape = self.shape + 2 * reach
+            cells = self.cells[:, None, :] + offsets[None, :, :] + reach
+            keys = (cells[:, :, 0] * shape[1] + cells[:, :, 1]).ravel()
+            segments = np.repeat(self.cell_segments, len(offsets))
+            pairs = np.unique(keys * n + segments)
+            start = np.searchsorted(pairs // n, np.arange(np.prod(shape) + 1))
+            self._cell_lists[radius] = (start, pairs % n)
+        return self._cell_lists[radius]
+
+    def _window_query(self, X, radius, closest_segment=True):
+        """ Closest segment to each point among those listed for its cell, see cell_lists """
+        best = np.full(len(X), np.inf)
+        best_segment = np.full(len(X), -1) if closest_segment else None
+        if len(X) == 0 or len(self) == 0:
+            return best, best_segment
+        reach = self._reach(radius)
+        start, segments = self.cell_lists(radius)
+        # points outside the extended grid are further than radius from all
+        # segments. They are moved to the closest cell, the distances to its
+        # segments are still correct.
+        cells = np.floor((X - self.origin) / self.cell_size).astype(int)
+        cells = np.minimum(np.maximum(cells, -reach),
+                           self.shape + reach - 1) + reach
+        cell = cells[:, 0] * (self.shape[1] + 2 * reach) + cells[:, 1]
+        if len(X) <= 64:
+            # few points, e.g., samples around a single node, mostly share
+            # one or two cells
+            for c in np.unique(cell).tolist():
+                segment = segments[start[c]:start[c + 1]]
+                if len(segment) > 0:
+                    self._closest_in_cell(X, np.flatnonzero(cell == c),
+                                          segment, best, best_segment)
+            return best, best_segment
+        first = start[cell]
+        count = start[cell + 1] - first
+        point = np.flatnonzero(count)
+        if len(point) == 0:
+            return best, best_segment
+        first, count = first[point], count[point]
+        total = count.cumsum()
+        if total[-1] <= _max_pairs:
+            self._closest(X, point, first, count, segments, best,
+                          best_segment)
+            return best, best_segment
+        # evaluate about _max_pairs (point, segment) pairs at a time
+        bounds = np.unique(
+            total.searchsorted(np.arange(0, total[-1], _max_pairs),
+                               side="right"))
+        for lo, hi in zip(bounds, np.append(bounds[1:], len(point))):
+            self._closest(X, point[lo:hi], first[lo:hi], count[lo:hi],
+                          segments, best, best_segment)
+        return best, best_segment
+
+    def _closest(self, X, point, first, count, segments, best, best_segment):
+        """ Set best (and best_segment if not None) of the points from their count segments in segments[first:] """
+        # one entry per (point, nearby segment) pair, grouped by point
+        group = count.cumsum() - count
+        k = np.arange(group[-1] + count[-1]) - np.repeat(group, count)
+        segment = segments[np.repeat(first, count) + k]
+        x = X[point]
+        dist_sq = self._distances_sq(np.repeat(x[:, 0], count),
+                                     np.repeat(x[:, 1], count), segment)
+        closest_sq = np.minimum.reduceat(dist_sq, group)
+        best[point] = closest_sq
+        if best_segment is not None:
+            # first segment of each group at the smallest distance
+            at_min = np.where(dist_sq == np.repeat(closest_sq, count),
+                              np.arange(len(dist_sq)), len(dist_sq))
+            best_segment[point] = segment[np.minimum.reduceat(at_min, group)]
+
+    def _distances_sq(self, x, y, segment):
+        """ Square distances of the points x, y to the segments """
+        return segment_distances_sq(x, y, self._start_x[segment],
+                                    self._start_y[segment],
+                                    self._delta_x[segment],
+                                    self._delta_y[segment],
+                                    self._inv_length_sq[segment])
+
+    def _closest_in_cell(self, X, point, segment, best, best_segment):
+        """ Set best (and best_segment if not None) of the points from the same segments """
+        x = X[point]
+        dist_sq = self._distances_sq(x[:, 0, None], x[:, 1, None], segment)
+        best[point] = dist_sq.min(axis=1)
+        if best_segment is not None:
+            best_segment[point] = segment[dist_sq.argmin(axis=1)]
+
+    def _brute_force(self, X):
+        """ Closest segment to each point, compared with all segments """
+        best = np.full(len(X), np.inf)
+        best_segment = np.full(len(X), -1)
+        if len(self) == 0:
+            return best, best_segment
+        chunk = max(1, _max_pairs // len(self))
+        for lo in range(0, len(X), chunk):
+            x = X[lo:lo + chunk]
+            dist_sq = segment_distances_sq(x[:, 0, None], x[:, 1, None],
+                                           self._start_x, self._start_y,
+                                           self._delta_x, self._delta_y,
+                                           self._inv_length_sq)
+            best_segment[lo:lo + chunk] = dist_sq.argmin(axis=1)
+            best[lo:lo + chunk] = dist_sq.min(axis=1)
+        return best, best_segment
+
+    def nearest(self, X, max_distance=None):
+        """ Closest segment to each point
+
+        Parameters
+        ----------
+            X : ndarray(float)
+                n x 2 array of x,y-coordinates of the points, further columns are ignored
+
+            max_distance : float
+                If provided, only segments within this distance are considered
+
+        Returns
+        -------
+            square_dist : ndarray(float)
+                square of the distance to the closest segment, inf if there is none (within max_distance)
+
+            segment : ndarray(int)
+                number of the closest segment, -1 if there is none
+        """
+        X = np.asarray(X, dtype=float)[:, :2]
+        if max_distance is not None:
+            radius = max_distance / self.cell_size
+            if self._small_enough(radius):
+                best, best_segment = self._window_query(X, radius)
+            else:
+                best, best_segment = self._brute_force(X)
+            far = best > max_distance * max_distance
+            best[far] = np.inf
+            best_segment[far] = -1
+            return best, best_segment
+
+        # grow the search distance until the closest segment found is
+        # certainly the closest, points far from all segments are compared
+        # with all of them
+        best = np.full(len(X), np.inf)
+        best_segment = np.full(len(X), -1)
+        todo = np.arange(len(X))
+        radius = 1
+        while len(todo) > 0 and radius <= self.shape.max() and self._small_enough(radius):
+            d, s = self._window_query(X[todo], radius)
+            done = d <= (radius * self.cell_size)**2
+            best[todo[done]], best_segment[todo[done]] = d[done], s[done]
+            todo = todo[~done]
+            radius *= 2
+        best[todo], best_segment[todo] = self._brute_force(X[todo])
+        return best, best_segment
+
+    def distance_sq(self, X, max_distance=None):
+        """ Square distance from each point to the closest segment, see nearest """
+        if max_distance is not None and self._small_enough(
+                max_distance / self.cell_size):
+            # skips finding the closest segment
+            X = np.asarray(X, dtype=float)[:, :2]
+            best, _ = self._window_query(X,
+                                         max_distance / self.cell_size,
+                                         closest_segment=False)
+            best[best > max_distance * max_distance] = np.inf
+            return best
+        return self.nearest(X, max_distance)[0]
+
@@ -0,0 +1,219 @@
+"""
+.. module:: alias_sampling.py
+   :synopsis: Walker/Vose alias tables for O(1) sampling of downstream nodes
+.. moduleauthor:: Jeffrey Hyman <jhyman@lanl.gov>
+
+"""
+
+import numpy as np
+
+
+def _rank_in_row(rows, events, queries, query_rows, ties_before):
+    """ Count the events in the same row that come before each query
+
+    Parameters
+    ----------
+        rows, events : numpy array
+            row and value of each event, values increasing within a row
+
+        queries, query_rows : numpy array
+            value and row of each query
+
+        ties_before : bool
+            if True an event equal to a query counts as before it
+
+    Returns
+    -------
+        count : numpy array
+            number of events in the row of each query that come before it
+    """
+    num_events = len(events)
+    value = np.concatenate((events, queries))
+    row = np.concatenate((rows, query_rows))
+    is_query = np.concatenate((np.zeros(num_events, dtype=bool),
+                               np.ones(len(queries), dtype=bool)))
+    tie = is_query if ties_before else ~is_query
+    order = np.lexsort((tie, value, row))
+    events_before = np.cumsum(~is_query[order]) - ~is_query[order]
+    count = np.empty(len(queries), dtype=int)
+    count[order[is_query[order]] - num_events] = events_before[is_query[order]]
+    # remove the events of earlier rows
+    first_event = np.searchsorted(rows, query_rows, side='left')
+    return count - first_event
+
+
+def _row_cumsum(values, offsets):
+    """ Cumulative sum of the values within each row
+
+    Parameters
+    ----------
+        values : numpy array
+            values of every row, in CSR order
+
+        offsets : numpy array
+            CSR row offsets
+
+    Returns
+    -------
+        csum : numpy array
+            cumulative sum of each value and the values before it in its row
+
+    Notes
+    -----
+        Rows are grouped by their length rounded up to a power of two and summed as padded 2D arrays. Unlike one cumulative sum over all rows, the sums do not carry the round off of the rows before, so ties between the sums of a row are exact.
+    """
+    counts = np.diff(offsets)
+    csum = np.zeros(len(values))
+    nonempty = np.nonzero(counts > 0)[0]
+    width_exp = np.ceil(np.log2(counts[nonempty])).astype(int)
+    for exp in np.unique(width_exp):
+        rows = nonempty[width_exp == exp]
+        col = np.arange(2**exp)
+        mask = col[None, :] < counts[rows, None]
+        idx = (offsets[rows, None] + col[None, :])[mask]
+        padded = np.zeros(mask.shape)
+        padded[mask] = values[idx]
+        csum[idx] = np.cumsum(padded, axis=1)[mask]
+    return csum
+
+
+def build_alias_tables(weights, offsets):
+    """ Build the Walker alias tables of many discrete distributions at once
+
+    Parameters
+    ----------
+        weights : array-like
+            non-negative weights of every outcome, the outcomes of distribution r are offsets[r] to offsets[r+1] - 1
+
+        offsets : array-like
+            CSR row offsets, length number of distributions + 1
+
+    Returns
+    -------
+        alias_prob : numpy array
+            probability of keeping outcome i when bucket i is selected
+
+        alias : numpy array
+            outcome returned when bucket i is selected and not kept, as a global index into weights
+
+    Notes
+    -----
+        Uses the sweep construction: within each row the buckets below one (light) are filled in order by the buckets above one (heavy), and a heavy bucket that drops below one is filled by the next heavy bucket. Buckets of exactly one keep themselves. Both are found from prefix sums, so there is no loop over rows. Rows with zero total weight keep every bucket (alias_prob one, alias itself).
+    """
+    weights = np.asarray(weights, dtype=float)
+    offsets = np.asarray(offsets, dtype=int)
+    num = len(weights)
+    alias_prob = np.ones(num)
+    alias = np.arange(num)
+    if num == 0:
+        return alias_prob, alias
+
+    counts = np.diff(offsets)
+    row = np.repeat(np.arange(len(counts)), counts)
+    total = np.bincount(row, weights=weights, minlength=len(counts))
+    valid = (total > 0)[row]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scaled = np.where(valid, weights * counts[row] / total[row], 1.0)
+
+    # buckets of exactly one are full, they are neither filled nor demoted
+    light = scaled < 1.0
+    heavy = scaled > 1.0
+
+    # end of the deficit of each light bucket and of the surplus of each
+    # heavy bucket along its row
+    light_end = _row_cumsum(np.where(light, 1.0 - scaled, 0.0), offsets)
+    heavy_end = _row_cumsum(np.where(heavy, scaled - 1.0, 0.0), offsets)
+
+    light_idx = np.nonzero(light)[0]
+    heavy_idx = np.nonzero(heavy)[0]
+    light_row = row[light_idx]
+    heavy_row = row[heavy_idx]
+    num_heavy = np.bincount(heavy_row, minlength=len(counts))
+    num_light = np.bincount(light_row, minlength=len(counts))
+    first_heavy = np.searchsorted(heavy_row, np.arange(len(counts)))
+    first_light = np.searchsorted(light_row, np.arange(len(counts)))
+
+    # a light bucket is filled by the first heavy bucket whose surplus
+    # ends after the start of its deficit
+    # the deficit starts where the one before it ends, taken from the same
+    # prefix sums so both sides of a tie round the same way
+    light_start = np.zeros(len(light_idx))
+    light_start[1:] = light_end[light_idx[:-1]]
+    light_start[first_light[np.unique(light_row)]] = 0.0
+    k = _rank_in_row(heavy_row, heavy_end[heavy_idx], light_start, light_row,
+                     True)
+    k = np.minimum(k, num_heavy[light_row] - 1)
+    # round off can leave a light bucket in a row without heavy buckets, it
+    # is one up to round off and keeps itself
+    filled = num_heavy[light_row] > 0
+    source = first_heavy[light_row[filled]] + k[filled]
+    alias_prob[light_idx[filled]] = scaled[light_idx[filled]]
+    alias[light_idx[filled]] = heavy_idx[source]
+
+    # a heavy bucket drops below one at the end of the first light deficit
+    # that reaches the end of its surplus, and is filled by the next heavy
+    if len(heavy_idx) > 0 and len(light_idx) > 0:
+        k = _rank_in_row(light_row, light_end[light_idx],
+                         heavy_end[heavy_idx], heavy_row, False)
+        rank = np.arange(len(heavy_idx)) - first_heavy[heavy_row]
+        demoted = (k < num_light[heavy_row]) & (rank <
+                                                 num_heavy[heavy_row] - 1)
+        k = np.minimum(k, num_light[heavy_row] - 1)
+        reached = light_end[light_idx[first_light[heavy_row] + k]]
+        keep = np.clip(1.0 + heavy_end[heavy_idx] - reached, 0.0, 1.0)
+        demoted_idx = heavy_idx[demoted]
+        alias_prob[demoted_idx] = keep[demoted]
+        alias[demoted_idx] = heavy_idx[np.nonzero(demoted)[0] + 1]
+
+    # rows without outflow keep every bucket
+    alias_prob[~valid] = 1.0
+    alias[~valid] = np.arange(num)[~valid]
+    return alias_prob, alias
+
+
+def build_alias_table(prob):
+    """ Build the Walker alias table of a discrete distribution
+
+    Parameters
+    ----------
+        prob : array-like
+            probabilities (or non-negative weights) of each outcome
+
+    Returns
+    -------
+        alias_prob : numpy array
+            probability of keeping outcome i when bucket i is selected
+
+        alias : numpy array
+            outcome returned when bucket i is selected and not kept
+
+    Notes
+    -----
+        A sample is drawn with one uniform variate, see sample_alias. Single row version of build_alias_tables.
+    """
+    return build_alias_tables(prob, [0, len(prob)])
+
+
+def sample_alias(alias_prob, alias, xi):
+    """ Draw one outcome from an alias table
+
+    Parameters
+    ----------
+        alias_prob, alias : numpy array
+            alias table from build_alias_table
+
+        xi : float
+            sample from U[0,1)
+
+    Returns
+    -------
+        i : int
+            index of the selected outcome
+    """
+    n = len(alias_prob)
+    u = xi * n
+    # xi * n can round up to n for xi close to one
+    i = min(int(u), n - 1)
+    if u - i < alias_prob[i]:
+        return i
+    return alias[i]
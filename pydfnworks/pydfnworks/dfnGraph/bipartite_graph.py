@@ -3,13 +3,15 @@ import numpy as np
 from itertools import islice
 
 from pydfnworks.dfnGraph.intersection_graph import boundary_index
+from pydfnworks.dfnGraph.fracture_properties import load_fracture_properties
 from pydfnworks.general.logging import local_print_log, print_log
 
 def create_bipartite_graph(
         inflow,
         outflow,
         intersection_list='dfnGen_output/intersection_list.dat',
-        fracture_info='dfnGen_output/fracture_info.dat'):
+        fracture_info='dfnGen_output/fracture_info.dat',
+        fracture_properties=None):
     """Creates a bipartite graph of the DFN.
     Nodes are in two sets, fractures and intersections, with edges connecting them.
 
@@ -26,7 +28,10 @@ def create_bipartite_graph(
              filename of intersections generated from DFN
         
         fracture_infor : str
-                filename for fracture information
+                filename for fracture information, read if fracture_properties is not provided
+
+        fracture_properties : FractureProperties
+            fracture property table
 
     Returns
     -------
@@ -95,13 +100,15 @@ def create_bipartite_graph(
     B.add_edge('intersection_t', 't')
 
     # add fracture info
-    with open(fracture_info) as f:
-        header = f.readline()
-        data = f.read().strip()
-        for fracture, line in enumerate(data.split('\n'), 1):
-            c, perm, aperture = line.split(' ')
-            B.nodes[fracture]['perm'] = float(perm)
-            B.nodes[fracture]['aperture'] = float(aperture)
+    if fracture_properties is None:
+        fracture_properties = load_fracture_properties(fracture_info)
+    for fracture, perm, aperture in zip(
+            range(1, fracture_properties.num_frac + 1),
+            fracture_properties.perm.tolist(),
+            fracture_properties.aperture.tolist()):
+        if fracture in B:
+            B.nodes[fracture]['perm'] = perm
+            B.nodes[fracture]['aperture'] = aperture
 
     local_print_log("--> Complete")
 
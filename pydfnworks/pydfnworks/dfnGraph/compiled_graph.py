@@ -0,0 +1,169 @@
+"""
+.. module:: compiled_graph.py
+   :synopsis: Compile a graph flow solution into flat arrays for batched particle tracking
+.. moduleauthor:: Jeffrey Hyman <jhyman@lanl.gov>
+
+"""
+
+import numpy as np
+
+from pydfnworks.dfnGraph.alias_sampling import build_alias_tables
+from pydfnworks.dfnGraph.graph_flow import flow_graph_to_arrays
+from pydfnworks.general.logging import local_print_log
+
+
+def compile_flow_graph(G):
+    """ Compile the directed graph returned by graph_flow into compressed sparse row (CSR) arrays
+
+    Parameters
+    ----------
+        G : NetworkX graph
+            Directed Graph obtained from output of graph_flow
+
+    Returns
+    -------
+        cg : dict
+            Dictionary of numpy arrays describing the graph. See compile_flow_arrays.
+
+    Notes
+    -----
+        Nodes are indexed 0 to num_nodes - 1 in the order of G.nodes().
+    """
+    return compile_flow_arrays(flow_graph_to_arrays(G))
+
+
+def compile_flow_arrays(flow):
+    """ Compile a flow solution stored as arrays into compressed sparse row (CSR) arrays
+
+    Parameters
+    ----------
+        flow : dict
+            flow solution from graph_flow.solve_flow_arrays or graph_flow.load_graph_flow_arrays, with edges oriented from upstream (u) to downstream (v)
+
+    Returns
+    -------
+        cg : dict
+            Dictionary of numpy arrays describing the graph. See notes.
+
+    Notes
+    -----
+        Nodes are indexed 0 to num_nodes - 1 in the order of flow["nodes"]. The downstream edges of node i are offsets[i] to offsets[i+1] - 1.
+
+        Node arrays: node_ids, x, y, z, inletflag, outletflag
+
+        Edge arrays: source, children, alias_prob, alias, time, length, b, velocity, frac
+
+        alias_prob and alias hold the Walker alias table of each node's outflow probabilities (vol_flow_rate weighted), with alias given as a global edge index, so the next edge for a batch of particles is drawn in O(1) per particle.
+    """
+
+    local_print_log("--> Compiling flow graph into arrays")
+    node_ids = np.asarray(flow["nodes"])
+    num_nodes = len(node_ids)
+    x = np.asarray(flow["x"], dtype=float)
+    y = np.asarray(flow["y"], dtype=float)
+    z = np.asarray(flow["z"], dtype=float)
+    inletflag = np.asarray(flow["inletflag"], dtype=bool)
+    outletflag = np.asarray(flow["outletflag"], dtype=bool)
+
+    source = np.asarray(flow["u"], dtype=int)
+    children = np.asarray(flow["v"], dtype=int)
+    num_edges = len(source)
+    vol_flow_rate = np.asarray(flow["vol_flow_rate"], dtype=float)
+    time = np.asarray(flow["time"], dtype=float)
+    length = np.asarray(flow["length"], dtype=float)
+    b = np.asarray(flow["b"], dtype=float)
+    velocity = np.asarray(flow["velocity"], dtype=float)
+    frac = np.asarray(flow["frac"], dtype=int)
+
+    # sort edges by upstream node to get the CSR layout
+    order = np.argsort(source, kind='stable')
+    source = source[order]
+    children = children[order]
+    vol_flow_rate = vol_flow_rate[order]
+    offsets = np.zeros(num_nodes + 1, dtype=int)
+    offsets[1:] = np.cumsum(np.bincount(source, minlength=num_nodes))
+
+    # outflow probabilities are only defined away from the outlet
+    vol_flow_rate[outletflag[source]] = 0
+    alias_prob, alias = build_alias_tables(vol_flow_rate, offsets)
+
+    cg = {
+        "num_nodes": num_nodes,
+        "num_edges": num_edges,
+        "node_ids": node_ids,
+        "x": x,
+        "y": y,
+        "z": z,
+        "inletflag": inletflag,
+        "outletflag": outletflag,
+        "offsets": offsets,
+        "source": source,
+        "children": children,
+        "alias_prob": alias_prob,
+        "alias": alias,
+        "time": time[order],
+        "length": length[order],
+        "b": b[order],
+        "velocity": velocity[order],
+        "frac": frac[order]
+    }
+    local_print_log(
+        f"--> Compiled graph has {num_nodes} nodes and {num_edges} edges")
+    return cg
+
+
+def node_indices(cg, nodes):
+    """ Convert NetworkX node labels into indices of the compiled graph
+
+    Parameters
+    ----------
+        cg : dict
+            compiled graph from compile_flow_graph
+
+        nodes : array-like
+            NetworkX node labels
+
+    Returns
+    -------
+        idx : numpy array
+            index of each node in the compiled graph arrays
+    """
+    node_ids = cg["node_ids"]
+    order = np.argsort(node_ids, kind='stable')
+    idx = order[np.searchsorted(node_ids[order], nodes)]
+    if not np.array_equal(node_ids[idx], np.asarray(nodes)):
+        error = "Error. Node label not found in the compiled graph.\nExiting"
+        local_print_log(error, 'error')
+    return idx
+
+
+def select_next_edge(cg, nodes, xi):
+    """ Complete mixing: select the downstream edge for a batch of particles
+
+    Parameters
+    ----------
+        cg : dict
+            compiled graph from compile_flow_graph
+
+        nodes : numpy array
+            current node index of each particle
+
+        xi : numpy array
+            samples from U[0,1), one per particle
+
+    Returns
+    -------
+        edges : numpy array
+            index of the selected edge for each particle
+
+    Notes
+    -----
+        All nodes must have at least one downstream edge. Uses the alias tables built in compile_flow_graph.
+    """
+    start = cg["offsets"][nodes]
+    degree = cg["offsets"][nodes + 1] - start
+    u = xi * degree
+    bucket = np.minimum(u.astype(int), degree - 1)
+    edges = start + bucket
+    keep = (u - bucket) < cg["alias_prob"][edges]
+    return np.where(keep, edges, cg["alias"][edges])
@@ -43,12 +43,16 @@ def create_graph(self, graph_type, inflow, outflow):
 """
     ## write hydraulic properties to file.
     self.dump_hydraulic_values()
+    fracture_properties = self.get_fracture_properties()
     if graph_type == "fracture":
-        G = create_fracture_graph(inflow, outflow)
+        G = create_fracture_graph(inflow, outflow, fracture_properties)
     elif graph_type == "intersection":
-        G = create_intersection_graph(inflow, outflow)
+        G = create_intersection_graph(
+            inflow, outflow, fracture_properties=fracture_properties)
     elif graph_type == "bipartite":
-        G = create_bipartite_graph(inflow, outflow)
+        G = create_bipartite_graph(inflow,
+                                   outflow,
+                                   fracture_properties=fracture_properties)
     else:
         self.print_log(
             f"Warning. Unknown graph type.\nType provided: {graph_type}.\nAccetable names: fracture, intersection, bipartite.\nReturning empty graph."
@@ -3,10 +3,11 @@ import numpy as np
 
 from pydfnworks.dfnGraph.graph_attributes import add_perm
 from pydfnworks.general.logging import local_print_log, print_log
+from pydfnworks.general.dfngen_output_cache import load_dfngen_file
 
 from pydfnworks.general.logging import local_print_log
 
-def create_fracture_graph(inflow, outflow):
+def create_fracture_graph(inflow, outflow, fracture_properties=None):
     """ Create a graph based on topology of network. Fractures
     are represented as nodes and if two fractures intersect 
     there is an edge between them in the graph. 
@@ -24,8 +25,8 @@ def create_fracture_graph(inflow, outflow):
         topology_file : string
             Name of adjacency matrix file for a DFN default=connectivity.dat  
         
-        fracture_infor : str
-                filename for fracture information
+        fracture_properties : FractureProperties
+            fracture property table. Default reads dfnGen_output/fracture_info.dat
 
     Returns
     -------
@@ -47,8 +48,10 @@ def create_fracture_graph(inflow, outflow):
     ## Create Source and Target and add edges
     inflow_filename = inflow + ".dat"
     outflow_filename = outflow + ".dat"
-    inflow = np.genfromtxt("dfnGen_output/" + inflow_filename).astype(int)
-    outflow = np.genfromtxt("dfnGen_output/" + outflow_filename).astype(int)
+    inflow = load_dfngen_file("dfnGen_output/" + inflow_filename,
+                              kind="boundary").astype(int)
+    outflow = load_dfngen_file("dfnGen_output/" + outflow_filename,
+                               kind="boundary").astype(int)
 
     try:
         if len(inflow) > 1:
@@ -66,6 +69,6 @@ def create_fracture_graph(inflow, outflow):
     G.add_node('t')
     G.add_edges_from(zip(['s'] * (len(inflow)), inflow))
     G.add_edges_from(zip(outflow, ['t'] * (len(outflow))))
-    add_perm(G)
+    add_perm(G, fracture_properties)
     local_print_log("--> Graph loaded")
     return G
@@ -0,0 +1,133 @@
+"""
+.. module:: fracture_properties.py
+   :synopsis: Per fracture hydraulic properties from fracture_info.dat, loaded once and shared by the graph builders
+.. moduleauthor:: Jeffrey Hyman <jhyman@lanl.gov>
+
+"""
+
+import os
+import numpy as np
+
+from pydfnworks.general.logging import local_print_log
+from pydfnworks.general.dfngen_output_cache import load_dfngen_file
+
+
+def file_stamp(filename):
+    """ Modification time and size of a file, used to detect changes
+
+    Parameters
+    ----------
+        filename : string
+            name of the file
+
+    Returns
+    -------
+        stamp : tuple
+            (modification time in ns, size in bytes), None if the file does not exist
+    """
+    try:
+        st = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class FractureProperties():
+    """ Table of fracture properties with one row per fracture. Fracture i (1-based, as in the graphs) is row i - 1
+
+    Attributes
+    ----------
+        connections : numpy array
+            number of intersections of each fracture
+
+        perm : numpy array
+            fracture permeability [m^2]
+
+        aperture : numpy array
+            fracture aperture [m], as listed in fracture_info.dat
+
+        b : numpy array
+            hydraulic aperture sqrt(12 perm) [m], used on graph edges
+
+        iperm : numpy array
+            1 / perm
+
+        filename : string
+            absolute path of the file the table was read from
+
+        stamp : tuple
+            file_stamp of filename when it was read
+    """
+
+    def __init__(self, connections, perm, aperture, filename=None):
+        self.connections = np.asarray(connections, dtype=int)
+        self.perm = np.asarray(perm, dtype=float)
+        self.aperture = np.asarray(aperture, dtype=float)
+        self.b = np.sqrt(12 * self.perm)
+        self.iperm = 1.0 / self.perm
+        self.filename = filename
+        self.stamp = file_stamp(filename) if filename else None
+
+    @property
+    def num_frac(self):
+        return len(self.perm)
+
+    def is_current(self):
+        """ True if the file has not changed since the table was read """
+        return self.filename is not None and self.stamp == file_stamp(
+            self.filename)
+
+
+def load_fracture_properties(
+        fracture_info="dfnGen_output/fracture_info.dat"):
+    """ Read fracture_info.dat into a FractureProperties table
+
+    Parameters
+    ----------
+        fracture_info : string
+            name of the fracture information file (num_connections perm aperture)
+
+    Returns
+    -------
+        props : FractureProperties
+    """
+    if not os.path.isfile(fracture_info):
+        error = f"Error. Cannot find fracture information file {fracture_info}.\nExiting\n"
+        local_print_log(error, 'error')
+    data = load_dfngen_file(fracture_info, kind="fracture_info")
+    return FractureProperties(data[:, 0], data[:, 1], data[:, 2],
+                              os.path.abspath(fracture_info))
+
+
+def get_fracture_properties(self,
+                            fracture_info="dfnGen_output/fracture_info.dat",
+                            reload=False):
+    """ Fracture property table of the DFN, read once and reused until the file changes
+
+    Parameters
+    ----------
+        self : object
+            DFN Class
+
+        fracture_info : string
+            name of the fracture information file
+
+        reload : bool
+            If True, the file is read even if a current table is cached
+
+    Returns
+    -------
+        props : FractureProperties
+
+    Notes
+    -----
+        Tables are memoized on the DFN object by absolute path. A table is reread when the modification time or size of the file changes, for example after dump_hydraulic_values.
+    """
+    if not hasattr(self, "_fracture_properties"):
+        self._fracture_properties = {}
+    key = os.path.abspath(fracture_info)
+    props = self._fracture_properties.get(key)
+    if reload or props is None or not props.is_current():
+        props = load_fracture_properties(fracture_info)
+        self._fracture_properties[key] = props
+    return props
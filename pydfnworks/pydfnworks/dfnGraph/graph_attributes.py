@@ -2,9 +2,11 @@ import numpy as np
 import networkx as nx
 import sys
 
+from pydfnworks.dfnGraph.fracture_properties import load_fracture_properties
 
 
-def add_perm(G):
+
+def add_perm(G, fracture_properties=None):
     """ Add fracture permeability to Graph. If Graph representation is
     fracture, then permeability is a node attribute. If graph representation 
     is intersection, then permeability is an edge attribute
@@ -15,56 +17,54 @@ def add_perm(G):
         G :networkX graph
             NetworkX Graph based on the DFN
    
-        fracture_infor : str
-                filename for fracture information
+        fracture_properties : FractureProperties
+            fracture property table. Default reads dfnGen_output/fracture_info.dat
+
     Returns
     -------
  
     Notes
     -----
-
+        Values are looked up for all nodes / edges at once and then written into the attribute dictionaries.
 """
 
-    perm = np.genfromtxt("dfnGen_output/fracture_info.dat", skip_header=1)[:,
-                                                                           1]
-    aperture = np.sqrt(12 * perm)
+    if fracture_properties is None:
+        fracture_properties = load_fracture_properties()
+    props = fracture_properties
 
     if G.graph['representation'] == "fracture":
-        for n in nx.nodes(G):
-            if n != 's' and n != 't':
-                G.nodes[n]['perm'] = perm[n - 1]
-                G.nodes[n]['b'] = aperture[n - 1]
-                G.nodes[n]['iperm'] = 1.0 / perm[n - 1]
-            else:
-                G.nodes[n]['perm'] = 1.0
-                G.nodes[n]['b'] = 1.0
-                G.nodes[n]['iperm'] = 1.0
+        nodes = [n for n in G.nodes() if n != 's' and n != 't']
+        idx = np.asarray(nodes, dtype=int) - 1
+        for n, perm, b, iperm in zip(nodes, props.perm[idx].tolist(),
+                                     props.b[idx].tolist(),
+                                     props.iperm[idx].tolist()):
+            G.nodes[n].update(perm=perm, b=b, iperm=iperm)
+        for n in ['s', 't']:
+            if n in G:
+                G.nodes[n].update(perm=1.0, b=1.0, iperm=1.0)
 
     elif G.graph['representation'] == "intersection":
-        for u, v in nx.edges(G):
-            frac = G[u][v]['frac']
-            if frac != 's' and frac != 't':
-                G[u][v]['perm'] = perm[frac - 1]
-                G[u][v]['b'] = aperture[frac - 1]
-                G[u][v]['iperm'] = 1.0 / perm[frac - 1]
-            else:
-                G[u][v]['perm'] = 1.0
-                G[u][v]['b'] = 1.0
-                G[u][v]['iperm'] = 1.0
+        edges = list(G.edges(data=True))
+        internal = [d for _, _, d in edges if d['frac'] != 's' and d['frac'] != 't']
+        idx = np.fromiter((d['frac'] for d in internal), int, len(internal)) - 1
+        for d, perm, b, iperm in zip(internal, props.perm[idx].tolist(),
+                                     props.b[idx].tolist(),
+                                     props.iperm[idx].tolist()):
+            d.update(perm=perm, b=b, iperm=iperm)
+        for _, _, d in edges:
+            if d['frac'] == 's' or d['frac'] == 't':
+                d.update(perm=1.0, b=1.0, iperm=1.0)
 
     elif G.graph['representation'] == "bipartite":
         # add fracture info
-        with open("dfnGen_output/fracture_info.dat") as f:
-            f.readline()
-            data = f.read().strip()
-            for fracture, line in enumerate(data.split('\n'), 1):
-                c, perm, aperture = line.split(' ')
-                G.nodes[fracture]['perm'] = float(perm)
-                G.nodes[fracture]['iperm'] = 1.0 / float(perm)
-                G.nodes[fracture]['b'] = float(aperture)
+        for fracture in range(1, props.num_frac + 1):
+            if fracture in G:
+                G.nodes[fracture]['perm'] = float(props.perm[fracture - 1])
+                G.nodes[fracture]['iperm'] = float(props.iperm[fracture - 1])
+                G.nodes[fracture]['b'] = float(props.aperture[fracture - 1])
 
 
-def add_area(G):
+def add_area(G, fracture_properties=None):
     ''' Read Fracture aperture from fracture_info.dat and 
     load on the edges in the graph. Graph must be intersection to node
     representation
@@ -73,25 +73,29 @@ def add_area(G):
     ----------
         G : NetworkX Graph
             networkX graph 
-        fracture_info : str
-            filename for fracture information
+
+        fracture_properties : FractureProperties
+            fracture property table. Default reads dfnGen_output/fracture_info.dat
     
     Returns
     -------
         None
 '''
 
-    aperture = np.genfromtxt("dfnGen_output/fracture_info.dat",
-                             skip_header=1)[:, 2]
-    edges = list(nx.edges(G))
-    for u, v in edges:
-        x = G.edges[u, v]['frac']
-        if x != 's' and x != 't':
-            G.edges[u,
-                    v]['area'] = aperture[x - 1] * (G.nodes[u]['length'] +
-                                                    G.nodes[v]['length']) / 2.0
-        else:
-            G.edges[u, v]['area'] = 1.0
+    if fracture_properties is None:
+        fracture_properties = load_fracture_properties()
+    aperture = fracture_properties.aperture
+    edges = list(G.edges(data=True))
+    internal = [(u, v, d) for u, v, d in edges if d['frac'] != 's' and d['frac'] != 't']
+    idx = np.fromiter((d['frac'] for _, _, d in internal), int, len(internal)) - 1
+    length_u = np.fromiter((G.nodes[u]['length'] for u, _, _ in internal), float, len(internal))
+    length_v = np.fromiter((G.nodes[v]['length'] for _, v, _ in internal), float, len(internal))
+    area = aperture[idx] * (length_u + length_v) / 2.0
+    for (_, _, d), a in zip(internal, area.tolist()):
+        d['area'] = a
+    for _, _, d in edges:
+        if d['frac'] == 's' or d['frac'] == 't':
+            d['area'] = 1.0
     return
 
 
@@ -5,10 +5,34 @@ import scipy.sparse
 import h5py
 
 # pydfnworks modules
-from pydfnworks.dfnGraph.intersection_graph import create_intersection_graph
+from pydfnworks.dfnGraph.intersection_graph import create_intersection_graph, intersection_flow_arrays, fracture_codes
 from pydfnworks.dfnGraph.graph_attributes import add_perm, add_area, add_weight
+from pydfnworks.dfnGraph.graph_flow_solvers import solve_pressure, solve_pressure_cases
+from pydfnworks.dfnGraph.graph_io import write_column, read_column
 from pydfnworks.general.logging import local_print_log, print_log
 
+# edge attributes carried from the undirected graph onto the flow solution
+flow_edge_attributes = ['perm', 'iperm', 'length', 'weight', 'area', 'frac', 'b']
+# edge attributes computed by the flow solve
+flow_solution_attributes = ['flux', 'vol_flow_rate', 'velocity', 'time']
+# node arrays of a flow solution, besides the node ids
+flow_node_attributes = [
+    'old_label', 'inletflag', 'outletflag', 'x', 'y', 'z', 'pressure',
+    'node_frac'
+]
+
+GRAPH_FLOW_FILE_VERSION = 2
+
+# coordinate axis and outward normal direction of each domain face
+face_axis = {
+    "left": (0, -1),
+    "right": (0, 1),
+    "back": (1, -1),
+    "front": (1, 1),
+    "bottom": (2, -1),
+    "top": (2, 1)
+}
+
 def get_laplacian_sparse_mat(G,
                              nodelist=None,
                              weight=None,
@@ -72,12 +96,8 @@ def prepare_graph_with_attributes(inflow, outflow, G=None):
     """
 
     if G == None:
-        G = create_intersection_graph(inflow, outflow)
-
-        Gtilde = G.copy()
-        # need to add aperture
-        add_perm(Gtilde)
-        add_area(Gtilde)
+        # perm, aperture, and area are added by create_intersection_graph
+        Gtilde = create_intersection_graph(inflow, outflow)
         add_weight(Gtilde)
 
     else:
@@ -115,6 +135,266 @@ def prepare_graph_with_attributes(inflow, outflow, G=None):
     return Gtilde
 
 
+def graph_to_flow_arrays(G):
+    """ Extract the node and edge information needed for the flow solve from a NetworkX graph prepared by prepare_graph_with_attributes
+
+    Parameters
+    ----------
+        G : NetworkX graph
+            undirected graph with inletflag / outletflag on nodes and perm, iperm, length, weight, area, frac, and b on edges
+
+    Returns
+    -------
+        arrays : dict
+            nodes : numpy array of node labels. Node i of the arrays is nodes[i]
+            inletflag, outletflag : boolean numpy arrays over nodes
+            x, y, z : node coordinates, if present on the graph 
+            old_label : node labels before prepare_graph_with_attributes, if present on the graph
+            node_frac : (num_nodes, 2) array of the fractures of each intersection (see intersection_graph.fracture_codes), if node attribute frac is a pair
+            u, v : numpy arrays of node indices of each edge 
+            perm, iperm, length, weight, area, frac, b : numpy arrays of edge attributes
+
+    Notes
+    -----
+        This is the only place the flow solve walks the NetworkX attribute dictionaries.
+    """
+    nodes = list(G.nodes())
+    num_nodes = len(nodes)
+    node_index = dict(zip(nodes, range(num_nodes)))
+    arrays = {"nodes": np.asarray(nodes)}
+    arrays["inletflag"] = np.fromiter(
+        (G.nodes[n]['inletflag'] for n in nodes), bool, num_nodes)
+    arrays["outletflag"] = np.fromiter(
+        (G.nodes[n]['outletflag'] for n in nodes), bool, num_nodes)
+    for key in ['x', 'y', 'z']:
+        if num_nodes > 0 and key in G.nodes[nodes[0]]:
+            arrays[key] = np.fromiter((G.nodes[n][key] for n in nodes), float,
+                                      num_nodes)
+    if num_nodes > 0 and isinstance(G.nodes[nodes[0]].get('old_label'),
+                                    (int, np.integer)):
+        arrays["old_label"] = np.asarray(
+            [G.nodes[n]['old_label'] for n in nodes])
+    if num_nodes > 0 and isinstance(G.nodes[nodes[0]].get('frac'),
+                                    (tuple, list)):
+        arrays["node_frac"] = fracture_codes(G.nodes[n]['frac']
+                                             for n in nodes)
+
+    num_edges = G.number_of_edges()
+    u = np.zeros(num_edges, dtype=int)
+    v = np.zeros(num_edges, dtype=int)
+    values = {att: [None] * num_edges for att in flow_edge_attributes}
+    for i, (n1, n2, d) in enumerate(G.edges(data=True)):
+        u[i] = node_index[n1]
+        v[i] = node_index[n2]
+        for att in flow_edge_attributes:
+            if att == 'weight':
+                # unweighted edges count as one, same as nx.to_scipy_sparse_array
+                values[att][i] = d.get(att, 1)
+            else:
+                values[att][i] = d[att]
+    arrays["u"] = u
+    arrays["v"] = v
+    for att in flow_edge_attributes:
+        arrays[att] = np.asarray(values[att])
+    return arrays
+
+
+def assemble_dirichlet_laplacian(num_nodes, u, v, weight, boundary):
+    """ Assemble the weighted graph Laplacian L = D - A in CSR format with Dirichlet rows
+
+    Parameters
+    ----------
+        num_nodes : int
+            number of nodes
+
+        u, v : numpy array
+            node indices of each edge
+
+        weight : numpy array
+            weight of each edge
+
+        boundary : numpy array
+            boolean mask of nodes with a Dirichlet boundary condition
+
+    Returns
+    -------
+        L : scipy.sparse csr_array
+            Laplacian where the rows of boundary nodes are replaced by the identity
+
+    Notes
+    -----
+        Entries are assembled in COO format straight from the edge arrays, so no intermediate LIL matrix is formed.
+    """
+    # the adjacency entries of row u (and row v for the reverse direction)
+    row = np.concatenate((u, v))
+    col = np.concatenate((v, u))
+    w = np.concatenate((weight, weight)).astype(float)
+    degree = np.bincount(row, weights=w, minlength=num_nodes)
+    # drop the off diagonal entries of Dirichlet rows
+    keep = ~boundary[row]
+    diag = np.where(boundary, 1.0, degree)
+    idx = np.arange(num_nodes)
+    L = scipy.sparse.coo_array(
+        (np.concatenate((-w[keep], diag)),
+         (np.concatenate((row[keep], idx)), np.concatenate((col[keep], idx)))),
+        shape=(num_nodes, num_nodes)).tocsr()
+    return L
+
+
+def solve_flow_arrays(arrays,
+                      pressure_in,
+                      pressure_out,
+                      fluid_viscosity,
+                      phi,
+                      solver='direct',
+                      preconditioner='amg',
+                      tol=1e-10,
+                      maxiter=None,
+                      reuse=False):
+    """ Solve for vertex pressures and compute the edge flux, velocity, and travel time as arrays
+
+    Parameters
+    ----------
+        arrays : dict
+            output of graph_to_flow_arrays
+
+        pressure_in : double
+            Value of pressure (in Pa) at inlet
+        
+        pressure_out : double
+            Value of pressure (in Pa) at outlet
+        
+        fluid_viscosity : double
+            in Pa-s
+
+        phi : double
+            Porosity
+
+        solver, preconditioner, tol, maxiter, reuse : 
+            Linear solver options, see graph_flow_solvers.solve_pressure
+
+    Returns
+    -------
+        flow : dict
+            All node entries of arrays plus pressure. Edge entries are restricted to edges with positive flow and oriented from upstream (u) to downstream (v), with flux, vol_flow_rate, velocity and time added. solver_info holds the solve time and residual norm.
+
+    Notes
+    ----------
+        Use flow_arrays_to_graph to build the directed NetworkX graph.
+    """
+    local_print_log("--> Starting Graph flow")
+    inlet = arrays["inletflag"]
+    outlet = arrays["outletflag"]
+    if np.any(inlet & outlet):
+        error = "Incompatible graph: Vertex connected to both source and target\n"
+        local_print_log(error, 'error')
+
+    num_nodes = len(inlet)
+    boundary = inlet | outlet
+    L = assemble_dirichlet_laplacian(num_nodes, arrays["u"], arrays["v"],
+                                     arrays["weight"], boundary)
+    rhs = np.zeros(num_nodes)
+    rhs[inlet] = pressure_in
+    rhs[outlet] = pressure_out
+
+    local_print_log("--> Solving Linear System for pressure at nodes")
+    pressure, solver_info = solve_pressure(L,
+                                           rhs,
+                                           boundary,
+                                           solver=solver,
+                                           preconditioner=preconditioner,
+                                           tol=tol,
+                                           maxiter=maxiter,
+                                           reuse=reuse)
+    local_print_log("--> Computing edge fluxes from flow solution")
+    flow = compute_edge_flow(arrays, pressure, fluid_viscosity, phi)
+    flow["solver_info"] = solver_info
+    local_print_log("--> Graph flow complete")
+    return flow
+
+
+def compute_edge_flow(arrays, pressure, fluid_viscosity, phi):
+    """ Orient edges along the pressure gradient and compute flux, volumetric flow rate, velocity, and travel time
+
+    Parameters
+    ----------
+        arrays : dict
+            output of graph_to_flow_arrays
+
+        pressure : numpy array
+            pressure at every node [Pa]
+
+        fluid_viscosity : double
+            in Pa-s
+
+        phi : double
+            Porosity
+
+    Returns
+    -------
+        flow : dict
+            see solve_flow_arrays
+    """
+    u = arrays["u"]
+    v = arrays["v"]
+    # Find direction of flow
+    forward = pressure[u] > pressure[v]
+    upstream = np.where(forward, u, v)
+    downstream = np.where(forward, v, u)
+    delta_p = pressure[upstream] - pressure[downstream]
+    keep = delta_p > 1e-16
+
+    flow = {}
+    for key, val in arrays.items():
+        if key in flow_edge_attributes:
+            flow[key] = val[keep]
+        else:
+            flow[key] = val
+    flow["pressure"] = pressure
+    flow["u"] = upstream[keep]
+    flow["v"] = downstream[keep]
+    flow["flux"] = (flow["perm"] / fluid_viscosity) * (delta_p[keep] /
+                                                        flow["length"])
+    flow["vol_flow_rate"] = flow["flux"] * flow["area"]
+    flow["velocity"] = flow["flux"] / phi
+    flow["time"] = flow["length"] / flow["velocity"]
+    return flow
+
+
+def flow_arrays_to_graph(G, flow):
+    """ Materialize the directed NetworkX graph of a flow solution
+
+    Parameters
+    ----------
+        G : NetworkX graph
+            undirected graph the flow was solved on. Node attributes are copied from it and pressure is added to its nodes.
+
+        flow : dict
+            output of solve_flow_arrays
+
+    Returns
+    -------
+        H : Acyclic Directed NetworkX graph 
+            H is updated with vertex pressures, edge fluxes and travel times. The only edges that exists are those with postive flow rates. 
+    """
+    nodes = flow["nodes"]
+    nx.set_node_attributes(G, dict(zip(nodes.tolist(), flow["pressure"])),
+                           'pressure')
+    H = nx.DiGraph()
+    if "solver_info" in flow:
+        H.graph["solver_info"] = flow["solver_info"]
+    H.add_nodes_from(G.nodes(data=True))
+    edge_atts = flow_edge_attributes + [
+        'flux', 'vol_flow_rate', 'velocity', 'time'
+    ]
+    columns = [flow[att].tolist() for att in edge_atts]
+    H.add_edges_from(
+        (upstream, downstream, dict(zip(edge_atts, values)))
+        for upstream, downstream, *values in zip(
+            nodes[flow["u"]].tolist(), nodes[flow["v"]].tolist(), *columns))
+    return H
+
+
 def solve_flow_on_graph(G, pressure_in, pressure_out, fluid_viscosity, phi):
     """ Given a NetworkX graph prepared  for flow solve, solve for vertex pressures, and equip edges with attributes (Darcy) flux  and time of travel
 
@@ -141,83 +421,121 @@ def solve_flow_on_graph(G, pressure_in, pressure_out, fluid_viscosity, phi):
 
     Notes
     ----------
-        None
+        The solve is done on arrays by solve_flow_arrays. 
 
     """
+    flow = solve_flow_arrays(graph_to_flow_arrays(G), pressure_in,
+                             pressure_out, fluid_viscosity, phi)
+    local_print_log("--> Updating graph edges with flow solution")
+    return flow_arrays_to_graph(G, flow)
 
-    local_print_log("--> Starting Graph flow")
 
-    Inlet = [v for v in nx.nodes(G) if G.nodes[v]['inletflag']]
-    Outlet = [v for v in nx.nodes(G) if G.nodes[v]['outletflag']]
+def fracture_incidence_matrix(node_frac, u, v, num_frac):
+    """ Sparse fracture-by-edge incidence matrix used to accumulate the volumetric flow rate exchanged by each fracture
 
-    if not set(Inlet).isdisjoint(set(Outlet)):
-        error = "Incompatible graph: Vertex connected to both source and target\n"
-        local_print_log(error, 'error')
+    Parameters
+    -----------------
+        node_frac : numpy array
+            (num_nodes, 2) array of the fractures of each node, see intersection_graph.fracture_codes
 
-    D, A = get_laplacian_sparse_mat(G, weight='weight', format='lil')
+        u, v : numpy array
+            node indices of each edge
 
-    b = np.zeros(G.number_of_nodes())
+        num_frac : int
+            number of fractures
 
-    for v in Inlet:
-        b[v] = pressure_in
-        A[v, :] = 0
-        D[v, v] = 1.0
-    for v in Outlet:
-        b[v] = pressure_out
-        A[v, :] = 0
-        D[v, v] = 1.0
-    L = D - A  # automatically converts to csr when returning L
+    Returns
+    ---------------
+        M : scipy.sparse csr_array
+            num_frac x num_edges matrix of weights
 
-    local_print_log("--> Solving Linear System for pressure at nodes")
-    pressure = scipy.sparse.linalg.spsolve(L, b)
-    local_print_log("--> Updating graph edges with flow solution")
+    Notes
+    ------------
+        Qf = 0.5 * M @ Q, where Q is the absolute volumetric flow rate of each edge. For an edge (u, v), every fracture f of u that v is not on counts the edge once as outgoing for f and once as incoming for each fracture of v. The same is done from v. 's', 't', and other non-fracture codes are skipped.
+    """
+    num_edges = len(u)
+    rows = []
+    cols = []
+    vals = []
+    edge = np.arange(num_edges)
+    for a, b in [(node_frac[u], node_frac[v]), (node_frac[v], node_frac[u])]:
+        valid_b = b > 0
+        # fractures of a that b is not on
+        exclusive = (a > 0) & (a != b[:, :1]) & (a != b[:, 1:])
+        count = exclusive.sum(axis=1)
+        for j in range(2):
+            rows += [a[exclusive[:, j], j], b[valid_b[:, j], j]]
+            cols += [edge[exclusive[:, j]], edge[valid_b[:, j]]]
+            vals += [np.ones(exclusive[:, j].sum()), count[valid_b[:, j]]]
+    rows = np.concatenate(rows) - 1
+    cols = np.concatenate(cols)
+    vals = np.concatenate(vals).astype(float)
+    keep = vals > 0
+    M = scipy.sparse.coo_array((vals[keep], (rows[keep], cols[keep])),
+                               shape=(num_frac, num_edges)).tocsr()
+    return M
+
+
+def fracture_flow_incidence(G, num_frac):
+    """ Sparse fracture-by-edge incidence matrix of a flow graph
 
-    for v in nx.nodes(G):
-        G.nodes[v]['pressure'] = pressure[v]
+    Parameters
+    -----------------
+        G : networkX graph 
+            Output of run_graph_flow, node attribute frac is the tuple of fractures the intersection lies on
 
-    H = nx.DiGraph()
-    H.add_nodes_from(G.nodes(data=True))
+        num_frac : int
+            number of fractures
 
-    for u, v in nx.edges(G):
-        # Find direction of flow
-        if G.nodes[u]['pressure'] > G.nodes[v]['pressure']:
-            upstream = u
-            downstream = v
-        elif G.nodes[v]['pressure'] >= G.nodes[u]['pressure']:
-            upstream = v
-            downstream = u
-
-        delta_p = G.nodes[upstream]['pressure'] - G.nodes[downstream][
-            'pressure']
-        if delta_p > 1e-16:
-            ## Create new edge in DiGraph
-            H.add_edge(upstream, downstream)
-            # Transfer edge attributes
-            for att in [
-                    'perm', 'iperm', 'length', 'weight', 'area', 'frac', 'b'
-            ]:
-                H.edges[upstream, downstream][att] = G.edges[upstream,
-                                                             downstream][att]
-
-            H.edges[upstream, downstream]['flux'] = (
-                H.edges[upstream, downstream]['perm'] / fluid_viscosity) * (
-                    delta_p / H.edges[upstream, downstream]['length'])
-
-            H.edges[upstream, downstream]['vol_flow_rate'] = H.edges[
-                upstream, downstream]['flux'] * H.edges[upstream,
-                                                        downstream]['area']
-
-            # H.edges[downstream, upstream]['vol_flow_rate'] =  -1*H.edges[upstream, downstream]['vol_flow_rate']
-
-            H.edges[upstream,
-                    downstream]['velocity'] = H.edges[upstream,
-                                                      downstream]['flux'] / phi
-            H.edges[upstream,
-                    downstream]['time'] = H.edges[upstream, downstream][
-                        'length'] / (H.edges[upstream, downstream]['velocity'])
+    Returns
+    ---------------
+        M : scipy.sparse csr_array
+            num_frac x num_edges matrix of weights, see fracture_incidence_matrix
 
-    local_print_log("--> Graph flow complete")
-    return H
+        Q : numpy array
+            absolute volumetric flow rate of each edge, in the order of G.edges()
+    """
+    nodes = list(G.nodes())
+    node_index = dict(zip(nodes, range(len(nodes))))
+    node_frac = fracture_codes(G.nodes[n]['frac'] for n in nodes)
+
+    num_edges = G.number_of_edges()
+    u = np.zeros(num_edges, dtype=int)
+    v = np.zeros(num_edges, dtype=int)
+    Q = np.zeros(num_edges)
+    for i, (n1, n2, d) in enumerate(G.edges(data=True)):
+        u[i] = node_index[n1]
+        v[i] = node_index[n2]
+        Q[i] = abs(d['vol_flow_rate'])
+    return fracture_incidence_matrix(node_frac, u, v, num_frac), Q
+
+
+def fracture_flow_rates(flow, num_frac=None):
+    """ Volumetric flow rate through each fracture from a flow solution stored as arrays
+
+    Parameters
+    -----------------
+        flow : dict
+            flow solution, see solve_flow_arrays and load_graph_flow_arrays. Requires node_frac.
+
+        num_frac : int
+            number of fractures. Default is the largest fracture number in node_frac.
+
+    Returns
+    ---------------
+        Qf : numpy array
+            flow rate of fracture i (1-based) is Qf[i - 1] [m^3/s]
+
+    Notes
+    ------------
+        Same as the Qf of compute_dQ, without the NetworkX graph.
+    """
+    node_frac = flow["node_frac"]
+    if num_frac is None:
+        num_frac = max(int(node_frac.max(initial=0)), 0)
+    M = fracture_incidence_matrix(node_frac, flow["u"], flow["v"], num_frac)
+    # Divide by 1/2 to remove up double counting
+    return 0.5 * (M @ np.abs(flow["vol_flow_rate"]))
 
 
 def compute_dQ(self, G):
@@ -242,6 +560,8 @@ def compute_dQ(self, G):
     ------------
         For definitions of p32 and dQ along with a discussion see " Hyman, Jeffrey D. "Flow channeling in fracture networks: characterizing the effect of density on preferential flow path formation." Water Resources Research 56.9 (2020): e2020WR027986. "
 
+        The flow rate through each fracture, Qf, is a sparse matrix-vector product, see fracture_flow_incidence.
+
     """
     self.print_log(
         "--> Computing fracture intensity (p32) and flow channeling density indicator (dQ)"
@@ -250,32 +570,9 @@ def compute_dQ(self, G):
     fracture_surface_area = 2*self.surface_area
     domain_volume = self.domain['x'] * self.domain['y'] * self.domain['z']
 
-    Qf = np.zeros(self.num_frac)
-    ## convert to undirected
-    H = G.to_undirected()
-    ## walk through fractures
-    for curr_frac in range(1, self.num_frac + 1):
-        # print(f"\nstarting on fracture {curr_frac}")
-        # Gather nodes on current fracture
-        current_nodes = []
-        for u, d in H.nodes(data=True):
-            for f in d["frac"]:
-                if f == curr_frac:
-                    current_nodes.append(u)
-        # cycle through nodes on the fracture and get the outgoing / incoming
-        # volumetric flow rates
-        for u in current_nodes:
-            neighbors = H.neighbors(u)
-            for v in neighbors:
-                if v not in current_nodes:
-                    # outgoing vol flow rate
-                    Qf[curr_frac - 1] += abs(H[u][v]['vol_flow_rate'])
-                    for f in H.nodes[v]['frac']:
-                        if f != curr_frac and f != 's' and f != 't':
-                            # incoming vol flow rate
-                            Qf[f - 1] += abs(H[u][v]['vol_flow_rate'])
+    M, Q = fracture_flow_incidence(G, self.num_frac)
     # Divide by 1/2 to remove up double counting
-    Qf *= 0.5
+    Qf = 0.5 * (M @ Q)
     p32 = fracture_surface_area.sum() / domain_volume
     top = sum(fracture_surface_area * Qf)**2
     bottom = sum(fracture_surface_area * Qf**2)
@@ -289,7 +586,59 @@ def compute_dQ(self, G):
     return p32, dQ, Qf
 
 
-def dump_graph_flow_values(G,graph_flow_filename):
+def flow_graph_to_arrays(H):
+    """ Extract the flow solution stored on a directed NetworkX graph into arrays
+
+    Parameters
+    ----------
+        H : NetworkX DiGraph
+            graph with flow variables attached, e.g., the output of run_graph_flow
+
+    Returns
+    -------
+        flow : dict
+            same entries as solve_flow_arrays, for the node and edge attributes present on H
+
+    Notes
+    -----
+        Attributes are taken from the first node and edge, and must be present on all nodes and edges. A graph without edges gives empty edge arrays.
+    """
+    nodes = list(H.nodes())
+    num_nodes = len(nodes)
+    node_index = dict(zip(nodes, range(num_nodes)))
+    flow = {"nodes": np.asarray(nodes)}
+    node_data = [d for _, d in H.nodes(data=True)]
+    if num_nodes > 0:
+        first = node_data[0]
+        for key in ['inletflag', 'outletflag']:
+            if key in first:
+                flow[key] = np.fromiter((d[key] for d in node_data), bool,
+                                        num_nodes)
+        for key in ['x', 'y', 'z', 'pressure']:
+            if key in first:
+                flow[key] = np.fromiter((d[key] for d in node_data), float,
+                                        num_nodes)
+        if isinstance(first.get('old_label'), (int, np.integer)):
+            flow["old_label"] = np.fromiter(
+                (d['old_label'] for d in node_data), int, num_nodes)
+        if isinstance(first.get('frac'), (tuple, list)):
+            flow["node_frac"] = fracture_codes(d['frac'] for d in node_data)
+
+    num_edges = H.number_of_edges()
+    flow["u"] = np.fromiter((node_index[e[0]] for e in H.edges()), int,
+                            num_edges)
+    flow["v"] = np.fromiter((node_index[e[1]] for e in H.edges()), int,
+                            num_edges)
+    edge_data = [d for _, _, d in H.edges(data=True)]
+    for key in flow_edge_attributes + flow_solution_attributes:
+        if num_edges == 0 or key in edge_data[0]:
+            dtype = int if key == 'frac' else float
+            flow[key] = np.fromiter((d[key] for d in edge_data), dtype,
+                                    num_edges)
+    return flow
+
+
+def dump_graph_flow_values(G, graph_flow_filename, num_frac=None):
     """
     Writes graph flow information to an h5 file named graph_flow_name.
 
@@ -301,6 +650,9 @@ def dump_graph_flow_values(G,graph_flow_filename):
         graph_flow_filename : string
             name of output file
 
+        num_frac : int
+            number of fractures, see dump_graph_flow_arrays
+
     Returns
     ---------------
         None
@@ -310,36 +662,108 @@ def dump_graph_flow_values(G,graph_flow_filename):
         name of graph_flow_filename is set in run_graph_flow for primary workflow. Default is graph_flow.hdf5 
     
     """
+    dump_graph_flow_arrays(flow_graph_to_arrays(G), graph_flow_filename,
+                           num_frac)
+
+
+def dump_graph_flow_arrays(flow, graph_flow_filename, num_frac=None):
+    """
+    Writes graph flow information stored as arrays to an h5 file named graph_flow_name.
+
+    Parameters
+    --------------------
+        flow : dict
+            flow solution from solve_flow_arrays
+
+        graph_flow_filename : string
+            name of output file
+
+        num_frac : int
+            number of fractures, used for the fracture flow rates. Default is the largest fracture number in the flow solution.
+
+    Returns
+    ---------------
+        None
+
+    Notes
+    ---------------
+        Edge arrays are datasets at the root of the file: u and v (upstream and downstream node index), frac, perm, iperm, length, weight, area, aperture (b), volume (area * b), flux, vol_flow_rate, velocity, and time. 
+
+        The group node holds the node ids (see graph_io.write_column) and the arrays old_label, inletflag, outletflag, x, y, z, pressure, and node_frac. 
+
+        If node_frac is available, the group fracture holds vol_flow_rate, the flow rate through each fracture (see fracture_flow_rates). Fracture i (1-based) is entry i - 1.
+
+        Particle tracking and post-processing can be run from this file using load_graph_flow_arrays.
+    """
 
     local_print_log(f'\n--> Writting flow variables into h5df file: {graph_flow_filename}')
     local_print_log('--> Starting')
-    num_edges = G.number_of_edges()
-    velocity = np.zeros(num_edges)
-    lengths = np.zeros_like(velocity)
-    vol_flow_rate = np.zeros_like(velocity)
-    area = np.zeros_like(velocity)
-    aperture = np.zeros_like(velocity)
-    volume = np.zeros_like(velocity)
-
-    for i, val in enumerate(G.edges(data=True)):
-        u, v, d = val
-        velocity[i] = d['velocity']
-        lengths[i] = d['length']
-        vol_flow_rate[i] = d['vol_flow_rate']
-        area[i] = d['area']
-        aperture[i] = d['b']
-        volume[i] = area[i] * aperture[i]
-
     with h5py.File(graph_flow_filename, "w") as f5file:
-        h5dset = f5file.create_dataset('velocity', data=velocity)
-        h5dset = f5file.create_dataset('length', data=lengths)
-        h5dset = f5file.create_dataset('vol_flow_rate', data=vol_flow_rate)
-        h5dset = f5file.create_dataset('area', data=area)
-        h5dset = f5file.create_dataset('aperture', data=aperture)
-        h5dset = f5file.create_dataset('volume', data=volume)
+        f5file.attrs["version"] = GRAPH_FLOW_FILE_VERSION
+        for key in ['u', 'v'] + flow_edge_attributes + flow_solution_attributes:
+            if key in flow:
+                name = 'aperture' if key == 'b' else key
+                f5file.create_dataset(name, data=flow[key])
+        if 'area' in flow and 'b' in flow:
+            f5file.create_dataset('volume', data=flow['area'] * flow['b'])
+
+        node_group = f5file.create_group('node')
+        write_column(node_group, 'node_ids', flow['nodes'].tolist())
+        for key in flow_node_attributes:
+            if key in flow:
+                node_group.create_dataset(key, data=flow[key])
+
+        if 'node_frac' in flow and 'vol_flow_rate' in flow:
+            fracture_group = f5file.create_group('fracture')
+            fracture_group.create_dataset('vol_flow_rate',
+                                          data=fracture_flow_rates(
+                                              flow, num_frac))
     local_print_log('--> Complete')
 
 
+def load_graph_flow_arrays(graph_flow_filename):
+    """ Read a flow solution written by dump_graph_flow_arrays
+
+    Parameters
+    --------------------
+        graph_flow_filename : string
+            name of the graph flow file
+
+    Returns
+    ---------------
+        flow : dict
+            same entries as solve_flow_arrays, plus fracture_vol_flow_rate if the file has fracture flow rates
+
+    Notes
+    ---------------
+        The flow dictionary can be passed to run_graph_transport (vectorized engine), compiled_graph.compile_flow_arrays, effective_permeability, and fracture_flow_rates, so the NetworkX graph does not need to be rebuilt.
+    """
+    local_print_log(f"--> Loading flow variables from h5df file: {graph_flow_filename}")
+    flow = {}
+    with h5py.File(graph_flow_filename, "r") as f5file:
+        version = f5file.attrs.get("version")
+        if version is None:
+            error = f"Error. {graph_flow_filename} does not contain the edge and node arrays of a flow solution. It was written by an older version of dfnWorks or is not a graph flow file. Regenerate it with run_graph_flow or dump_graph_flow_values.\nExiting"
+            local_print_log(error, 'error')
+        elif version != GRAPH_FLOW_FILE_VERSION:
+            error = f"Error. {graph_flow_filename} is a version {version} graph flow file, but version {GRAPH_FLOW_FILE_VERSION} is required. The file must be regenerated with run_graph_flow or dump_graph_flow_values.\nExiting"
+            local_print_log(error, 'error')
+        for key in ['u', 'v'] + flow_edge_attributes + flow_solution_attributes:
+            name = 'aperture' if key == 'b' else key
+            if name in f5file:
+                flow[key] = f5file[name][()]
+        node_group = f5file['node']
+        flow['nodes'] = np.asarray(read_column(node_group['node_ids']))
+        for key in flow_node_attributes:
+            if key in node_group:
+                flow[key] = node_group[key][()]
+        if 'fracture' in f5file:
+            flow['fracture_vol_flow_rate'] = f5file['fracture']['vol_flow_rate'][()]
+    local_print_log(
+        f"--> Loaded {len(flow['nodes'])} nodes and {len(flow['u'])} edges")
+    return flow
+
+
 def run_graph_flow(self,
                    inflow,
                    outflow,
@@ -348,7 +772,13 @@ def run_graph_flow(self,
                    fluid_viscosity=8.9e-4,
                    phi=1,
                    G=None,
-                   graph_flow_name = "graph_flow.hdf5"):
+                   graph_flow_name = "graph_flow.hdf5",
+                   return_graph=True,
+                   solver='direct',
+                   preconditioner='amg',
+                   tol=1e-10,
+                   maxiter=None,
+                   reuse_solver=False):
     """ Solve for pressure driven steady state flow on a graph representation of the DFN. 
 
     Parameters
@@ -376,6 +806,27 @@ def run_graph_flow(self,
 
         G : Input Graph 
 
+        graph_flow_name : string
+            name of the hdf5 file the flow solution is written to
+
+        return_graph : bool
+            If True (default), return the directed NetworkX graph. If False, the NetworkX graph is not built and the flow solution is returned as a dictionary of numpy arrays (see solve_flow_arrays). When G is also not provided, the intersection graph is built directly as arrays (see intersection_graph.intersection_flow_arrays)
+
+        solver : string
+            Linear solver for the pressure. 'direct' (default, sparse LU) or 'cg' (preconditioned conjugate gradient). cg avoids the fill-in of the direct factorization on large graphs.
+
+        preconditioner : string
+            Preconditioner for cg. 'amg' (default, requires pyamg), 'ilu', 'jacobi', or None
+
+        tol : float
+            Relative residual tolerance for cg
+
+        maxiter : int
+            Maximum number of cg iterations
+
+        reuse_solver : bool
+            If True, the LU factorization or cg preconditioner is cached and reused by later calls on the same graph, and cg is warm started from the previous solution. Default is False. Turn it on when solving the same graph repeatedly, and call graph_flow_solvers.clear_solver_cache to release the cached factorizations.
+
     Returns
     -------
         Gtilde : NetworkX graph 
@@ -390,16 +841,227 @@ def run_graph_flow(self,
     self.print_log(f"--> Fluid viscosity: {fluid_viscosity} [Pa*s]")
     self.print_log(f"--> Fracture Porosity: {phi} [-]")
 
-    if G == None:
-        self.print_log("\n--> No Graph provided, building one") 
-        G = self.create_graph("intersection", inflow, outflow)
+    if G == None and not return_graph:
+        self.print_log("\n--> No Graph provided, building graph arrays")
+        self.dump_hydraulic_values()
+        arrays = intersection_flow_arrays(
+            inflow,
+            outflow,
+            fracture_properties=self.get_fracture_properties())
     else:
-         self.print_log("\n--> Graph provided")        
+        if G == None:
+            self.print_log("\n--> No Graph provided, building one") 
+            G = self.create_graph("intersection", inflow, outflow)
+        else:
+             self.print_log("\n--> Graph provided")        
+        Gtilde = prepare_graph_with_attributes(inflow, outflow, G)
+        arrays = graph_to_flow_arrays(Gtilde)
+
+    flow = solve_flow_arrays(arrays,
+                             pressure_in,
+                             pressure_out,
+                             fluid_viscosity,
+                             phi,
+                             solver=solver,
+                             preconditioner=preconditioner,
+                             tol=tol,
+                             maxiter=maxiter,
+                             reuse=reuse_solver)
+
+    # num_frac is only known once the DFN has been generated or loaded
+    num_frac = self.num_frac if isinstance(self.num_frac, int) else None
+    dump_graph_flow_arrays(flow, graph_flow_name, num_frac)
+    if return_graph:
+        self.print_log("--> Updating graph edges with flow solution")
+        flow = flow_arrays_to_graph(Gtilde, flow)
+    self.print_log("--> Graph Flow: Complete\n")
+    return flow
 
-    Gtilde = prepare_graph_with_attributes(inflow, outflow, G)
-    Gtilde = solve_flow_on_graph(Gtilde, pressure_in, pressure_out,
-                                 fluid_viscosity, phi)
 
-    dump_graph_flow_values(Gtilde, graph_flow_name)
-    self.print_log("--> Graph Flow: Complete\n")
-    return Gtilde
+def effective_permeability(flows, cases, domain, fluid_viscosity):
+    """ Effective permeability of the DFN from a set of graph flow solutions
+
+    Parameters
+    ----------
+        flows : list
+            flow solution of each case, see solve_flow_arrays
+
+        cases : list
+            list of (inflow, outflow, pressure_in, pressure_out) tuples
+
+        domain : dict
+            domain size with keys 'x', 'y', 'z' [m]
+
+        fluid_viscosity : double
+            in Pa-s
+
+    Returns
+    -------
+        perm : dict
+            Q : volumetric flow rate into the inflow boundary of each case [m^3/s]
+            k_eff : directional permeability Q mu L / (A dP) of each case [m^2], nan if inflow and outflow are not opposite faces
+            mean_flux : volume averaged Darcy flux vector of each case [m/s]
+            gradient : imposed mean pressure gradient of each case [Pa/m]
+            tensor : 3 x 3 permeability tensor [m^2], None unless the cases impose three independent gradients
+
+    Notes
+    -----
+        The volume averaged flux is sum_e Q_e (x_v - x_u) / V, where the sum is over edges oriented from upstream node u to downstream node v. This is the discrete form of the integral of q over the domain, so it includes the flow transverse to the imposed gradient. The tensor is the least squares solution of <q> = -K grad(p) / mu over all cases with a defined gradient.
+    """
+    size = np.array([domain['x'], domain['y'], domain['z']], dtype=float)
+    volume = np.prod(size)
+    num_cases = len(cases)
+    Q = np.zeros(num_cases)
+    k_eff = np.full(num_cases, np.nan)
+    mean_flux = np.zeros((num_cases, 3))
+    gradient = np.full((num_cases, 3), np.nan)
+
+    for i, (flow, (inflow, outflow, pressure_in,
+                   pressure_out)) in enumerate(zip(flows, cases)):
+        u = flow["u"]
+        v = flow["v"]
+        inlet = flow["inletflag"]
+        Q[i] = flow["vol_flow_rate"][inlet[u]].sum() - flow["vol_flow_rate"][
+            inlet[v]].sum()
+        for j, key in enumerate(['x', 'y', 'z']):
+            mean_flux[i, j] = np.sum(flow["vol_flow_rate"] *
+                                     (flow[key][v] - flow[key][u])) / volume
+
+        axis_in, normal_in = face_axis[inflow]
+        axis_out, normal_out = face_axis[outflow]
+        if axis_in == axis_out and normal_in != normal_out:
+            gradient[i] = 0
+            gradient[i, axis_out] = normal_out * (pressure_out -
+                                                  pressure_in) / size[axis_out]
+            area = volume / size[axis_out]
+            k_eff[i] = Q[i] * fluid_viscosity * size[axis_out] / (
+                area * abs(pressure_in - pressure_out))
+
+    tensor = None
+    defined = ~np.isnan(gradient[:, 0])
+    if np.linalg.matrix_rank(gradient[defined]) == 3:
+        # -mu <q>_i = K g_i for every case, solved as gradient K^T = -mu mean_flux
+        tensor = np.linalg.lstsq(gradient[defined],
+                                 -fluid_viscosity * mean_flux[defined],
+                                 rcond=None)[0].T
+
+    return {
+        "Q": Q,
+        "k_eff": k_eff,
+        "mean_flux": mean_flux,
+        "gradient": gradient,
+        "tensor": tensor
+    }
+
+
+def run_graph_flow_cases(self,
+                         cases,
+                         fluid_viscosity=8.9e-4,
+                         phi=1,
+                         graph_flow_name=None):
+    """ Solve pressure driven steady state flow on the intersection graph of the DFN for several boundary conditions, building the graph once and sharing factorizations between the cases
+
+    Parameters
+    ----------
+        self : object
+            DFN Class
+
+        cases : list
+            list of (inflow, outflow, pressure_in, pressure_out) tuples, for example [('left', 'right', 2e6, 1e6), ('front', 'back', 2e6, 1e6), ('top', 'bottom', 2e6, 1e6)]
+
+        fluid_viscosity : double
+            optional,  default is for water. [Pa*s]
+            
+        phi : double
+            Fracture porosity, default is 1 [-]
+
+        graph_flow_name : string
+            If provided, the flow solution of case i is written to <graph_flow_name>_<i>.hdf5
+
+    Returns
+    -------
+        results : dict
+            flows : list of flow solutions (see solve_flow_arrays), one per case
+            Q, k_eff, mean_flux, gradient, tensor : see effective_permeability
+            solver_info : see graph_flow_solvers.solve_pressure_cases
+
+    Notes
+    -----
+        Intersections with every face used by any case are nodes of the graph. In a case where a face is neither the inflow nor the outflow boundary its nodes are no-flow interior nodes, whereas run_graph_flow drops them, so the results can differ slightly from separate calls to run_graph_flow.
+    """
+    self.print_log("\n--> Graph Flow for multiple boundary conditions: Starting")
+    faces = []
+    for case in cases:
+        if len(case) != 4:
+            error = f"Error. Each case must be (inflow, outflow, pressure_in, pressure_out). Got {case}\n"
+            self.print_log(error, 'error')
+        inflow, outflow, pressure_in, pressure_out = case
+        if inflow == outflow:
+            error = f"Error. Inflow and outflow boundary are both {inflow}\n"
+            self.print_log(error, 'error')
+        self.print_log(
+            f"--> Case {len(faces) // 2}: {inflow} ({pressure_in} Pa) to {outflow} ({pressure_out} Pa)"
+        )
+        faces += [inflow, outflow]
+    faces = list(dict.fromkeys(faces))
+    self.print_log(f"--> Fluid viscosity: {fluid_viscosity} [Pa*s]")
+    self.print_log(f"--> Fracture Porosity: {phi} [-]")
+
+    self.dump_hydraulic_values()
+    G = create_intersection_graph(
+        cases[0][0],
+        cases[0][1],
+        boundary_faces=faces,
+        fracture_properties=self.get_fracture_properties())
+    Gtilde = prepare_graph_with_attributes(None, None, G)
+    arrays = graph_to_flow_arrays(Gtilde)
+    face = np.array(
+        [Gtilde.nodes[n].get('boundary', '') for n in arrays["nodes"]])
+
+    num_nodes = len(face)
+    L = assemble_dirichlet_laplacian(num_nodes, arrays["u"], arrays["v"],
+                                     arrays["weight"],
+                                     np.zeros(num_nodes, dtype=bool))
+    case_arrays = []
+    dirichlet = []
+    rhs = []
+    for inflow, outflow, pressure_in, pressure_out in cases:
+        inlet = face == inflow
+        outlet = face == outflow
+        if not np.any(inlet):
+            error = f"Error. There are no nodes on the {inflow} boundary.\nExiting"
+            self.print_log(error, 'error')
+        if not np.any(outlet):
+            error = f"Error. There are no nodes on the {outflow} boundary.\nExiting"
+            self.print_log(error, 'error')
+        b = np.zeros(num_nodes)
+        b[inlet] = pressure_in
+        b[outlet] = pressure_out
+        dirichlet.append(inlet | outlet)
+        rhs.append(b)
+        case_arrays.append(dict(arrays, inletflag=inlet, outletflag=outlet))
+
+    pressures, solver_info = solve_pressure_cases(L, dirichlet, rhs)
+
+    num_frac = self.num_frac if isinstance(self.num_frac, int) else None
+    flows = []
+    for i, pressure in enumerate(pressures):
+        flow = compute_edge_flow(case_arrays[i], pressure, fluid_viscosity,
+                                 phi)
+        if graph_flow_name is not None:
+            dump_graph_flow_arrays(flow, f"{graph_flow_name}_{i}.hdf5",
+                                   num_frac)
+        flows.append(flow)
+
+    results = effective_permeability(flows, cases, self.domain,
+                                     fluid_viscosity)
+    results["flows"] = flows
+    results["solver_info"] = solver_info
+    for i, case in enumerate(cases):
+        self.print_log(
+            f"--> Case {i}: Q = {results['Q'][i]:0.2e} [m^3/s], k_eff = {results['k_eff'][i]:0.2e} [m^2]"
+        )
+    if results["tensor"] is not None:
+        self.print_log(f"--> Effective permeability tensor [m^2]:\n{results['tensor']}")
+    self.print_log("--> Graph Flow for multiple boundary conditions: Complete\n")
+    return results
@@ -0,0 +1,428 @@
+"""
+.. module:: graph_flow_solvers.py
+   :synopsis: Direct and preconditioned iterative solvers for the graph flow pressure system, with reuse across solves on the same graph
+.. moduleauthor:: Jeffrey Hyman <jhyman@lanl.gov>
+
+"""
+
+import hashlib
+import inspect
+import timeit
+from collections import OrderedDict
+import numpy as np
+import scipy.sparse
+import scipy.sparse.linalg
+import scipy.sparse.csgraph
+
+from pydfnworks.general.logging import local_print_log
+
+# factorizations, preconditioners, and last solutions keyed by the system matrix
+_solver_cache = OrderedDict()
+max_cached_systems = 4
+
+# scipy < 1.12 names the relative tolerance of cg 'tol'
+_cg_rtol = "rtol" if "rtol" in inspect.signature(
+    scipy.sparse.linalg.cg).parameters else "tol"
+
+
+def clear_solver_cache():
+    """ Remove all cached factorizations, preconditioners, and warm start vectors """
+    _solver_cache.clear()
+
+
+def matrix_key(L, *options):
+    """ Hash of a sparse matrix (and solver options) used to find cached solver data
+
+    Parameters
+    ----------
+        L : scipy sparse matrix
+            system matrix
+
+        options :
+            anything else the cached data depends on
+
+    Returns
+    -------
+        key : str
+            hex digest
+    """
+    L = scipy.sparse.csr_array(L)
+    h = hashlib.sha1()
+    h.update(np.asarray(L.shape).tobytes())
+    h.update(L.indptr.tobytes())
+    h.update(L.indices.tobytes())
+    h.update(L.data.tobytes())
+    h.update(repr(options).encode())
+    return h.hexdigest()
+
+
+def get_cached(key):
+    entry = _solver_cache.get(key)
+    if entry is not None:
+        _solver_cache.move_to_end(key)
+    return entry
+
+
+def set_cached(key, entry):
+    _solver_cache[key] = entry
+    _solver_cache.move_to_end(key)
+    while len(_solver_cache) > max_cached_systems:
+        _solver_cache.popitem(last=False)
+
+
+def build_preconditioner(A, preconditioner):
+    """ Build a preconditioner for the symmetric positive definite interior system
+
+    Parameters
+    ----------
+        A : scipy sparse matrix
+            interior Laplacian
+
+        preconditioner : str
+            'amg' (smoothed aggregation algebraic multigrid, requires pyamg), 'ilu' (incomplete factorization), 'jacobi', or None
+
+    Returns
+    -------
+        M : LinearOperator or None
+            approximate inverse of A
+    """
+    n = A.shape[0]
+    if preconditioner is None:
+        return None
+    elif preconditioner == 'amg':
+        try:
+            import pyamg
+        except ImportError:
+            error = "Error. The amg preconditioner requires pyamg. Install pyamg or choose 'ilu' or 'jacobi'.\n"
+            local_print_log(error, 'error')
+        # pyamg only accepts 32 bit indices
+        A = scipy.sparse.csr_matrix(A)
+        A.indptr = A.indptr.astype(np.int32)
+        A.indices = A.indices.astype(np.int32)
+        ml = pyamg.smoothed_aggregation_solver(A)
+        return ml.aspreconditioner(cycle='V')
+    elif preconditioner == 'ilu':
+        # symmetric diagonal scaling, the entries of A are O(perm / mu)
+        scale = 1.0 / np.sqrt(A.diagonal())
+        S = scipy.sparse.diags(scale)
+        ilu = scipy.sparse.linalg.spilu(scipy.sparse.csc_matrix(S @ A @ S),
+                                        drop_tol=1e-3,
+                                        fill_factor=10)
+        return scipy.sparse.linalg.LinearOperator(
+            (n, n), lambda x: scale * ilu.solve(scale * x))
+    elif preconditioner == 'jacobi':
+        inv_diag = 1.0 / A.diagonal()
+        return scipy.sparse.linalg.LinearOperator((n, n),
+                                                  lambda x: inv_diag * x)
+    else:
+        error = f"Error. Unknown preconditioner {preconditioner}. Options are 'amg', 'ilu', 'jacobi', or None.\n"
+        local_print_log(error, 'error')
+
+
+def solve_pressure(L,
+                   rhs,
+                   boundary,
+                   solver='direct',
+                   preconditioner='amg',
+                   tol=1e-10,
+                   maxiter=None,
+                   reuse=False):
+    """ Solve the graph Laplacian with Dirichlet rows for the node pressures
+
+    Parameters
+    ----------
+        L : scipy sparse csr matrix
+            Laplacian where the rows of boundary nodes are the identity, from assemble_dirichlet_laplacian
+
+        rhs : numpy array
+            boundary pressures on boundary rows, zero elsewhere
+
+        boundary : numpy array
+            boolean mask of Dirichlet nodes
+
+        solver : str
+            'direct' (sparse LU) or 'cg' (preconditioned conjugate gradient)
+
+        preconditioner : str
+            preconditioner for cg: 'amg', 'ilu', 'jacobi', or None
+
+        tol : float
+            relative residual tolerance for cg
+
+        maxiter : int
+            maximum number of cg iterations
+
+        reuse : bool
+            If True, the LU factorization (direct) or the preconditioner and last solution (cg) are cached and reused by later solves with the same matrix. Default is False. The matrix is hashed on every call to find the cache entry, and up to max_cached_systems entries are kept alive until clear_solver_cache is called.
+
+    Returns
+    -------
+        pressure : numpy array
+            pressure at every node
+
+        info : dict
+            solver, preconditioner, time [s], iterations, and relative residual of the interior (non-Dirichlet) equations
+
+    Notes
+    -----
+        cg is applied to the interior block after eliminating the Dirichlet nodes, which is symmetric positive definite when every interior node is connected to a boundary. With reuse, the previous solution of the same system is used as the initial guess (warm start). The ilu and jacobi preconditioners scale by the diagonal of the interior block; if it has zero entries (interior nodes without edges) the system is solved with spsolve instead.
+    """
+    tic = timeit.default_timer()
+    info = {"solver": solver, "preconditioner": None, "iterations": None}
+
+    if solver == 'direct':
+        if reuse:
+            key = matrix_key(L, 'direct')
+            entry = get_cached(key)
+            if entry is None:
+                local_print_log("--> Computing sparse LU factorization")
+                try:
+                    entry = {"lu": scipy.sparse.linalg.splu(L.tocsc())}
+                    set_cached(key, entry)
+                except RuntimeError:
+                    # singular, e.g., clusters not connected to the boundary
+                    local_print_log(
+                        "--> Warning. Singular system, cannot factorize. Falling back to spsolve",
+                        'warning')
+                    reuse = False
+            else:
+                local_print_log("--> Reusing cached LU factorization")
+        if reuse:
+            pressure = entry["lu"].solve(rhs)
+        else:
+            pressure = scipy.sparse.linalg.spsolve(L, rhs)
+
+    elif solver == 'cg':
+        info["preconditioner"] = preconditioner
+        interior = ~boundary
+        L_int = L[interior]
+        A = L_int[:, interior]
+        b = -L_int[:, boundary] @ rhs[boundary]
+        if preconditioner in ['ilu', 'jacobi'] and np.any(A.diagonal() == 0):
+            local_print_log(
+                f"--> Warning. Zero diagonal entries in the interior system, cannot use the {preconditioner} preconditioner. Falling back to spsolve",
+                'warning')
+            info["solver"] = "spsolve"
+            info["preconditioner"] = None
+            pressure = scipy.sparse.linalg.spsolve(L, rhs)
+        else:
+            key = matrix_key(L, 'cg', preconditioner) if reuse else None
+            entry = get_cached(key) if reuse else None
+            if entry is None:
+                entry = {
+                    "M": build_preconditioner(A, preconditioner),
+                    "x0": None
+                }
+                if reuse:
+                    set_cached(key, entry)
+            else:
+                local_print_log(
+                    "--> Reusing cached preconditioner and previous solution")
+
+            iterations = [0]
+
+            def count(xk):
+                iterations[0] += 1
+
+            x, flag = scipy.sparse.linalg.cg(A,
+                                             b,
+                                             x0=entry["x0"],
+                                             atol=0.0,
+                                             maxiter=maxiter,
+                                             M=entry["M"],
+                                             callback=count,
+                                             **{_cg_rtol: tol})
+            if flag > 0:
+                local_print_log(
+                    f"--> Warning. cg did not converge to tolerance {tol} in {iterations[0]} iterations",
+                    'warning')
+            elif flag < 0:
+                error = "Error. Illegal input or breakdown in cg.\n"
+                local_print_log(error, 'error')
+            entry["x0"] = x
+            info["iterations"] = iterations[0]
+            pressure = rhs.astype(float).copy()
+            pressure[interior] = x
+
+    else:
+        error = f"Error. Unknown graph flow solver {solver}. Options are 'direct' and 'cg'.\n"
+        local_print_log(error, 'error')
+
+    info["time"] = timeit.default_timer() - tic
+    # residual of the interior equations relative to the boundary forcing
+    interior = ~boundary
+    forcing = np.linalg.norm(L[interior][:, boundary] @ rhs[boundary])
+    info["residual"] = np.linalg.norm(
+        (L @ pressure - rhs)[interior]) / max(forcing, np.finfo(float).tiny)
+    message = f"--> Solver: {info['solver']}, time {info['time']:0.2e} s, relative residual {info['residual']:0.2e}"
+    if info["iterations"] is not None:
+        message += f", preconditioner {info['preconditioner']}, iterations {info['iterations']}"
+    local_print_log(message)
+    return pressure, info
+
+
+def _factorize(A, reuse):
+    """ Sparse LU factorization of A, cached by the matrix if reuse is True """
+    key = matrix_key(A, 'direct') if reuse else None
+    entry = get_cached(key) if reuse else None
+    if entry is None:
+        local_print_log(
+            f"--> Computing sparse LU factorization of {A.shape[0]} nodes")
+        entry = {"lu": scipy.sparse.linalg.splu(scipy.sparse.csc_matrix(A))}
+        if reuse:
+            set_cached(key, entry)
+    else:
+        local_print_log("--> Reusing cached LU factorization")
+    return entry["lu"]
+
+
+def _solve_cases_schur(L, dirichlet, rhs, boundary, interior, active,
+                       block_size, reuse):
+    """ Pressures of every case from one factorization of the nodes that are not Dirichlet in any case and the dense Schur complement on the others, see solve_pressure_cases """
+    num_boundary = np.count_nonzero(boundary)
+    L_I = L[interior]
+    L_B = L[boundary]
+    L_IB = L_I[:, boundary].tocsc()
+    L_BI = L_B[:, interior]
+    lu = _factorize(L_I[:, interior], reuse)
+
+    local_print_log(
+        f"--> Forming Schur complement on {num_boundary} boundary nodes")
+    S = L_B[:, boundary].toarray()
+    for start in range(0, num_boundary, block_size):
+        cols = slice(start, min(start + block_size, num_boundary))
+        S[:, cols] -= L_BI @ lu.solve(L_IB[:, cols].toarray())
+
+    # boundary pressures of every case, columns are cases
+    p_B = np.zeros((num_boundary, len(dirichlet)))
+    for i, (mask, b) in enumerate(zip(dirichlet, rhs)):
+        fixed = mask[boundary]
+        free = ~fixed & active[i][boundary]
+        p_B[fixed, i] = b[boundary][fixed]
+        if np.any(free):
+            p_B[free, i] = np.linalg.solve(S[np.ix_(free, free)],
+                                           -S[np.ix_(free, fixed)] @ p_B[fixed, i])
+    p_I = lu.solve(np.asarray(-(L_IB @ p_B)))
+
+    pressures = []
+    for i in range(len(dirichlet)):
+        pressure = np.zeros(L.shape[0])
+        pressure[boundary] = p_B[:, i]
+        pressure[interior] = p_I[:, i]
+        pressures.append(pressure)
+    return pressures, 1
+
+
+def _solve_cases_by_set(L, dirichlet, rhs, active, reuse):
+    """ Pressures of every case with one factorization per distinct set of Dirichlet nodes, see solve_pressure_cases """
+    pressures = [None] * len(dirichlet)
+    cases_of_set = {}
+    for i, mask in enumerate(dirichlet):
+        cases_of_set.setdefault(mask.tobytes(), []).append(i)
+    for cases in cases_of_set.values():
+        mask = dirichlet[cases[0]]
+        free = active[cases[0]] & ~mask
+        p_D = np.column_stack([rhs[i][mask] for i in cases])
+        if np.any(free):
+            L_F = L[free]
+            lu = _factorize(L_F[:, free], reuse)
+            p_F = lu.solve(np.asarray(-(L_F[:, mask] @ p_D)))
+        for j, i in enumerate(cases):
+            pressure = np.zeros(L.shape[0])
+            pressure[mask] = p_D[:, j]
+            if np.any(free):
+                pressure[free] = p_F[:, j]
+            pressures[i] = pressure
+    return pressures, len(cases_of_set)
+
+
+def solve_pressure_cases(L,
+                         dirichlet,
+                         rhs,
+                         block_size=256,
+                         max_schur_nodes=1000,
+                         reuse=False):
+    """ Solve the graph Laplacian for several sets of Dirichlet boundary conditions, sharing factorizations between the cases
+
+    Parameters
+    ----------
+        L : scipy sparse matrix
+            weighted graph Laplacian without boundary conditions
+
+        dirichlet : list
+            boolean mask of the Dirichlet nodes of each case
+
+        rhs : list
+            numpy array of each case with the boundary pressures on its Dirichlet nodes
+
+        block_size : int
+            number of columns of the Schur complement computed per block of triangular solves
+
+        max_schur_nodes : int
+            largest number of Dirichlet nodes (over all cases) for which the dense Schur complement is formed. Default is 1000
+
+        reuse : bool
+            If True, the factorizations are cached and reused by later calls with the same graph and boundary nodes. Default is False
+
+    Returns
+    -------
+        pressures : list
+            pressure at every node for each case. Nodes in connected components without a Dirichlet node of the case have no defined pressure and are set to nan.
+
+        info : dict
+            solver ('schur' or 'lu'), number of factorizations, time [s], number of boundary nodes, and the relative residual of each case
+
+    Notes
+    -----
+        Let B be the union of the Dirichlet nodes of all cases and I the remaining nodes. If B has at most max_schur_nodes nodes and the cases do not all share the same Dirichlet nodes, L_II is factorized once and the dense Schur complement S = L_BB - L_BI L_II^-1 L_IB is formed with one triangular solve per node in B. Each case then solves a small dense system on the nodes of B that are not Dirichlet in that case (no-flow faces) and recovers the interior pressures with a single multiple right hand side solve.
+
+        S takes num_boundary^2 floats and num_boundary triangular solves, which is more than a factorization when B holds whole domain faces. Otherwise, the non-Dirichlet nodes are factorized once per distinct set of Dirichlet nodes and all cases with that set are solved as multiple right hand sides, e.g., flow in x with different pressures shares one factorization, flow in x, y, and z takes three. Both are exact.
+    """
+    tic = timeit.default_timer()
+    L = scipy.sparse.csr_array(L)
+    boundary = np.zeros(L.shape[0], dtype=bool)
+    for mask in dirichlet:
+        boundary |= mask
+    # components that never touch a boundary carry no flow and would make the system singular
+    _, component = scipy.sparse.csgraph.connected_components(L, directed=False)
+    anchored = np.isin(component, component[boundary])
+    interior = ~boundary & anchored
+    num_boundary = np.count_nonzero(boundary)
+    active = [np.isin(component, component[mask]) for mask in dirichlet]
+    num_sets = len({mask.tobytes() for mask in dirichlet})
+
+    if num_sets > 1 and num_boundary <= max_schur_nodes:
+        solver = "schur"
+        pressures, num_factorizations = _solve_cases_schur(
+            L, dirichlet, rhs, boundary, interior, active, block_size, reuse)
+    else:
+        solver = "lu"
+        pressures, num_factorizations = _solve_cases_by_set(
+            L, dirichlet, rhs, active, reuse)
+
+    residuals = []
+    for i, (mask, pressure) in enumerate(zip(dirichlet, pressures)):
+        # residual of the equations of the non-Dirichlet nodes
+        equations = active[i] & ~mask
+        forcing = np.linalg.norm(L[equations][:, mask] @ pressure[mask])
+        residuals.append(
+            np.linalg.norm((L @ pressure)[equations]) /
+            max(forcing, np.finfo(float).tiny))
+        num_floating = np.count_nonzero(~active[i])
+        if num_floating > 0:
+            local_print_log(
+                f"--> Warning. Case {i}: {num_floating} nodes are not connected to its boundaries, pressure set to nan",
+                'warning')
+            pressure[~active[i]] = np.nan
+
+    info = {
+        "solver": solver,
+        "num_factorizations": num_factorizations,
+        "num_boundary": num_boundary,
+        "time": timeit.default_timer() - tic,
+        "residual": np.asarray(residuals)
+    }
+    local_print_log(
+        f"--> Solved {len(dirichlet)} cases with {num_factorizations} factorizations in {info['time']:0.2e} s, max relative residual {info['residual'].max():0.2e}"
+    )
+    return pressures, info
@@ -0,0 +1,393 @@
+"""
+.. module:: graph_io.py
+   :synopsis: Read and write NetworkX graphs as typed columns in an HDF5 file
+.. moduleauthor:: Jeffrey Hyman <jhyman@lanl.gov>
+
+"""
+
+import json
+from itertools import chain
+import timeit
+import numpy as np
+import networkx as nx
+import h5py
+
+from pydfnworks.general.logging import local_print_log
+
+GRAPH_FILE_VERSION = 1
+
+_string = h5py.string_dtype()
+
+
+# exact Python types stored as plain arrays
+_python_kinds = {bool: "bool", int: "int", float: "float", str: "str"}
+
+
+def _scalar_kind(types):
+    """ Storage type of values with the given set of exact types, None if they cannot be stored as an array """
+    if len(types) == 1:
+        t = next(iter(types))
+        if t in _python_kinds:
+            return _python_kinds[t]
+        # numpy scalars of a single dtype keep their dtype
+        if issubclass(t, np.generic) and np.dtype(t).kind in "biuf":
+            return "numpy"
+    if types == {int, str}:
+        return "int_str"
+    if types == {int, float}:
+        return "int_float"
+    return None
+
+
+def _column_kind(values):
+    """ Storage type of a list of attribute values, see write_column """
+    # the types are checked once per distinct type, not once per value
+    types = set(map(type, values))
+    kind = _scalar_kind(types)
+    if kind is not None:
+        return kind
+    if len(types) == 1 and next(iter(types)) in (tuple, list):
+        sequence = type(values[0])
+        if len(set(map(len, values))) == 1:
+            kind = _scalar_kind(set(map(type, chain.from_iterable(values))))
+            if kind in ("int", "float", "numpy", "int_str", "int_float"):
+                return f"{sequence.__name__}_{kind}"
+    return "json"
+
+
+def _is_numpy_number(x):
+    return isinstance(x, np.generic) and x.dtype.kind in "biuf"
+
+
+def _to_python(x):
+    """ numpy bool, integer, and float scalars, also inside tuples and lists, as Python scalars of the same value """
+    if _is_numpy_number(x):
+        return x.item()
+    t = type(x)
+    if t in (tuple, list):
+        return t(_to_python(y) for y in x)
+    return x
+
+
+def _to_json(x, name):
+    """ Convert a value into JSON types, tuples are tagged so they are read back as tuples. Raises TypeError for values JSON cannot hold exactly. """
+    t = type(x)
+    if x is None or t in _python_kinds:
+        return x
+    if _is_numpy_number(x):
+        return x.item()
+    if t is list:
+        return [_to_json(y, name) for y in x]
+    if t is tuple:
+        return {"__tuple__": [_to_json(y, name) for y in x]}
+    if t is dict and all(type(k) is str for k in x):
+        return {k: _to_json(y, name) for k, y in x.items()}
+    raise TypeError(
+        f"Cannot store {t.__name__} value {x!r} of '{name}'. Columns hold bool, int, float, str, numpy scalars of a single dtype, and tuples or lists of these of equal length. Other values must be built from bool, int, float, str, numpy bool, integer, and float scalars, None, lists, tuples, and dicts with str keys."
+    )
+
+
+def _from_json(d):
+    if len(d) == 1 and "__tuple__" in d:
+        return tuple(d["__tuple__"])
+    return d
+
+
+def _write_mixed(column, items, other):
+    """ Integers mixed with values of type other (str or float) as an integer array, an array of the other values, and a mask of the other values """
+    mask = np.array([type(x) is other for x in items], dtype=bool)
+    ints = [0 if m else x for x, m in zip(items, mask)]
+    column.create_dataset(f"is_{other.__name__}", data=mask)
+    column.create_dataset("int", data=np.array(ints, dtype=np.int64))
+    if other is str:
+        return np.array([x if m else "" for x, m in zip(items, mask)],
+                        dtype=object)
+    return np.array([x if m else 0.0 for x, m in zip(items, mask)],
+                    dtype=float)
+
+
+def _read_mixed(column, other, data):
+    ints = column["int"][()].tolist()
+    mask = column[f"is_{other}"][()].tolist()
+    return [x if m else i for x, i, m in zip(data, ints, mask)]
+
+
+def write_column(group, name, values, key=None):
+    """ Write a list of values as a typed column
+
+    Parameters
+    ----------
+        group : h5py Group
+            group the column is written into
+
+        name : string
+            name of the column
+
+        values : list
+            one value per node or edge, None for a missing value
+
+        key : string
+            attribute name used in error messages, default is name
+
+    Returns
+    -------
+        None
+
+    Notes
+    -----
+        Columns are stored as numpy arrays of bool, int, float, or strings, and 2D arrays for tuples (or lists) of numbers of equal length. Numpy scalars of a single dtype keep their dtype, numpy bool, integer, and float scalars mixed with other values (e.g., np.float64 and float, or np.float32 and np.float64) are stored as the Python scalars of the same value. A column of integers mixed with strings (e.g., node ids with 's' and 't') or with floats is stored as an integer array, an array of the other values, and a mask, and the same for tuples of these. Other values are stored as JSON strings. Missing values are recorded in a mask called present. Values are read back with their exact type, a TypeError is raised for values that cannot be (e.g., numpy arrays).
+    """
+    present = np.array([x is not None for x in values], dtype=bool)
+    items = [x for x in values if x is not None]
+    if key is None:
+        key = name
+    kind = _column_kind(items)
+    if kind == "json":
+        items = [_to_python(x) for x in items]
+        kind = _column_kind(items)
+    column = group.create_group(name)
+    column.attrs["kind"] = kind
+    if not present.all():
+        column.create_dataset("present", data=present)
+
+    element = kind
+    if kind.startswith(("tuple_", "list_")):
+        element = kind.split("_", 1)[1]
+        width = len(items[0])
+        column.attrs["width"] = width
+        items = [y for x in items for y in x]
+
+    if element == "bool":
+        data = np.array(items, dtype=bool)
+    elif element == "int":
+        data = np.array(items, dtype=np.int64)
+    elif element == "float":
+        data = np.array(items, dtype=float)
+    elif element == "numpy":
+        data = np.array(items)
+        column.attrs["dtype"] = data.dtype.str
+    elif element == "str":
+        data = np.array(items, dtype=object)
+    elif element == "int_str":
+        data = _write_mixed(column, items, str)
+    elif element == "int_float":
+        data = _write_mixed(column, items, float)
+    else:
+        data = np.array([json.dumps(_to_json(x, key)) for x in items],
+                        dtype=object)
+
+    if kind != element and element in ("int", "float", "numpy"):
+        data = data.reshape(-1, width)
+    if data.dtype == object:
+        column.create_dataset("data", data=data, dtype=_string)
+    else:
+        column.create_dataset("data", data=data)
+
+
+def read_column(column):
+    """ Read a column written by write_column
+
+    Parameters
+    ----------
+        column : h5py Group
+
+    Returns
+    -------
+        values : list
+            one value per node or edge, None for a missing value
+    """
+    kind = column.attrs["kind"]
+    element = kind
+    if kind.startswith(("tuple_", "list_")):
+        element = kind.split("_", 1)[1]
+    dset = column["data"]
+    if dset.dtype == object:
+        data = dset.asstr()[()].tolist()
+    elif element == "numpy":
+        # iterating keeps numpy scalars, tolist would convert them
+        data = list(dset[()].astype(column.attrs["dtype"], copy=False))
+    else:
+        data = dset[()].tolist()
+
+    if element == "int_str":
+        data = _read_mixed(column, "str", data)
+    elif element == "int_float":
+        data = _read_mixed(column, "float", data)
+    elif element == "json":
+        data = [json.loads(x, object_hook=_from_json) for x in data]
+    if kind.startswith("tuple_"):
+        sequence = tuple
+    elif kind.startswith("list_"):
+        sequence = list
+    else:
+        sequence = None
+    if sequence is not None:
+        if element in ("int_str", "int_float"):
+            width = int(column.attrs["width"])
+            data = [data[i:i + width] for i in range(0, len(data), width)]
+        data = [sequence(x) for x in data]
+
+    if "present" not in column:
+        return data
+    present = column["present"][()]
+    values = [None] * len(present)
+    for i, x in zip(np.nonzero(present)[0].tolist(), data):
+        values[i] = x
+    return values
+
+
+def _write_attributes(group, attributes, num_items):
+    # keys in order of first appearance, so dictionaries are read back in the same order
+    keys = {}
+    for d in attributes:
+        for key in d:
+            keys[key] = None
+    keys = list(keys)
+    for key in keys:
+        if type(key) is not str:
+            raise TypeError(
+                f"Cannot store attribute name {key!r} of type {type(key).__name__}. Attribute names must be str."
+            )
+    for i, key in enumerate(keys):
+        write_column(group, str(i), [d.get(key) for d in attributes], key)
+    group.attrs["keys"] = json.dumps(keys)
+    group.attrs["size"] = num_items
+
+
+def _read_attributes(group):
+    num_items = int(group.attrs["size"])
+    keys = json.loads(group.attrs["keys"])
+    if not keys:
+        return [{} for _ in range(num_items)]
+    columns = [read_column(group[str(i)]) for i in range(len(keys))]
+    if all("present" not in group[str(i)] for i in range(len(keys))):
+        return [dict(zip(keys, row)) for row in zip(*columns)]
+    return [{key: x
+             for key, x in zip(keys, row) if x is not None}
+            for row in zip(*columns)]
+
+
+def write_graph(G, filename):
+    """ Write a NetworkX graph into an HDF5 file
+
+    Parameters
+    ----------
+        G : NetworkX Graph or DiGraph
+            graph to write
+
+        filename : string
+            name of the HDF5 file
+
+    Returns
+    -------
+        None
+
+    Notes
+    -----
+        The file holds the node ids, the edges as two arrays of node indices, and one typed column per node and edge attribute (see write_column). Graph attributes, e.g., representation, are stored as JSON. Multigraphs are not supported.
+    """
+    if G.is_multigraph():
+        error = "Error. Multigraphs cannot be written with write_graph.\nExiting"
+        local_print_log(error, 'error')
+    nodes = list(G.nodes())
+    index = dict(zip(nodes, range(len(nodes))))
+    num_edges = G.number_of_edges()
+    u = np.fromiter((index[e[0]] for e in G.edges()), np.int64, num_edges)
+    v = np.fromiter((index[e[1]] for e in G.edges()), np.int64, num_edges)
+
+    with h5py.File(filename, "w") as f5:
+        f5.attrs["version"] = GRAPH_FILE_VERSION
+        f5.attrs["directed"] = G.is_directed()
+        f5.attrs["graph"] = json.dumps(_to_json(G.graph, "graph"))
+        write_column(f5, "node_ids", nodes)
+        f5.create_dataset("u", data=u)
+        f5.create_dataset("v", data=v)
+        _write_attributes(f5.create_group("node_attributes"),
+                          [d for _, d in G.nodes(data=True)], len(nodes))
+        _write_attributes(f5.create_group("edge_attributes"),
+                          [d for _, _, d in G.edges(data=True)], num_edges)
+
+
+def read_graph(filename):
+    """ Read a NetworkX graph written by write_graph
+
+    Parameters
+    ----------
+        filename : string
+            name of the HDF5 file
+
+    Returns
+    -------
+        G : NetworkX Graph or DiGraph
+    """
+    with h5py.File(filename, "r") as f5:
+        if f5.attrs.get("version") != GRAPH_FILE_VERSION:
+            error = f"Error. {filename} is not a graph file of version {GRAPH_FILE_VERSION}.\nExiting"
+            local_print_log(error, 'error')
+        G = nx.DiGraph() if f5.attrs["directed"] else nx.Graph()
+        G.graph.update(
+            json.loads(f5.attrs["graph"], object_hook=_from_json))
+        nodes = read_column(f5["node_ids"])
+        u = f5["u"][()].tolist()
+        v = f5["v"][()].tolist()
+        node_attributes = _read_attributes(f5["node_attributes"])
+        edge_attributes = _read_attributes(f5["edge_attributes"])
+    G.add_nodes_from(zip(nodes, node_attributes))
+    G.add_edges_from((nodes[a], nodes[b], d)
+                     for a, b, d in zip(u, v, edge_attributes))
+    return G
+
+
+def dump_graph(self, G, name):
+    """ Write graph out in binary (HDF5) format
+
+    Parameters
+    ----------
+        self : object
+            DFN Class
+
+        G : NetworkX graph
+            NetworkX Graph based on the DFN
+
+        name : string
+            Name of output file (no .hdf5)
+
+    Returns
+    -------
+        None
+
+    Notes
+    -----
+        Node ids, including the source and target nodes s and t, tuple attributes such as frac, and graph attributes such as representation are preserved. Much smaller and faster than dump_json_graph. See write_graph for the file layout.
+    """
+    filename = f"{name}.hdf5"
+    self.print_log(f"--> Dumping Graph into file: {filename}")
+    tic = timeit.default_timer()
+    write_graph(G, filename)
+    self.print_log(
+        f"--> Complete ({timeit.default_timer() - tic:0.2f} seconds)")
+
+
+def load_graph(self, filename):
+    """ Read in graph written by dump_graph
+
+    Parameters
+    ----------
+        self : object
+            DFN Class
+
+        filename : string
+            Name of input file
+
+    Returns
+    -------
+        G : NetworkX graph
+            NetworkX Graph based on the DFN
+    """
+    self.print_log(f"--> Loading Graph in file: {filename}")
+    tic = timeit.default_timer()
+    G = read_graph(filename)
+    self.print_log(
+        f"--> Loaded graph with {G.number_of_nodes()} nodes and {G.number_of_edges()} edges in {timeit.default_timer() - tic:0.2f} seconds"
+    )
+    return G
@@ -1,9 +1,15 @@
+import os
+import hashlib
 import numpy as np
 from scipy import special
 import mpmath as mp
+import multiprocessing
 
 from pydfnworks.general.logging import local_print_log
 
+# bump if the transition probability computation changes to invalidate old cache files
+TDRW_CACHE_VERSION = 1
+
 def get_fracture_segments(transfer_time,
                           fracture_length,
                           b,
@@ -94,8 +100,63 @@ def t_diff_unlimited(a, tf, xi):
     return ((a * tf) / special.erfcinv(xi))**2
 
 
-def transition_probability_cdf(t_min, t_max, frac_spacing, matrix_diffusivity,
-                               num_pts):
+def invert_transition_probability(args):
+    """
+    Evaluates the cummulative transition probability at a single time by numerically inverting its Laplace transform. Module level so it can be sent to a process pool.
+
+    Parameters
+    ---------------
+        args : tuple
+            (t, frac_spacing, matrix_diffusivity)
+
+    Returns
+    --------------
+        prob : float
+            cummulative transition probability at time t
+
+    """
+    t, frac_spacing, matrix_diffusivity = args
+    ## Parameters for Roubinet function for the transfer probability function described
+    ## in Roubinet et al. WRR 2010. Equation number 5.
+    l1 = frac_spacing / 2
+    l2 = -l1
+    delta_l = l1 - l2
+
+    ## Roubinet et al. WRR 2010. Equation number 5.
+    ## s is the Laplace variable
+    laplace_trans_prob_function = lambda s: (mp.exp(l1*mp.sqrt(s/matrix_diffusivity))/s) \
+            *((1.0 - mp.exp(-2*l2*mp.sqrt(s/matrix_diffusivity)))/(1.0 - mp.exp(2.0 *(delta_l)*mp.sqrt(s/matrix_diffusivity))))
+
+    return float(
+        mp.invertlaplace(laplace_trans_prob_function,
+                         t,
+                         method='talbot',
+                         dps=16,
+                         degree=36))
+
+
+def default_tdrw_cache_dir():
+    """ Default directory for cached transition probability tables. Set by the environment variable DFNWORKS_TDRW_CACHE, otherwise tdrw_cache in the current run directory """
+    return os.environ.get("DFNWORKS_TDRW_CACHE",
+                          os.path.join(os.getcwd(), "tdrw_cache"))
+
+
+def transition_probability_cache_file(cache_dir, t_min, t_max, frac_spacing,
+                                      matrix_diffusivity, num_pts):
+    """ Name of the cache file for a transition probability table. The name is a hash of all parameters that change the table. """
+    key = f"{TDRW_CACHE_VERSION}:{float(t_min)!r}:{float(t_max)!r}:{float(frac_spacing)!r}:{float(matrix_diffusivity)!r}:{int(num_pts)}"
+    digest = hashlib.sha1(key.encode()).hexdigest()
+    return os.path.join(cache_dir, f"trans_prob_{digest}.npz")
+
+
+def transition_probability_cdf(t_min,
+                               t_max,
+                               frac_spacing,
+                               matrix_diffusivity,
+                               num_pts,
+                               ncpu=1,
+                               cache_dir=None,
+                               use_cache=False):
     """
     This function calculates the cummulative probability density that a particle changes fractures, given the time needed to reach a penetration depth and an associated time with each probabilty.
 
@@ -116,6 +177,15 @@ def transition_probability_cdf(t_min, t_max, frac_spacing, matrix_diffusivity,
         num_pts : int 
             Number of points in the logspace array between t_min and t_max
 
+        ncpu : int
+            Number of processes used for the Laplace inversions. Default is 1
+
+        cache_dir : string
+            Directory of cached tables. Default is given by default_tdrw_cache_dir
+
+        use_cache : bool
+            If True, tables are read from and written to cache_dir. Default is False
+
     Returns
     --------------
         times : np.array
@@ -129,32 +199,45 @@ def transition_probability_cdf(t_min, t_max, frac_spacing, matrix_diffusivity,
     ------------
         Negative probabilities can sometimes appear due to numerical instabilities in our laplace inverse transform. These are removed in the section below marked CLEAN UP. We also ensure that our final distribution is monotonically increasing 
 
+        The table only depends on the time bounds, fracture spacing, matrix diffusivity and num_pts (matrix porosity enters through the time bounds), so these values are the cache key.
+
     """
+    if use_cache:
+        if cache_dir is None:
+            cache_dir = default_tdrw_cache_dir()
+        cache_file = transition_probability_cache_file(
+            cache_dir, t_min, t_max, frac_spacing, matrix_diffusivity, num_pts)
+        if os.path.isfile(cache_file):
+            local_print_log(
+                f"--> Loading transition probability cdf from {cache_file}")
+            with np.load(cache_file) as data:
+                return data["times"], data["cdf"]
+
     local_print_log("--> Building transition probability cdf")
 
     times = np.logspace(np.log10(t_min), np.log10(t_max), num=num_pts)
     prob_cdf = np.zeros(num_pts)
 
-    ## Parameters for Roubinet function for the transfer probability function described
-    ## in Roubinet et al. WRR 2010. Equation number 5.
-    l1 = frac_spacing / 2
-    l2 = -l1
-    delta_l = l1 - l2
-
-    ## Roubinet et al. WRR 2010. Equation number 5.
-    ## s is the Laplace variable
-    laplace_trans_prob_function = lambda s: (mp.exp(l1*mp.sqrt(s/matrix_diffusivity))/s) \
-            *((1.0 - mp.exp(-2*l2*mp.sqrt(s/matrix_diffusivity)))/(1.0 - mp.exp(2.0 *(delta_l)*mp.sqrt(s/matrix_diffusivity))))
-
-    for i, t in enumerate(times):
-        prob_cdf[i] = mp.invertlaplace(laplace_trans_prob_function,
-                                       t,
-                                       method='talbot',
-                                       dps=16,
-                                       degree=36)
+    if ncpu > 1:
+        # workers only run a few chunks ahead of the first value >= 0.5, the
+        # rest are dropped when the pool is terminated on exit
+        chunksize = max(1, num_pts // (8 * ncpu))
+        with multiprocessing.Pool(ncpu) as pool:
+            for i, prob in enumerate(
+                    pool.imap(invert_transition_probability,
+                              [(t, frac_spacing, matrix_diffusivity)
+                               for t in times],
+                              chunksize=chunksize)):
+                prob_cdf[i] = prob
+                if prob >= 0.5:
+                    break
+    else:
+        for i, t in enumerate(times):
+            prob_cdf[i] = invert_transition_probability(
+                (t, frac_spacing, matrix_diffusivity))
 
-        if prob_cdf[i] >= 0.5:
-            break
+            if prob_cdf[i] >= 0.5:
+                break
 
     # # CLEAN UP the solution.
     # # Sometime small negative values will appear due to numerical instabilities. Remove these.
@@ -168,6 +251,14 @@ def transition_probability_cdf(t_min, t_max, frac_spacing, matrix_diffusivity,
     prob_cdf, ind = np.unique(prob_cdf, return_index=True)
     times = times[ind]
 
+    if use_cache:
+        os.makedirs(cache_dir, exist_ok=True)
+        # write to a temporary file first so concurrent runs never read a partial table
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_file, times=times, cdf=prob_cdf)
+        os.replace(tmp_file, cache_file)
+        local_print_log(f"--> Saved transition probability cdf to {cache_file}")
+
     return times, prob_cdf
 
 
@@ -179,7 +270,10 @@ def transfer_probabilities(b_min,
                            matrix_diffusivity,
                            frac_spacing,
                            eps=1e-16,
-                           num_pts=100):
+                           num_pts=100,
+                           ncpu=1,
+                           cache_dir=None,
+                           use_cache=False):
     """ Returns the CDF of transfer probabilities and assocaited times.  Lower and upper bounds are first estimated using the physical parameters of the system. The bounds are then tighted based on the returned probabilities wherein we find a range with probabilities greater than eps and 0.5
 
     Parameters
@@ -210,6 +304,15 @@ def transfer_probabilities(b_min,
         
         num_pts : int 
             Number of points in the logspace array between t_min and t_max
+
+        ncpu : int
+            Number of processes used for the Laplace inversions
+
+        cache_dir : string
+            Directory of cached transition probability tables
+
+        use_cache : bool
+            Toggle for the on-disk cache of transition probability tables. Default is False
  
     Returns 
     ------------
@@ -251,7 +354,8 @@ def transfer_probabilities(b_min,
     # Compute the transition probabilities across the whole range of times.
     times, trans_cdf = transition_probability_cdf(t_diff_lb, t_diff_ub,
                                                   frac_spacing,
-                                                  matrix_diffusivity, num_pts)
+                                                  matrix_diffusivity, num_pts,
+                                                  ncpu, cache_dir, use_cache)
 
     # Restricts the
     # We end up with a lot of values we don't need, close to 0 probability.
@@ -278,7 +382,8 @@ def transfer_probabilities(b_min,
     # Recompute the transition probabilities across the restricted range of times.
     times, trans_cdf = transition_probability_cdf(t_diff_lb, t_diff_ub,
                                                   frac_spacing,
-                                                  matrix_diffusivity, num_pts)
+                                                  matrix_diffusivity, num_pts,
+                                                  ncpu, cache_dir, use_cache)
 
     #convert to as dictionary
     trans_prob = {"times": times, "cdf": trans_cdf}
@@ -287,6 +392,118 @@ def transfer_probabilities(b_min,
     return trans_prob
 
 
+def get_fracture_segments_array(transfer_time,
+                                fracture_length,
+                                b,
+                                velocity,
+                                matrix_diffusivity,
+                                matrix_porosity,
+                                plim=0.01):
+    """ Array version of get_fracture_segments. Computes the segment length and number of segments for many edges at once.
+
+    Parameters
+    ---------------------
+        transfer_time : float 
+            Time is takes for a particle to diffusive through the matrix across the fracture spacing. transfer_time = fracture_spacing**2 / (2 * matrix_diffusivity) 
+
+        fracture_length : np.array
+            Length of the edges [m]
+
+        b : np.array
+            Aperture of the edges [m]
+
+        velocity : np.array
+            particle velocity along the edges [m/s]
+
+        matrix_diffusivity: float
+            Matrix Diffusivity [m^2/s]
+
+        matrix_porosity: float
+            Matrix Porosity 
+
+        plim : float
+            Parameter used to break up the fracture
+
+    Returns
+    ---------------------
+        segment_length : np.array
+            Length of the segments of each edge
+        
+        num_segments : np.array
+            Number of segments on each edge
+
+    Notes
+    ---------------------
+        See get_fracture_segments
+    """
+    segment_length = ((b * np.sqrt(transfer_time)) /
+                      (matrix_porosity * np.sqrt(matrix_diffusivity))
+                      ) * special.erfcinv(1.0 - plim) * velocity
+    single = segment_length >= fracture_length
+    num_segments = np.ones(len(fracture_length), dtype=int)
+    num_segments[~single] = np.ceil(fracture_length[~single] /
+                                    segment_length[~single]).astype(int)
+    segment_length = np.where(single, fracture_length, segment_length)
+    return segment_length, num_segments
+
+
+def sample_segment_diffusion_times(trans_prob, a, segment_time, rng=np.random):
+    """ Samples the matrix diffusion time of many segments at once using the tabulated transition probability cdf
+
+    Parameters
+    --------------
+        trans_prob : dictionary 
+            Dictionary elements
+            times : np.array
+                Array of diffusion times 
+            prob_cdf : np.array
+                Array of cummulative probabilities. They only go to 0.5
+
+        a : np.array
+            Retention parameter of each segment. a = (matrix_porosity*sqrt(matrix_diffusivity))/aperture
+
+        segment_time : np.array
+            Advective travel time of each segment [s]
+
+        rng : numpy Generator or np.random
+            source of uniform samples. Default is the global numpy random state
+
+    Returns
+    --------------
+        t_diff : np.array
+            Time delay of each segment due to matrix diffusion
+    
+    Notes
+    -------------
+        Each segment time is sampled from the unlimited solution. It is kept with probability 1 - 2 * cdf(t / 2), otherwise the particle transfers to a new fracture and a new time is drawn from the inverse of the tabulated cdf. 
+
+    """
+    num_segments = len(a)
+    times = trans_prob['times']
+    cdf = trans_prob['cdf']
+    # sample a diffusion time from the unlimited scenario
+    xi = rng.uniform(low=0, high=1, size=num_segments)
+    t_diff = t_diff_unlimited(a, segment_time, xi)
+
+    # Below the minimum time there is 0 probability for transfer and
+    # above the maximum time there is probability 1. Otherwise, we get
+    # the probability from the CDF based on the sampled time.
+    limited_probability = 2 * np.interp(t_diff / 2, times, cdf)
+    limited_probability[t_diff < times[0]] = 0
+    limited_probability[t_diff > times[-1]] = 1
+
+    # Particles transfer to a new fracture if a random number
+    # is less than the transfer probability.
+    # this is the inverse CDF method part of the algorithm.
+    xi = rng.uniform(low=0, high=1, size=num_segments)
+    transfer = xi < limited_probability
+    num_transfer = np.count_nonzero(transfer)
+    if num_transfer > 0:
+        xi = rng.uniform(low=min(cdf), high=max(cdf), size=num_transfer)
+        t_diff[transfer] = np.interp(xi, cdf, times)
+    return t_diff
+
+
 def segment_matrix_diffusion(trans_prob, matrix_porosity, matrix_diffusivity,
                              b, velocity, segment_length, num_segments):
     """ Computes the time delay for a particle due to matrix diffusion on a given edge in the graph. The edge might already be broken into multiple segments depending on the parameters of the simulation. 
@@ -326,51 +543,16 @@ def segment_matrix_diffusion(trans_prob, matrix_porosity, matrix_diffusivity,
     
     Notes
     -------------
-        None
+        All segments are sampled together by sample_segment_diffusion_times
 
     """
 
     a = (matrix_porosity * np.sqrt(matrix_diffusivity)) / b
-
     segment_time = segment_length / velocity
-    prob_min = min(trans_prob['cdf'])
-    prob_max = max(trans_prob['cdf'])
-    t_diff = 0
-    for i in range(num_segments):
-        # sample a diffusion time from the unlimited scenario
-        xi = np.random.uniform(low=0, high=1)
-        t_diff_seg = t_diff_unlimited(a, segment_time, xi)
-
-        # compare that time with limited times
-        # if it's less than the minimum time, there is 0 probability for
-        # transfer and we accept that time
-        if t_diff_seg < trans_prob['times'][0]:
-            limited_probability = 0
-
-        # if it's greater than the maximum time, there is probability 1 for
-        # transfer and we resample
-        elif t_diff_seg > trans_prob['times'][-1]:
-            limited_probability = 1
-
-        # otherwise, we get a new probability using the CDF based on the sampled time.
-        else:
-            limited_probability = 2 * np.interp(
-                t_diff_seg / 2, trans_prob['times'], trans_prob['cdf'])
-
-        if limited_probability > 0:
-            # Draw a random number from U[0,1] for each particle.
-            # Particles transfer to a new fracture if this random number
-            # is less than the transfer probability.
-            # this is the inverse CDF method part of the algorithm.
-            xi = np.random.uniform(low=0, high=1)
-            if xi < limited_probability:
-                xi = np.random.uniform(low=prob_min, high=prob_max)
-                t_diff_seg = np.interp(xi, trans_prob['cdf'],
-                                       trans_prob['times'])
-
-
-        t_diff += t_diff_seg
-    return t_diff
+    t_diff = sample_segment_diffusion_times(
+        trans_prob, np.full(num_segments, a), np.full(num_segments,
+                                                      segment_time))
+    return t_diff.sum()
 
 
 def get_aperture_and_time_limits(G):
@@ -378,8 +560,8 @@ def get_aperture_and_time_limits(G):
     
     Parameters
     ---------------------
-        G : networkX graph  
-            Graph provided by graph_flow modules
+        G : networkX graph or dict
+            Graph provided by graph_flow modules, or a flow solution stored as arrays
 
     Returns
     -------------
@@ -407,6 +589,12 @@ def get_aperture_and_time_limits(G):
     b_max = None
     t_min = None
     t_max = None
+    if isinstance(G, dict):
+        b_min, b_max = G['b'].min(), G['b'].max()
+        t_min, t_max = G['time'].min(), G['time'].max()
+        local_print_log(f"--> b-min: {b_min:0.2e}, b-max: {b_max:0.2e}")
+        local_print_log(f"--> t-min: {t_min:0.2e}, t-max: {t_max:0.2e}")
+        return b_min, b_max, t_min, t_max
     for u, v, d in G.edges(data=True):
         if b_min is None:
             b_min = d['b']
@@ -438,13 +626,16 @@ def set_up_limited_matrix_diffusion(G,
                                     matrix_porosity,
                                     matrix_diffusivity,
                                     eps=1e-16,
-                                    num_pts=100):
+                                    num_pts=100,
+                                    ncpu=1,
+                                    cache_dir=None,
+                                    use_cache=False):
     """ Sets up transition probabilities for limited block size matrix diffusion
     
     Parameters
     ---------------------
-        G : networkX graph  
-            Graph provided by graph_flow modules
+        G : networkX graph or dict
+            Graph provided by graph_flow modules, or a flow solution stored as arrays
 
         fracture_length : float
             Length of the current edge segment in the graph [m]
@@ -460,6 +651,15 @@ def set_up_limited_matrix_diffusion(G,
 
         num_pts : int 
             Number of points in the logspace array between t_min and t_max
+
+        ncpu : int
+            Number of processes used for the Laplace inversions
+
+        cache_dir : string
+            Directory of cached transition probability tables. Default is given by default_tdrw_cache_dir
+
+        use_cache : bool
+            Toggle for the on-disk cache of transition probability tables. Default is False
  
 
     Returns
@@ -480,7 +680,8 @@ def set_up_limited_matrix_diffusion(G,
     b_min, b_max, tf_min, tf_max = get_aperture_and_time_limits(G)
     trans_prob = transfer_probabilities(b_min, b_max, tf_min, tf_max,
                                         matrix_porosity, matrix_diffusivity,
-                                        frac_spacing, eps, num_pts)
+                                        frac_spacing, eps, num_pts, ncpu,
+                                        cache_dir, use_cache)
     return trans_prob
 
 
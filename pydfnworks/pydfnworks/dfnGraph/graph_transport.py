@@ -15,6 +15,11 @@ import multiprocessing as mp
 import pydfnworks.dfnGraph.particle_io as io
 from pydfnworks.dfnGraph.graph_tdrw import set_up_limited_matrix_diffusion
 from pydfnworks.dfnGraph.particle_class import Particle
+from pydfnworks.dfnGraph.compiled_graph import compile_flow_graph, compile_flow_arrays, node_indices
+from pydfnworks.dfnGraph.graph_flow import load_graph_flow_arrays
+from pydfnworks.dfnGraph.particle_engine import track_particles_vectorized, initialize_particle_arrays, fracture_sequence_arrays, write_path_block, add_tdrw_edge_constants
+from pydfnworks.dfnGraph.shared_graph import track_particles_shared
+from pydfnworks.dfnGraph.alias_sampling import build_alias_table
 from pydfnworks.general.logging import local_print_log
 
 
@@ -65,14 +70,50 @@ def track_particle(data, verbose=False):
     return particle
 
 
+def record_particle(results, row, particle, frac_seqs=None):
+    """ Copy the travel times and lengths of a finished particle into the particle arrays, so the particle object can be dropped
+
+        Parameters
+        ----------
+            results : dict
+                particle arrays from initialize_particle_arrays
+
+            row : int
+                row of the particle in the arrays
+
+            particle : object
+                Particle with full trajectory
+
+            frac_seqs : list
+                If provided, the fractures visited by the particle are appended
+
+        Returns
+        -------
+            None
+    """
+    results["particle_number"][row] = particle.particle_number
+    results["advect_time"][row] = particle.advect_time
+    results["matrix_diffusion_time"][row] = particle.matrix_diffusion_time
+    results["total_time"][row] = particle.total_time
+    results["length"][row] = particle.length
+    results["beta"][row] = particle.beta
+    results["exit_flag"][row] = particle.exit_flag
+    if results["cp_adv_time"].shape[0] > 0:
+        results["cp_adv_time"][:, row] = particle.cp_adv_time
+        results["cp_tdrw_time"][:, row] = particle.cp_tdrw_time
+        results["cp_pathline_length"][:, row] = particle.cp_pathline_length
+    if frac_seqs is not None:
+        frac_seqs.append(particle.frac_seq)
+
+
 def get_initial_posititions(G, initial_positions, nparticles):
     """ Distributes initial particle positions 
 
         Parameters
         ----------
                 
-            G : NetworkX graph 
-                obtained from graph_flow
+            G : NetworkX graph or dict
+                obtained from graph_flow, or a flow solution stored as arrays (see graph_flow.load_graph_flow_arrays)
 
             initial_positions : str
                 distribution of initial conditions. options are uniform and flux (flux-weighted)
@@ -87,7 +128,10 @@ def get_initial_posititions(G, initial_positions, nparticles):
 
         """
 
-    inlet_nodes = [v for v in nx.nodes(G) if G.nodes[v]['inletflag']]
+    if isinstance(G, dict):
+        inlet_nodes = G["nodes"][G["inletflag"]].tolist()
+    else:
+        inlet_nodes = [v for v in nx.nodes(G) if G.nodes[v]['inletflag']]
     cnt = len(inlet_nodes)
     local_print_log(f"--> There are {cnt} inlet nodes")
     if cnt == 0:
@@ -113,10 +157,15 @@ def get_initial_posititions(G, initial_positions, nparticles):
     ## flux weighted initial positions for particles
     elif initial_positions == "flux":
         local_print_log("--> Using flux-weighted initial positions.\n")
-        flux = np.zeros(cnt)
-        for i, u in enumerate(inlet_nodes):
-            for v in G.successors(u):
-                flux[i] += G.edges[u, v]['flux']
+        if isinstance(G, dict):
+            flux = np.bincount(G["u"],
+                               weights=G["flux"],
+                               minlength=len(G["nodes"]))[G["inletflag"]]
+        else:
+            flux = np.zeros(cnt)
+            for i, u in enumerate(inlet_nodes):
+                for v in G.successors(u):
+                    flux[i] += G.edges[u, v]['flux']
         flux /= flux.sum()
         flux_cnts = [np.ceil(nparticles * i) for i in flux]
         nparticles = int(sum(flux_cnts))
@@ -156,6 +205,7 @@ def create_neighbor_list(G):
     -----
         dict[n]['child'] is a list of vertices downstream to vertex n
         dict[n]['prob'] is a list of probabilities for choosing a downstream node for vertex n
+        dict[n]['alias_prob'] and dict[n]['alias'] are the alias table of dict[n]['prob'], used to select the downstream node from a single uniform sample
     """
 
     nbrs_dict = {}
@@ -176,9 +226,13 @@ def create_neighbor_list(G):
         if node_list:
             nbrs_dict[u]['child'] = node_list
             nbrs_dict[u]['prob'] = np.asarray(prob_list) / sum(prob_list)
+            nbrs_dict[u]['alias_prob'], nbrs_dict[u][
+                'alias'] = build_alias_table(nbrs_dict[u]['prob'])
         else:
             nbrs_dict[u]['child'] = None
             nbrs_dict[u]['prob'] = None
+            nbrs_dict[u]['alias_prob'] = None
+            nbrs_dict[u]['alias'] = None
 
     return nbrs_dict
 
@@ -254,7 +308,12 @@ def run_graph_transport(self,
                         fracture_spacing=None,
                         control_planes=None,
                         direction=None,
-                        cp_filename='control_planes'):
+                        cp_filename='control_planes',
+                        engine='particle',
+                        seed=None,
+                        tdrw_cache_dir=None,
+                        use_tdrw_cache=False,
+                        return_particles=False):
     """ Run  particle tracking on the given NetworkX graph
 
     Parameters
@@ -262,8 +321,8 @@ def run_graph_transport(self,
         self : object
             DFN Class
             
-        G : NetworkX graph 
-            obtained from graph_flow
+        G : NetworkX graph, dict, or string
+            obtained from graph_flow. The vectorized engine also accepts the flow solution as a dictionary of arrays (run_graph_flow with return_graph=False) or the name of the graph flow file written by run_graph_flow, so the NetworkX graph is not needed.
 
         nparticles: int 
             number of particles
@@ -277,8 +336,8 @@ def run_graph_transport(self,
         frac_id_file : string
             name of file to which detailed information of each particle's travel will be written
         
-        dump_flag: bool
-            on/off to write full trajectory information to file
+        dump_traj: bool
+            on/off to write full trajectory information to the file trajectories.hdf5. Trajectories are streamed to the file as particles leave the network.
 
         tdrw_flag : Bool
             if False, matrix_porosity and matrix_diffusivity are ignored
@@ -298,10 +357,25 @@ def run_graph_transport(self,
         primary direction : string (x,y,z)
             string indicating primary direction of flow 
 
+        engine : string
+            particle tracking engine. Options are 'particle' (default), which tracks one Particle object at a time, and 'vectorized', which compiles the graph into arrays and advances all particles together with numpy. With ncpu > 1 the vectorized engine places the compiled graph in shared memory and hands each worker chunks of particles.
+
+        seed : int
+            seed for the random number generator of the vectorized engine. Ignored by the particle engine, which seeds with the particle number.
+
+        tdrw_cache_dir : string
+            directory where transition probability tables for limited matrix diffusion are cached. Default is $DFNWORKS_TDRW_CACHE or tdrw_cache in the current directory
+
+        use_tdrw_cache : bool
+            If True, transition probability tables are reused across runs with the same fracture_spacing, matrix_diffusivity, and time bounds. Default is False
+
+        return_particles : bool
+            If True, the particle engine keeps every Particle object, including its full path, and returns the list of them as earlier versions did. Memory then grows with the number of particles times the path length. Default is False. Not available with engine='vectorized'.
+
     Returns
     -------
-        particles : list
-            list of particles objects
+        particles : dict or list
+            Dictionary of numpy arrays (one entry per particle) with the travel times, lengths, beta, exit flags, and control plane crossings of the particles. Particle objects and paths are not kept, so memory does not grow with the number of particles times the path length. With return_particles=True, the list of particles objects instead.
 
     Notes
     -----
@@ -309,9 +383,17 @@ def run_graph_transport(self,
     """
     ## the flow graph needs to be a global variable so all processors can access it
     ## without making a copy of it.
+    if isinstance(G, str):
+        G = load_graph_flow_arrays(G)
+    if isinstance(G, dict) and engine != 'vectorized':
+        error = "--> Error. A flow solution stored as arrays can only be used with engine='vectorized'.\n\nExitting\n\n"
+        self.print_log(error, 'error')
+
     global G_global
-    G_global = nx.Graph()
-    G_global = G.copy()
+    if isinstance(G, dict):
+        G_global = None
+    else:
+        G_global = G.copy()
 
     if not format in ['ascii', 'hdf5']:
         error = (
@@ -319,6 +401,17 @@ def run_graph_transport(self,
         )
         self.print_log(error, 'error')
 
+    if not engine in ['particle', 'vectorized']:
+        error = (
+            f"--> Error. Unknown particle tracking engine provided in run_graph_transport.\n\n--> Provided value is {engine}.\n--> Options: 'particle' or 'vectorized'.\n\nExitting\n\n"
+        )
+        self.print_log(error, 'error')
+
+    if return_particles and engine != 'particle':
+        error = "--> Error. return_particles=True requires engine='particle', the vectorized engine does not create Particle objects.\n\nExitting\n\n"
+        self.print_log(error, 'error')
+    particle_list = [] if return_particles else None
+
     self.print_log("--> Running Graph Particle Tracking")
     
     # Check parameters for TDRW
@@ -336,9 +429,12 @@ def run_graph_transport(self,
             control_planes=control_planes, direction=direction)
     self.print_log(f"--> Control Plane Flag {control_plane_flag}")
 
-    self.print_log("--> Creating downstream neighbor list")
     global nbrs_dict
-    nbrs_dict = create_neighbor_list(G)
+    if engine == 'particle':
+        self.print_log("--> Creating downstream neighbor list")
+        nbrs_dict = create_neighbor_list(G)
+    else:
+        nbrs_dict = None
 
     self.print_log("--> Getting initial Conditions")
     ip, nparticles = get_initial_posititions(G, initial_positions, nparticles)
@@ -347,13 +443,19 @@ def run_graph_transport(self,
 
     if dump_traj:
         self.print_log(f"--> Writing trajectory information to file")
+        writer = io.TrajectoryWriter("trajectories.hdf5")
 
     if fracture_spacing is not None:
         self.print_log(f"--> Using limited matrix block size for TDRW")
         self.print_log(f"--> Fracture spacing {fracture_spacing:0.2e} [m]")
-        trans_prob = set_up_limited_matrix_diffusion(G, fracture_spacing,
-                                                     matrix_porosity,
-                                                     matrix_diffusivity)
+        trans_prob = set_up_limited_matrix_diffusion(
+            G,
+            fracture_spacing,
+            matrix_porosity,
+            matrix_diffusivity,
+            ncpu=self.ncpu,
+            cache_dir=tdrw_cache_dir,
+            use_cache=use_tdrw_cache)
         # This doesn't change for the system.
         # Transfer time diffusing between fracture blocks
         transfer_time = fracture_spacing**2 / (2 * matrix_diffusivity)
@@ -361,9 +463,81 @@ def run_graph_transport(self,
         trans_prob = None
         transfer_time = None
     ## main loop
-    if self.ncpu == 1:
+    if engine == 'vectorized':
+        self.print_log("--> Using the vectorized particle tracking engine")
         tic = timeit.default_timer()
-        particles = []
+        if isinstance(G, dict):
+            cg = compile_flow_arrays(G)
+        else:
+            cg = compile_flow_graph(G)
+        if tdrw_flag and fracture_spacing is not None:
+            add_tdrw_edge_constants(cg, matrix_porosity, matrix_diffusivity,
+                                    transfer_time)
+        engine_params = {
+            "tdrw_flag": tdrw_flag,
+            "matrix_porosity": matrix_porosity,
+            "matrix_diffusivity": matrix_diffusivity,
+            "fracture_spacing": fracture_spacing,
+            "trans_prob": trans_prob,
+            "transfer_time": transfer_time,
+            "cp_flag": control_plane_flag,
+            "control_planes": control_planes,
+            "direction": direction
+        }
+
+        # paths are handed over as particles leave the network, written, and dropped
+        frac_seqs = [None] * nparticles if frac_id_file else None
+
+        def write_paths(particles, offsets, edges):
+            if dump_traj:
+                write_path_block(cg, particles, offsets, edges, writer)
+            if frac_id_file:
+                frac_offsets, fracs = fracture_sequence_arrays(
+                    cg, offsets, edges)
+                for i, seq in zip(particles,
+                                  np.split(fracs, frac_offsets[1:-1])):
+                    frac_seqs[i] = seq
+
+        if frac_id_file or dump_traj:
+            engine_params["path_callback"] = write_paths
+        if self.ncpu > 1:
+            self.print_log(
+                f"--> Using {self.ncpu} processors with the graph in shared memory"
+            )
+            results = track_particles_shared(cg,
+                                             node_indices(cg, ip),
+                                             self.ncpu,
+                                             seed=seed,
+                                             **engine_params)
+        else:
+            results = track_particles_vectorized(cg,
+                                                 node_indices(cg, ip),
+                                                 seed=seed,
+                                                 **engine_params)
+        elapsed = timeit.default_timer() - tic
+        self.print_log(
+            f"--> Main Tracking Loop Complete. Time Required {elapsed:0.2e} seconds"
+        )
+
+        io.write_particle_info(results["particle_number"],
+                               results["advect_time"],
+                               results["matrix_diffusion_time"],
+                               results["total_time"], results["length"],
+                               results["beta"], frac_seqs, partime_file,
+                               frac_id_file, format)
+        stuck_particles = nparticles - np.count_nonzero(results["exit_flag"])
+        if control_plane_flag:
+            io.write_control_planes(results["cp_adv_time"],
+                                    results["cp_tdrw_time"],
+                                    results["cp_pathline_length"],
+                                    control_planes, cp_filename, format)
+        particles = results
+
+    elif self.ncpu == 1:
+        tic = timeit.default_timer()
+        particles = initialize_particle_arrays(
+            nparticles, len(control_planes) if control_plane_flag else 0)
+        frac_seqs = [] if frac_id_file else None
         for i in range(nparticles):
             if i % 1000 == 0:
                 self.print_log(f"--> Starting particle {i} out of {nparticles}")
@@ -372,22 +546,31 @@ def run_graph_transport(self,
                                 trans_prob, transfer_time, control_plane_flag,
                                 control_planes, direction)
             particle.track(G, nbrs_dict)
-            particles.append(particle)
+            if dump_traj:
+                writer.append_particle(particle)
+            record_particle(particles, i, particle, frac_seqs)
+            if return_particles:
+                particle_list.append(particle)
 
         elapsed = timeit.default_timer() - tic
         self.print_log(
             f"--> Main Tracking Loop Complete. Time Required {elapsed:0.2e} seconds"
         )
-        stuck_particles = io.dump_particle_info(particles, partime_file,
-                                                frac_id_file, format)
+        stuck_particles = nparticles - np.count_nonzero(
+            particles["exit_flag"])
+        io.write_particle_info(particles["particle_number"],
+                               particles["advect_time"],
+                               particles["matrix_diffusion_time"],
+                               particles["total_time"], particles["length"],
+                               particles["beta"], frac_seqs, partime_file,
+                               frac_id_file, format)
         if control_plane_flag:
-            io.dump_control_planes(particles, control_planes, cp_filename,
-                                   format)
+            io.write_control_planes(particles["cp_adv_time"],
+                                    particles["cp_tdrw_time"],
+                                    particles["cp_pathline_length"],
+                                    control_planes, cp_filename, format)
 
-        if dump_traj:
-            io.dump_trajectories(particles, 1)
-
-    if self.ncpu > 1:
+    elif self.ncpu > 1:
         self.print_log(f"--> Using {self.ncpu} processors")
         ## Prepare input data
         inputs = []
@@ -395,10 +578,20 @@ def run_graph_transport(self,
         tic = timeit.default_timer()
         pool = mp.Pool(min(self.ncpu, nparticles))
 
-        particles = []
+        particles = initialize_particle_arrays(
+            nparticles, len(control_planes) if control_plane_flag else 0)
+        frac_seqs = [] if frac_id_file else None
+        num_done = 0
 
+        # particles are recorded in the order they finish
         def gather_output(output):
-            particles.append(output)
+            nonlocal num_done
+            if dump_traj:
+                writer.append_particle(output)
+            record_particle(particles, num_done, output, frac_seqs)
+            if return_particles:
+                particle_list.append(output)
+            num_done += 1
 
         for i in range(nparticles):
             data = {}
@@ -426,14 +619,22 @@ def run_graph_transport(self,
             f"--> Main Tracking Loop Complete. Time Required {elapsed:0.2e} seconds"
         )
 
-        stuck_particles = io.dump_particle_info(particles, partime_file,
-                                                frac_id_file, format)
+        stuck_particles = nparticles - np.count_nonzero(
+            particles["exit_flag"])
+        io.write_particle_info(particles["particle_number"],
+                               particles["advect_time"],
+                               particles["matrix_diffusion_time"],
+                               particles["total_time"], particles["length"],
+                               particles["beta"], frac_seqs, partime_file,
+                               frac_id_file, format)
         if control_plane_flag:
-            io.dump_control_planes(particles, control_planes, cp_filename,
-                                   format)
+            io.write_control_planes(particles["cp_adv_time"],
+                                    particles["cp_tdrw_time"],
+                                    particles["cp_pathline_length"],
+                                    control_planes, cp_filename, format)
 
-        if dump_traj:
-            io.dump_trajectories(particles, min(self.ncpu, nparticles))
+    if dump_traj:
+        writer.close()
 
     if stuck_particles == 0:
         self.print_log("--> All particles exited the network")
@@ -447,4 +648,6 @@ def run_graph_transport(self,
     del G_global
     del nbrs_dict
 
+    if return_particles:
+        return particle_list
     return particles
\ No newline at end of file
@@ -3,10 +3,10 @@ import numpy as np
 import json
 import sys
 import time
-from itertools import combinations
 
-from pydfnworks.dfnGraph.graph_attributes import add_perm, add_area
+from pydfnworks.dfnGraph.fracture_properties import load_fracture_properties
 from pydfnworks.general.logging import local_print_log
+from pydfnworks.general.dfngen_output_cache import load_dfngen_file
 
 def boundary_index(bc_name):
     """Determine boundary index in intersections_list.dat from name."""
@@ -24,32 +24,74 @@ def boundary_index(bc_name):
         local_print_log(f"Error. Unknown boundary condition: {bc_name}", 'error')
         sys.exit(1)
 
+def fracture_codes(fracs):
+    """ Integer codes of the fractures an intersection lies on
+
+    Parameters
+    ----------
+        fracs : iterable
+            node attribute frac of each node, a pair of fractures such as (3, 7) or (3, 't')
+
+    Returns
+    -------
+        codes : numpy array
+            (number of nodes, 2) array. Fractures keep their (positive) number, 's' is -1, 't' is -2, and anything else, e.g., a face name, is -3
+    """
+    special = {'s': -1, 't': -2}
+    codes = [[
+        int(f) if isinstance(f, (int, np.integer)) else special.get(f, -3)
+        for f in pair
+    ] for pair in fracs]
+    return np.array(codes, dtype=int).reshape(-1, 2)
+
+
 def create_intersection_graph(inflow, outflow,
-                              intersection_file="dfnGen_output/intersection_list.dat"):
+                              intersection_file="dfnGen_output/intersection_list.dat",
+                              boundary_faces=None,
+                              fracture_properties=None):
+    """ Create a graph where the nodes are fracture intersections and edges connect intersections on the same fracture
+
+    Parameters
+    ----------
+        inflow : string
+            name of the inflow boundary, connected to the source node 's'
+
+        outflow : string
+            name of the outflow boundary, connected to the target node 't'
+
+        intersection_file : string
+            intersection list written by dfnGen
+
+        boundary_faces : list
+            optional list of additional domain faces whose intersections are kept as nodes, but not connected to 's' or 't'
+
+        fracture_properties : FractureProperties
+            fracture property table. Default reads dfnGen_output/fracture_info.dat
+
+    Returns
+    -------
+        G : NetworkX graph
+            intersection graph. If boundary_faces is given, nodes on a domain face (including inflow and outflow) have the attribute boundary set to the face name.
+
+    Notes
+    -----
+        Nodes on one of the boundary_faces have frac = (fracture, face name).
+    """
     total_start = time.time()
     local_print_log("--> Starting intersection graph construction")
 
-    # 1) Load & filter intersections
+    # 1) Load & filter intersections, group them by fracture
     load_start = time.time()
-    inflow_index = boundary_index(inflow)
-    outflow_index = boundary_index(outflow)
-    frac_intersections = np.genfromtxt(intersection_file, skip_header=1)
-    internal_int = np.where(frac_intersections[:, 1] > 0)
-    source_int   = np.where(frac_intersections[:, 1] == inflow_index)
-    target_int   = np.where(frac_intersections[:, 1] == outflow_index)
-    edges_to_keep = list(internal_int[0]) + list(source_int[0]) + list(target_int[0])
-    frac_intersections = frac_intersections[edges_to_keep, :]
+    inter = load_intersections(inflow, outflow, intersection_file,
+                               boundary_faces)
     load_end = time.time()
     local_print_log(f"--> Loaded & filtered intersections in {load_end - load_start:.3f} s")
 
-    # 2) Build fracture → node map
+    # 2) Pairwise edges on every fracture
     map_start = time.time()
-    max_frac_index = int(max(frac_intersections[:, 0].max(),
-                              frac_intersections[:, 1].max()))
-    frac_list = [i for i in range(1, max_frac_index + 1)] + ['s', 't']
-    fracture_node_dict = dict(zip(frac_list, ([] for _ in frac_list)))
+    edges = intersection_edges(inter)
     map_end = time.time()
-    local_print_log(f"--> Built fracture→node map in {map_end - map_start:.3f} s")
+    local_print_log(f"--> Computed {len(edges['u'])} internal edges in {map_end - map_start:.3f} s")
 
     # 3) Add nodes and source/target
     nodes_start = time.time()
@@ -57,58 +99,289 @@ def create_intersection_graph(inflow, outflow,
     G.add_node('s', frac=('s', 's'))
     G.add_node('t', frac=('t', 't'))
 
-    num_nodes = len(frac_intersections)
-    for i in range(num_nodes):
-        f1 = int(frac_intersections[i][0])
-        raw2 = frac_intersections[i][1]
-        if raw2 > 0:
-            f2 = int(raw2)
-        elif int(raw2) == inflow_index:
-            f2 = 's'
-        elif int(raw2) == outflow_index:
-            f2 = 't'
-        else:
-            continue
-
-        G.add_node(i, frac=(f1, f2))
-        G.nodes[i]['x']      = float(frac_intersections[i][2])
-        G.nodes[i]['y']      = float(frac_intersections[i][3])
-        G.nodes[i]['z']      = float(frac_intersections[i][4])
-        G.nodes[i]['length'] = float(frac_intersections[i][5])
-
-        fracture_node_dict[f1].append(i)
-        fracture_node_dict[f2].append(i)
-
-        if f2 == 's':
-            G.add_edge(i, 's', frac='s', length=0.0, perm=1, iperm=1)
-        if f2 == 't':
-            G.add_edge(i, 't', frac='t', length=0.0, perm=1, iperm=1)
+    labels = inter["label"].tolist()
+    G.add_nodes_from(
+        (i, {
+            'frac': (f1, f2),
+            'x': x,
+            'y': y,
+            'z': z,
+            'length': length
+        }) for i, f1, f2, x, y, z, length in zip(
+            labels, inter["f1"].tolist(), inter["f2"].tolist(),
+            inter["x"].tolist(), inter["y"].tolist(), inter["z"].tolist(),
+            inter["length"].tolist()))
+    # only tag faces when they were requested, so the default graph keeps
+    # the same attributes as before
+    if boundary_faces is not None:
+        for i, face in zip(labels, inter["boundary"].tolist()):
+            if face:
+                G.nodes[i]['boundary'] = face
+    for flag, terminal in [("inletflag", 's'), ("outletflag", 't')]:
+        G.add_edges_from((i, terminal, {
+            'frac': terminal,
+            'length': 0.0,
+            'perm': 1.0,
+            'iperm': 1.0,
+            'b': 1.0,
+            'area': 1.0
+        }) for i in inter["label"][inter[flag]].tolist())
     nodes_end = time.time()
     local_print_log(f"--> Added nodes and source/target edges in {nodes_end - nodes_start:.3f} s")
 
-    # 4) Add internal edges
+    # 4) Add internal edges with permeability and area
     edges_start = time.time()
-    for frac, nodes_on_frac in fracture_node_dict.items():
-        if frac in ('s', 't'):
-            continue
-        for u, v in combinations(set(nodes_on_frac), 2):
-            dx = G.nodes[u]['x'] - G.nodes[v]['x']
-            dy = G.nodes[u]['y'] - G.nodes[v]['y']
-            dz = G.nodes[u]['z'] - G.nodes[v]['z']
-            distance = np.sqrt(dx*dx + dy*dy + dz*dz)
-            G.add_edge(u, v, frac=frac, length=distance)
+    add_edge_properties(inter, edges, fracture_properties)
+    names = ['frac', 'length', 'perm', 'b', 'iperm', 'area']
+    G.add_edges_from(
+        (u, v, dict(zip(names, values)))
+        for u, v, *values in zip(inter["label"][edges["u"]].tolist(),
+                                 inter["label"][edges["v"]].tolist(),
+                                 *[edges[key].tolist() for key in names]))
     edges_end = time.time()
     local_print_log(f"--> Added internal edges in {edges_end - edges_start:.3f} s")
 
-    # 5) Apply permeability and area
-    perm_start = time.time()
-    add_perm(G)
-    add_area(G)
-    perm_end = time.time()
-    local_print_log(f"--> Applied perm & area in {perm_end - perm_start:.3f} s")
-
     # Total time
     total_end = time.time()
     local_print_log(f"--> Total graph construction time: {total_end - total_start:.3f} s")
     local_print_log("--> Intersection Graph Construction Complete")
     return G
+
+
+def load_intersections(inflow,
+                       outflow,
+                       intersection_file="dfnGen_output/intersection_list.dat",
+                       boundary_faces=None):
+    """ Read the intersection list and keep internal intersections and intersections with the requested faces
+
+    Parameters
+    ----------
+        inflow : string
+            name of the inflow boundary
+
+        outflow : string
+            name of the outflow boundary
+
+        intersection_file : string
+            intersection list written by dfnGen
+
+        boundary_faces : list
+            optional list of additional domain faces whose intersections are kept
+
+    Returns
+    -------
+        inter : dict
+            label : row of the intersection among the kept rows, used as the node name
+            f1 : first fracture (int)
+            f2 : second fracture, or 's', 't', or the face name (object array)
+            x, y, z, length : intersection midpoint and length
+            boundary : face name of boundary intersections, '' for internal ones
+            inletflag, outletflag : boolean arrays
+
+    Notes
+    -----
+        Rows are kept in the order internal, inflow, outflow, other faces, so node labels match earlier versions.
+    """
+    inflow_index = boundary_index(inflow)
+    outflow_index = boundary_index(outflow)
+    extra_faces = {}
+    if boundary_faces is not None:
+        for face in boundary_faces:
+            if face not in [inflow, outflow]:
+                extra_faces[boundary_index(face)] = face
+
+    frac_intersections = load_dfngen_file(intersection_file,
+                                          kind="intersection_list")
+    f2_raw = frac_intersections[:, 1]
+    internal_int = np.where(f2_raw > 0)[0]
+    source_int = np.where(f2_raw == inflow_index)[0]
+    target_int = np.where(f2_raw == outflow_index)[0]
+    extra_int = np.where(np.isin(f2_raw, list(extra_faces.keys())))[0]
+    keep = np.concatenate((internal_int, source_int, target_int, extra_int))
+    frac_intersections = frac_intersections[keep, :]
+    num_nodes = len(keep)
+
+    f2_raw = frac_intersections[:, 1].astype(int)
+    f2 = np.empty(num_nodes, dtype=object)
+    f2[:] = f2_raw.tolist()
+    boundary = np.full(num_nodes, '', dtype=object)
+    inletflag = f2_raw == inflow_index
+    outletflag = f2_raw == outflow_index
+    f2[inletflag] = 's'
+    f2[outletflag] = 't'
+    boundary[inletflag] = inflow
+    boundary[outletflag] = outflow
+    for index, face in extra_faces.items():
+        on_face = f2_raw == index
+        f2[on_face] = face
+        boundary[on_face] = face
+
+    inter = {
+        "label": np.arange(num_nodes),
+        "f1": frac_intersections[:, 0].astype(int),
+        "f2": f2,
+        "x": frac_intersections[:, 2],
+        "y": frac_intersections[:, 3],
+        "z": frac_intersections[:, 4],
+        "length": frac_intersections[:, 5],
+        "boundary": boundary,
+        "inletflag": inletflag,
+        "outletflag": outletflag
+    }
+    return inter
+
+
+def intersection_edges(inter):
+    """ Connect every pair of intersections that lie on the same fracture
+
+    Parameters
+    ----------
+        inter : dict
+            output of load_intersections
+
+    Returns
+    -------
+        edges : dict
+            u, v : node indices (into the arrays of inter) of each edge, u < v
+            frac : fracture the edge lies on
+            length : distance between the intersection midpoints
+
+    Notes
+    -----
+        Node-fracture pairs are sorted by fracture with argsort. Fractures with the same number of intersections k are stacked into an (m, k) array, so all edges of those fractures come from one np.triu_indices(k, 1) lookup. Edges are ordered by fracture, then by node. If two nodes share more than one fracture, the last fracture wins, as with repeated add_edge calls.
+    """
+    internal = inter["boundary"] == ''
+    node = np.concatenate((inter["label"], inter["label"][internal]))
+    frac = np.concatenate(
+        (inter["f1"], inter["f2"][internal].astype(int)))
+    # a node appears once per fracture
+    pairs = np.unique(np.column_stack((frac, node)), axis=0)
+    frac = pairs[:, 0]
+    node = pairs[:, 1]
+    fracs, start, count = np.unique(frac, return_index=True, return_counts=True)
+
+    u = []
+    v = []
+    edge_frac = []
+    for k in np.unique(count[count > 1]):
+        first = start[count == k]
+        members = node[first[:, None] + np.arange(k)]
+        i, j = np.triu_indices(k, 1)
+        u.append(members[:, i].ravel())
+        v.append(members[:, j].ravel())
+        edge_frac.append(np.repeat(frac[first], len(i)))
+    if u:
+        u = np.concatenate(u)
+        v = np.concatenate(v)
+        edge_frac = np.concatenate(edge_frac)
+    else:
+        u = np.zeros(0, dtype=int)
+        v = np.zeros(0, dtype=int)
+        edge_frac = np.zeros(0, dtype=int)
+    order = np.lexsort((v, u, edge_frac))
+    u = u[order]
+    v = v[order]
+    edge_frac = edge_frac[order]
+
+    # keep the last fracture of duplicated node pairs
+    key = u * len(inter["label"]) + v
+    _, last = np.unique(key[::-1], return_index=True)
+    last = np.sort(len(key) - 1 - last)
+    u = u[last]
+    v = v[last]
+    edge_frac = edge_frac[last]
+
+    length = np.sqrt((inter["x"][u] - inter["x"][v])**2 +
+                     (inter["y"][u] - inter["y"][v])**2 +
+                     (inter["z"][u] - inter["z"][v])**2)
+    return {"u": u, "v": v, "frac": edge_frac, "length": length}
+
+
+def add_edge_properties(inter, edges, fracture_properties=None):
+    """ Add permeability, aperture, and area arrays to the edges, same values as add_perm and add_area
+
+    Parameters
+    ----------
+        inter : dict
+            output of load_intersections
+
+        edges : dict
+            output of intersection_edges, updated in place with perm, b, iperm, area, and weight
+
+        fracture_properties : FractureProperties
+            fracture property table. Default reads dfnGen_output/fracture_info.dat
+
+    Returns
+    -------
+        None
+    """
+    if fracture_properties is None:
+        fracture_properties = load_fracture_properties()
+    idx = edges["frac"] - 1
+    perm = fracture_properties.perm[idx]
+    edges["perm"] = perm
+    edges["b"] = fracture_properties.b[idx]
+    edges["iperm"] = fracture_properties.iperm[idx]
+    edges["area"] = fracture_properties.aperture[idx] * (
+        inter["length"][edges["u"]] + inter["length"][edges["v"]]) / 2.0
+    # add_weight skips zero length edges, which count as one in the flow solve
+    with np.errstate(divide='ignore', invalid='ignore'):
+        edges["weight"] = np.where(edges["length"] > 0,
+                                   perm * edges["area"] / edges["length"], 1)
+
+
+def intersection_flow_arrays(inflow,
+                             outflow,
+                             intersection_file="dfnGen_output/intersection_list.dat",
+                             fracture_properties=None):
+    """ Build the arrays used by the graph flow solver directly from the intersection list, without a NetworkX graph
+
+    Parameters
+    ----------
+        inflow : string
+            name of the inflow boundary
+
+        outflow : string
+            name of the outflow boundary
+
+        intersection_file : string
+            intersection list written by dfnGen
+
+        fracture_properties : FractureProperties
+            fracture property table. Default reads dfnGen_output/fracture_info.dat
+
+    Returns
+    -------
+        arrays : dict
+            same entries as graph_flow.graph_to_flow_arrays applied to the graph from create_intersection_graph and prepare_graph_with_attributes, plus old_label
+
+    Notes
+    -----
+        Node i is the i-th intersection kept by load_intersections, which is the label given by prepare_graph_with_attributes.
+    """
+    local_print_log("--> Building intersection graph arrays")
+    inter = load_intersections(inflow, outflow, intersection_file)
+    edges = intersection_edges(inter)
+    add_edge_properties(inter, edges, fracture_properties)
+    if not np.any(inter["inletflag"]):
+        error = "Error. There are no nodes in the inlet.\nExiting"
+        local_print_log(error, 'error')
+    if not np.any(inter["outletflag"]):
+        error = "Error. There are no nodes in the outlet.\nExiting"
+        local_print_log(error, 'error')
+    arrays = {
+        "nodes": inter["label"],
+        "old_label": inter["label"],
+        "inletflag": inter["inletflag"],
+        "outletflag": inter["outletflag"],
+        "x": inter["x"],
+        "y": inter["y"],
+        "z": inter["z"],
+        "node_frac": np.column_stack((inter["f1"], fracture_codes(
+            zip(inter["f1"], inter["f2"]))[:, 1]))
+    }
+    for key in ['u', 'v', 'perm', 'iperm', 'length', 'weight', 'area', 'frac', 'b']:
+        arrays[key] = edges[key]
+    local_print_log(
+        f"--> Graph arrays have {len(inter['label'])} nodes and {len(edges['u'])} edges")
+    return arrays
@@ -1,6 +1,7 @@
 import sys
 import numpy as np
 
+from pydfnworks.dfnGraph.alias_sampling import sample_alias
 from pydfnworks.general.logging import local_print_log
 
 class Particle():
@@ -121,9 +122,9 @@ class Particle():
 
         else:
             ## complete mixing to select outflowing node
-            self.next_node = np.random.choice(
-                nbrs_dict[self.curr_node]['child'],
-                p=nbrs_dict[self.curr_node]['prob'])
+            nbrs = nbrs_dict[self.curr_node]
+            self.next_node = nbrs['child'][sample_alias(
+                nbrs['alias_prob'], nbrs['alias'], np.random.random())]
 
             self.frac = G.edges[self.curr_node, self.next_node]['frac']
             self.frac_seq.append(self.frac)
@@ -0,0 +1,574 @@
+"""
+.. module:: particle_engine.py
+   :synopsis: Batched struct-of-arrays particle tracking on a compiled graph flow solution
+.. moduleauthor:: Jeffrey Hyman <jhyman@lanl.gov>
+
+"""
+
+import timeit
+import numpy as np
+from scipy import special
+
+from pydfnworks.dfnGraph.compiled_graph import select_next_edge
+from pydfnworks.dfnGraph.graph_tdrw import get_fracture_segments_array, sample_segment_diffusion_times
+from pydfnworks.general.logging import local_print_log
+
+
+def initialize_particle_arrays(nparticles, num_cp):
+    """ Allocate the struct-of-arrays used to track a batch of particles
+
+    Parameters
+    ----------
+        nparticles : int
+            number of particles
+
+        num_cp : int
+            number of control planes
+
+    Returns
+    -------
+        results : dict
+            Dictionary of numpy arrays, one entry per particle (rows of the control plane arrays are control planes)
+    """
+    results = {
+        "particle_number": np.arange(nparticles),
+        "advect_time": np.zeros(nparticles),
+        "matrix_diffusion_time": np.zeros(nparticles),
+        "total_time": np.zeros(nparticles),
+        "length": np.zeros(nparticles),
+        "beta": np.zeros(nparticles),
+        "exit_flag": np.zeros(nparticles, dtype=bool),
+        "cp_adv_time": np.full((num_cp, nparticles), np.nan),
+        "cp_tdrw_time": np.full((num_cp, nparticles), np.nan),
+        "cp_pathline_length": np.full((num_cp, nparticles), np.nan)
+    }
+    return results
+
+
+def batch_unlimited_matrix_diffusion(cg, edges, delta_t, matrix_porosity,
+                                     matrix_diffusivity, rng):
+    """ Matrix diffusion with unlimited block size for a batch of particles
+
+    Parameters
+    ----------
+        cg : dict
+            compiled graph from compile_flow_graph
+
+        edges : numpy array
+            edge index for each particle
+
+        delta_t : numpy array
+            advective time on the edge for each particle
+
+        matrix_porosity: float
+            Matrix Porosity
+
+        matrix_diffusivity: float
+            Matrix Diffusivity [m^2/s]
+
+        rng : numpy Generator
+            random number generator
+
+    Returns
+    -------
+        delta_t_md : numpy array
+            matrix diffusion time for each particle
+    """
+    a_nondim = matrix_porosity * np.sqrt(matrix_diffusivity) / cg["b"][edges]
+    xi = rng.uniform(low=0, high=1, size=len(edges))
+    return (a_nondim * delta_t / special.erfcinv(xi))**2
+
+
+def add_tdrw_edge_constants(cg, matrix_porosity, matrix_diffusivity,
+                            transfer_time):
+    """ Cache the per-edge constants of limited block size matrix diffusion on the compiled graph
+
+    Parameters
+    ----------
+        cg : dict
+            compiled graph from compile_flow_graph. Updated in place with tdrw_a, segment_time, and num_segments
+
+        matrix_porosity: float
+            Matrix Porosity
+
+        matrix_diffusivity: float
+            Matrix Diffusivity [m^2/s]
+
+        transfer_time : float
+            Time to diffuse across the fracture spacing [s]
+
+    Returns
+    -------
+        None
+    """
+    segment_length, num_segments = get_fracture_segments_array(
+        transfer_time, cg["length"], cg["b"], cg["velocity"],
+        matrix_diffusivity, matrix_porosity)
+    cg["tdrw_a"] = matrix_porosity * np.sqrt(matrix_diffusivity) / cg["b"]
+    cg["segment_time"] = segment_length / cg["velocity"]
+    cg["num_segments"] = num_segments
+
+
+def batch_limited_matrix_diffusion(cg, edges, trans_prob, rng,
+                                   max_segments=10**6):
+    """ Matrix diffusion with limited block size for a batch of particles
+
+    Parameters
+    ----------
+        cg : dict
+            compiled graph with the constants from add_tdrw_edge_constants
+
+        edges : numpy array
+            edge index for each particle
+
+        trans_prob : dictionary
+            transition probability cdf from set_up_limited_matrix_diffusion
+
+        rng : numpy Generator
+            random number generator
+
+        max_segments : int
+            largest number of segments sampled in one call
+
+    Returns
+    -------
+        delta_t_md : numpy array
+            matrix diffusion time for each particle
+
+    Notes
+    -----
+        The segments of all edges in the batch are sampled in blocks of at most max_segments, so memory does not grow with the number of particles times the number of segments per edge. A block can start and end inside the segments of one edge. Batches with at most max_segments segments are sampled in one call as before.
+    """
+    last_segment = np.cumsum(cg["num_segments"][edges])
+    total = int(last_segment[-1]) if len(edges) > 0 else 0
+    delta_t_md = np.zeros(len(edges))
+    for start in range(0, total, max_segments):
+        segments = np.arange(start, min(start + max_segments, total))
+        owner = np.searchsorted(last_segment, segments, side='right')
+        segment_edges = edges[owner]
+        t_diff = sample_segment_diffusion_times(
+            trans_prob, cg["tdrw_a"][segment_edges],
+            cg["segment_time"][segment_edges], rng)
+        delta_t_md += np.bincount(owner, weights=t_diff, minlength=len(edges))
+    return delta_t_md
+
+
+def batch_cross_control_planes(cg, results, active, curr, nxt, delta_t,
+                               delta_t_md, delta_l, cp_index, control_planes,
+                               direction, tdrw_flag):
+    """ Record the interpolated times and pathline lengths for particles that cross control planes on this step
+
+    Parameters
+    ----------
+        cg : dict
+            compiled graph from compile_flow_graph
+
+        results : dict
+            particle arrays from initialize_particle_arrays
+
+        active : numpy array
+            indices of the particles moving on this step
+
+        curr, nxt : numpy array
+            upstream and downstream node of the edge taken by each active particle
+
+        delta_t, delta_t_md, delta_l : numpy array
+            advective time, matrix diffusion time and length of the step
+
+        cp_index : numpy array
+            index of the next control plane for every particle. Updated in place
+
+        control_planes : list
+            control plane locations
+
+        direction : str
+            primary direction of flow (x, y, z)
+
+        tdrw_flag : bool
+            Toggle for matrix diffusion
+
+    Returns
+    -------
+        None
+    """
+    num_cp = len(control_planes)
+    planes = np.append(np.asarray(control_planes, dtype=float), np.inf)
+    x1 = cg[direction][curr]
+    x2 = cg[direction][nxt]
+    while True:
+        k = cp_index[active]
+        crossed = np.nonzero(x2 > planes[k])[0]
+        if len(crossed) == 0:
+            break
+        p = active[crossed]
+        k = k[crossed]
+        frac = (planes[k] - x1[crossed]) / (x2[crossed] - x1[crossed])
+        tau = results["advect_time"][p] + frac * delta_t[crossed]
+        if np.any(tau < 0):
+            error = "Error. Interpolated negative travel time."
+            local_print_log(error, 'error')
+        results["cp_adv_time"][k, p] = tau
+        results["cp_pathline_length"][k, p] = results["length"][p] + frac * delta_l[crossed]
+        if tdrw_flag:
+            results["cp_tdrw_time"][k, p] = results["total_time"][p] + frac * (
+                delta_t[crossed] + delta_t_md[crossed])
+        else:
+            results["cp_tdrw_time"][k, p] = tau
+        cp_index[p] = np.minimum(k + 1, num_cp)
+
+
+def gather_paths(nparticles, path_particles, path_edges):
+    """ Convert the per-step (particle, edge) records into ragged per-particle paths
+
+    Parameters
+    ----------
+        nparticles : int
+            number of particles
+
+        path_particles : list of numpy arrays
+            particle indices moved at every step
+
+        path_edges : list of numpy arrays
+            edge taken by those particles at every step
+
+    Returns
+    -------
+        offsets : numpy array
+            edges of particle i are edges[offsets[i]:offsets[i+1]]
+
+        edges : numpy array
+            concatenated edge indices in order of travel
+    """
+    if len(path_particles) == 0:
+        return np.zeros(nparticles + 1, dtype=int), np.zeros(0, dtype=int)
+    particles = np.concatenate(path_particles)
+    edges = np.concatenate(path_edges)
+    # steps were appended in time order so a stable sort preserves the path order
+    order = np.argsort(particles, kind='stable')
+    offsets = np.zeros(nparticles + 1, dtype=int)
+    offsets[1:] = np.cumsum(np.bincount(particles, minlength=nparticles))
+    return offsets, edges[order]
+
+
+def fracture_sequence_arrays(cg, path_offsets, path_edges):
+    """ Get the sequence of fractures visited by every particle as ragged arrays
+
+    Parameters
+    ----------
+        cg : dict
+            compiled graph from compile_flow_graph
+
+        path_offsets, path_edges : numpy array
+            ragged paths from gather_paths
+
+    Returns
+    -------
+        frac_offsets : numpy array
+            fractures of particle i are fracs[frac_offsets[i]:frac_offsets[i+1]]
+
+        fracs : numpy array
+            fractures visited by each particle with consecutive repeats removed
+    """
+    nparticles = len(path_offsets) - 1
+    fracs = cg["frac"][path_edges]
+    owner = np.repeat(np.arange(nparticles), np.diff(path_offsets))
+    keep = np.ones(len(fracs), dtype=bool)
+    keep[1:] = (fracs[1:] != fracs[:-1]) | (owner[1:] != owner[:-1])
+    frac_offsets = np.zeros(nparticles + 1, dtype=int)
+    frac_offsets[1:] = np.cumsum(np.bincount(owner[keep], minlength=nparticles))
+    return frac_offsets, fracs[keep]
+
+
+def fracture_sequences(cg, path_offsets, path_edges):
+    """ Get the sequence of fractures visited by every particle
+
+    Parameters
+    ----------
+        cg : dict
+            compiled graph from compile_flow_graph
+
+        path_offsets, path_edges : numpy array
+            ragged paths from gather_paths
+
+    Returns
+    -------
+        frac_seqs : list of numpy arrays
+            fractures visited by each particle with consecutive repeats removed
+    """
+    frac_offsets, fracs = fracture_sequence_arrays(cg, path_offsets,
+                                                   path_edges)
+    return np.split(fracs, frac_offsets[1:-1])
+
+
+def write_path_block(cg, particle_numbers, offsets, edges, writer):
+    """ Write the trajectories of a block of particles with a TrajectoryWriter
+
+    Parameters
+    ----------
+        cg : dict
+            compiled graph from compile_flow_graph
+
+        particle_numbers : numpy array
+            particle number of each trajectory in the block
+
+        offsets, edges : numpy array
+            ragged paths of the block, offsets start at 0
+
+        writer : TrajectoryWriter
+            open trajectory writer from particle_io
+
+    Returns
+    -------
+        None
+    """
+    nodes = cg["source"][edges]
+    coords = np.c_[cg["x"][nodes], cg["y"][nodes], cg["z"][nodes]]
+    frac_offsets, fracs = fracture_sequence_arrays(cg, offsets, edges)
+    writer.append_block(particle_numbers, offsets, cg["velocity"][edges],
+                        cg["time"][edges], cg["length"][edges], coords,
+                        frac_offsets, fracs)
+
+
+def write_path_trajectories(cg, results, writer, block_size=100000):
+    """ Write the trajectories recorded by track_particles_vectorized with a TrajectoryWriter
+
+    Parameters
+    ----------
+        cg : dict
+            compiled graph from compile_flow_graph
+
+        results : dict
+            output of track_particles_vectorized with record_paths=True
+
+        writer : TrajectoryWriter
+            open trajectory writer from particle_io
+
+        block_size : int
+            number of particles converted and handed to the writer at a time
+
+    Returns
+    -------
+        None
+    """
+    path_offsets = results["path_offsets"]
+    nparticles = len(path_offsets) - 1
+    for start in range(0, nparticles, block_size):
+        end = min(start + block_size, nparticles)
+        offsets = path_offsets[start:end + 1]
+        edges = results["path_edges"][offsets[0]:offsets[-1]]
+        write_path_block(cg, results["particle_number"][start:end],
+                         offsets - offsets[0], edges, writer)
+
+
+def retire_paths(nparticles, path_particles, path_edges, exited,
+                 path_callback):
+    """ Hand the paths of particles that left the network to path_callback and drop them from the step records
+
+    Parameters
+    ----------
+        nparticles : int
+            number of particles
+
+        path_particles, path_edges : list of numpy arrays
+            per-step (particle, edge) records, see gather_paths
+
+        exited : list of numpy arrays
+            particles that left the network since the last call
+
+        path_callback : function
+            called with (particles, offsets, edges), the sorted particle indices and their ragged paths
+
+    Returns
+    -------
+        path_particles, path_edges : list of numpy arrays
+            records of the particles still in the network
+    """
+    exited = np.sort(np.concatenate(exited))
+    if len(path_particles) > 0:
+        particles = np.concatenate(path_particles)
+        edges = np.concatenate(path_edges)
+    else:
+        particles = np.zeros(0, dtype=int)
+        edges = np.zeros(0, dtype=int)
+    is_exited = np.zeros(nparticles, dtype=bool)
+    is_exited[exited] = True
+    out = is_exited[particles]
+    # steps were appended in time order so a stable sort preserves the path order
+    order = np.argsort(particles[out], kind='stable')
+    counts = np.bincount(particles[out], minlength=nparticles)[exited]
+    offsets = np.zeros(len(exited) + 1, dtype=int)
+    offsets[1:] = np.cumsum(counts)
+    path_callback(exited, offsets, edges[out][order])
+    return [particles[~out]], [edges[~out]]
+
+
+def track_particles_vectorized(cg,
+                               ip,
+                               tdrw_flag=False,
+                               matrix_porosity=None,
+                               matrix_diffusivity=None,
+                               fracture_spacing=None,
+                               trans_prob=None,
+                               transfer_time=None,
+                               cp_flag=False,
+                               control_planes=None,
+                               direction=None,
+                               record_paths=False,
+                               path_callback=None,
+                               path_buffer_size=1 << 22,
+                               seed=None):
+    """ Advance every particle through the compiled graph together, one edge per step
+
+    Parameters
+    ----------
+        cg : dict
+            compiled graph from compile_flow_graph
+
+        ip : numpy array
+            initial node index (in the compiled graph) of every particle
+
+        tdrw_flag : Bool
+            if False, matrix_porosity and matrix_diffusivity are ignored
+
+        matrix_porosity: float
+            Matrix Porosity used in TDRW
+
+        matrix_diffusivity: float
+            Matrix Diffusivity used in TDRW (SI units m^2/s)
+
+        fracture_spacing : float
+            finite block size for limited matrix diffusion
+
+        trans_prob : dictionary
+            transition probability cdf for limited matrix diffusion
+
+        transfer_time : float
+            Time to diffuse across the fracture spacing [s]
+
+        cp_flag : bool
+            Toggle for control planes
+
+        control_planes : list of floats
+            list of control plane locations
+
+        direction : string (x,y,z)
+            primary direction of flow
+
+        record_paths : bool
+            If True, the edges taken by every particle are stored in the results (path_offsets and path_edges)
+
+        path_callback : function
+            If provided, the paths are handed to this function as particles leave the network instead of being stored in the results, see retire_paths
+
+        path_buffer_size : int
+            number of recorded steps of particles that left the network collected before they are handed to path_callback
+
+        seed : int
+            seed for the random number generator
+
+    Returns
+    -------
+        results : dict
+            Dictionary of numpy arrays with the travel time, length, beta, and control plane information of every particle
+
+    Notes
+    -----
+        Particles are retired once they reach a node with the outletflag or a node with no downstream neighbors, the same criteria used by the Particle class. Random samples are drawn from a single generator for the whole batch so individual trajectories differ from the Particle class, but the breakthrough statistics are the same.
+    """
+    rng = np.random.default_rng(seed)
+    nparticles = len(ip)
+    if tdrw_flag and fracture_spacing is not None and not "num_segments" in cg:
+        add_tdrw_edge_constants(cg, matrix_porosity, matrix_diffusivity,
+                                transfer_time)
+    num_cp = len(control_planes) if cp_flag else 0
+    results = initialize_particle_arrays(nparticles, num_cp)
+    cp_index = np.zeros(nparticles, dtype=int)
+
+    offsets = cg["offsets"]
+    has_children = offsets[1:] > offsets[:-1]
+    curr_node = np.asarray(ip, dtype=int).copy()
+    active = np.arange(nparticles)
+    record = record_paths or path_callback is not None
+    path_particles = []
+    path_edges = []
+    if path_callback is not None:
+        num_steps = np.zeros(nparticles, dtype=int)
+        exited = []
+        exited_steps = 0
+
+    tic = timeit.default_timer()
+    step = 0
+    while len(active) > 0:
+        curr = curr_node[active]
+        done = cg["outletflag"][curr] | ~has_children[curr]
+        if np.any(done):
+            results["exit_flag"][active[done]] = True
+            if path_callback is not None:
+                exited.append(active[done])
+                exited_steps += num_steps[active[done]].sum()
+            active = active[~done]
+            curr = curr[~done]
+            if len(active) == 0:
+                break
+
+        ## complete mixing to select outflowing edges
+        edges = select_next_edge(cg, curr, rng.random(len(active)))
+        nxt = cg["children"][edges]
+        delta_t = cg["time"][edges]
+        delta_l = cg["length"][edges]
+        delta_beta = 2.0 * delta_l / (cg["b"][edges] * cg["velocity"][edges])
+
+        if tdrw_flag:
+            if fracture_spacing is None:
+                delta_t_md = batch_unlimited_matrix_diffusion(
+                    cg, edges, delta_t, matrix_porosity, matrix_diffusivity,
+                    rng)
+            else:
+                delta_t_md = batch_limited_matrix_diffusion(
+                    cg, edges, trans_prob, rng)
+        else:
+            delta_t_md = np.zeros(len(active))
+
+        if cp_flag:
+            batch_cross_control_planes(cg, results, active, curr, nxt,
+                                       delta_t, delta_t_md, delta_l, cp_index,
+                                       control_planes, direction, tdrw_flag)
+
+        if record:
+            path_particles.append(active)
+            path_edges.append(edges)
+            if path_callback is not None:
+                num_steps[active] += 1
+                if exited_steps >= path_buffer_size:
+                    path_particles, path_edges = retire_paths(
+                        nparticles, path_particles, path_edges, exited,
+                        path_callback)
+                    exited = []
+                    exited_steps = 0
+
+        results["advect_time"][active] += delta_t
+        results["matrix_diffusion_time"][active] += delta_t_md
+        results["total_time"][active] += delta_t + delta_t_md
+        results["length"][active] += delta_l
+        results["beta"][active] += delta_beta
+        curr_node[active] = nxt
+
+        step += 1
+        if step % 100 == 0:
+            local_print_log(
+                f"--> Step {step}: {len(active)} out of {nparticles} particles still in the network"
+            )
+
+    elapsed = timeit.default_timer() - tic
+    local_print_log(
+        f"--> Batched tracking required {step} steps and {elapsed:0.2e} seconds"
+    )
+
+    if path_callback is not None:
+        if len(exited) > 0:
+            retire_paths(nparticles, path_particles, path_edges, exited,
+                         path_callback)
+    elif record_paths:
+        results["path_offsets"], results["path_edges"] = gather_paths(
+            nparticles, path_particles, path_edges)
+    return results
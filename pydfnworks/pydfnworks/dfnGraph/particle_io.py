@@ -36,7 +36,7 @@ def dump_trajectory(particle):
             h5dset = f5file.create_dataset(dataset_name, data=data)
 
             dataset_name = 'times'
-            data = np.asarray(particle.velocity)
+            data = np.asarray(particle.times)
             h5dset = f5file.create_dataset(dataset_name, data=data)
 
             dataset_name = 'length'
@@ -58,6 +58,219 @@ def dump_trajectory(particle):
         local_print_log(error, 'error')
 
 
+class TrajectoryWriter():
+    """ Streaming writer for particle trajectories. 
+
+    All trajectories are stored in a handful of chunked, compressed datasets in a single hdf5 file. Each field is concatenated over all particles and an offsets dataset indexes the start of every particle.
+
+    Layout:
+        * particle_number : particle number of each trajectory, in the order written
+        * offsets : steps of trajectory i are rows offsets[i] to offsets[i+1] - 1 of velocity, times, length, and coords
+        * velocity, times, length : per-step velocity [m/s], advective time [s], and length [m]
+        * coords : per-step coordinates of the upstream node, shape (steps, 3)
+        * fracture_offsets : fractures of trajectory i are fracture_offsets[i] to fracture_offsets[i+1] - 1 of fractures
+        * fractures : sequence of fractures visited
+    
+    Data is buffered in memory and flushed to file once buffer_size steps have been collected, so memory use does not depend on the number of particles.
+    """
+
+    step_fields = {
+        "velocity": ((0, ), "float64"),
+        "times": ((0, ), "float64"),
+        "length": ((0, ), "float64"),
+        "coords": ((0, 3), "float64")
+    }
+
+    def __init__(self,
+                 filename="trajectories.hdf5",
+                 buffer_size=100000,
+                 chunk_size=65536,
+                 compression="gzip"):
+        local_print_log(
+            f"--> Writting particle trajectories into file '{filename}'")
+        self.filename = filename
+        self.buffer_size = buffer_size
+        self.f5file = h5py.File(filename, "w")
+        self.f5file.attrs["format_version"] = 1
+        for name, (shape, dtype) in self.step_fields.items():
+            self.f5file.create_dataset(name,
+                                       shape=shape,
+                                       maxshape=(None, ) + shape[1:],
+                                       chunks=(chunk_size, ) + shape[1:],
+                                       dtype=dtype,
+                                       compression=compression)
+        for name in ["particle_number", "fractures"]:
+            self.f5file.create_dataset(name,
+                                       shape=(0, ),
+                                       maxshape=(None, ),
+                                       chunks=(chunk_size, ),
+                                       dtype="int64",
+                                       compression=compression)
+        for name in ["offsets", "fracture_offsets"]:
+            self.f5file.create_dataset(name,
+                                       data=np.zeros(1, dtype="int64"),
+                                       maxshape=(None, ),
+                                       chunks=(chunk_size, ),
+                                       compression=compression)
+        self.num_particles = 0
+        self.num_steps = 0
+        self.num_fractures = 0
+        self.clear_buffer()
+
+    def clear_buffer(self):
+        self.buffer = {
+            name: []
+            for name in list(self.step_fields.keys()) +
+            ["particle_number", "fractures", "offsets", "fracture_offsets"]
+        }
+        self.buffered_steps = 0
+
+    def append(self, particle_number, velocity, times, lengths, coords,
+               fractures):
+        """ Add one trajectory to the file 
+
+        Parameters
+        ---------------
+            particle_number : int
+                particle number
+
+            velocity, times, lengths : array-like
+                per-step velocity, advective time, and length
+
+            coords : array-like
+                per-step coordinates, shape (steps, 3)
+
+            fractures : array-like
+                sequence of fractures visited
+
+        Returns
+        ---------------
+            None
+        """
+        num_steps = len(velocity)
+        coords = np.asarray(coords, dtype=float).reshape(num_steps, 3)
+        self.append_block([particle_number], [0, num_steps], velocity, times,
+                          lengths, coords, [0, len(fractures)], fractures)
+
+    def append_particle(self, particle):
+        """ Add the trajectory of a particle object from graph_transport
+
+        Parameters
+        ---------------
+            particle : object
+                particle object from graph_transport
+
+        Returns
+        ---------------
+            None
+        """
+        self.append(particle.particle_number, particle.velocity,
+                    particle.times, particle.lengths, particle.coords,
+                    particle.frac_seq)
+
+    def append_block(self, particle_numbers, offsets, velocity, times, lengths,
+                     coords, frac_offsets, fractures):
+        """ Add a block of trajectories stored as ragged arrays 
+
+        Parameters
+        ---------------
+            particle_numbers : array-like
+                particle number of each trajectory in the block
+
+            offsets : array-like
+                steps of trajectory i are offsets[i] to offsets[i+1] - 1. Must start at 0
+
+            velocity, times, lengths : array-like
+                concatenated per-step velocity, advective time, and length
+
+            coords : array-like
+                concatenated per-step coordinates, shape (steps, 3)
+
+            frac_offsets : array-like
+                fractures of trajectory i are frac_offsets[i] to frac_offsets[i+1] - 1. Must start at 0
+
+            fractures : array-like
+                concatenated sequence of fractures visited
+
+        Returns
+        ---------------
+            None
+        """
+        offsets = np.asarray(offsets, dtype="int64")
+        frac_offsets = np.asarray(frac_offsets, dtype="int64")
+        self.buffer["particle_number"].append(
+            np.asarray(particle_numbers, dtype="int64"))
+        self.buffer["offsets"].append(offsets[1:] + self.num_steps)
+        self.buffer["fracture_offsets"].append(frac_offsets[1:] +
+                                               self.num_fractures)
+        self.buffer["velocity"].append(np.asarray(velocity, dtype=float))
+        self.buffer["times"].append(np.asarray(times, dtype=float))
+        self.buffer["length"].append(np.asarray(lengths, dtype=float))
+        self.buffer["coords"].append(np.asarray(coords, dtype=float))
+        self.buffer["fractures"].append(np.asarray(fractures, dtype="int64"))
+        self.num_particles += len(offsets) - 1
+        self.num_steps += offsets[-1]
+        self.num_fractures += frac_offsets[-1]
+        self.buffered_steps += offsets[-1]
+        if self.buffered_steps >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """ Write buffered trajectories to file """
+        for name, blocks in self.buffer.items():
+            if len(blocks) == 0:
+                continue
+            data = np.concatenate(blocks)
+            dset = self.f5file[name]
+            n = dset.shape[0]
+            dset.resize(n + len(data), axis=0)
+            dset[n:] = data
+        self.clear_buffer()
+
+    def close(self):
+        """ Flush remaining trajectories and close the file """
+        self.flush()
+        self.f5file.close()
+        local_print_log(
+            f"--> Wrote {self.num_particles} trajectories to '{self.filename}'")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_trajectory(filename, index):
+    """ Read one trajectory from a file written by TrajectoryWriter
+
+    Parameters
+    ---------------
+        filename : string
+            name of trajectory file
+
+        index : int
+            index of the trajectory in the file (order written, not particle number)
+
+    Returns
+    ---------------
+        trajectory : dict
+            particle_number, velocity, times, length, coords, and fractures of the trajectory
+    """
+    with h5py.File(filename, "r") as f5file:
+        start, end = f5file['offsets'][index:index + 2]
+        fstart, fend = f5file['fracture_offsets'][index:index + 2]
+        trajectory = {
+            "particle_number": f5file['particle_number'][index],
+            "velocity": f5file['velocity'][start:end],
+            "times": f5file['times'][start:end],
+            "length": f5file['length'][start:end],
+            "coords": f5file['coords'][start:end],
+            "fractures": f5file['fractures'][fstart:fend]
+        }
+    return trajectory
+
+
 def dump_trajectories(particles, num_cpu, single_file=True):
     """ Write particle trajectories to h5 files 
 
@@ -70,7 +283,7 @@ def dump_trajectories(particles, num_cpu, single_file=True):
             number of processors requested for io
         
         single_file : boolean
-            If true, all particles are written into a single h5 file. If false, each particle gets an individual file. 
+            If true, all particles are written into a single h5 file using TrajectoryWriter. If false, each particle gets an individual file. 
 
     Returns
     ---------------
@@ -81,43 +294,9 @@ def dump_trajectories(particles, num_cpu, single_file=True):
         None
     """
     if single_file:
-        local_print_log(
-            "--> Writting particle trajectories into file 'trajectories.hdf5'")
-        with h5py.File(f"trajectories.hdf5", "a") as f5file:
+        with TrajectoryWriter("trajectories.hdf5") as writer:
             for particle in particles:
-                traj_subgroup = f5file.create_group(
-                    f'particle_{particle.particle_number+1}')
-
-                dataset_name = 'velocity'
-                data = np.asarray(particle.velocity)
-                h5dset = traj_subgroup.create_dataset(dataset_name,
-                                                      data=data,
-                                                      dtype='float64')
-
-                dataset_name = 'times'
-                data = np.asarray(particle.velocity)
-                h5dset = traj_subgroup.create_dataset(dataset_name,
-                                                      data=data,
-                                                      dtype='float64')
-
-                dataset_name = 'length'
-                data = np.asarray(particle.lengths)
-                h5dset = traj_subgroup.create_dataset(dataset_name,
-                                                      data=data,
-                                                      dtype='float64')
-
-                dataset_name = 'fractures'
-                data = np.asarray(particle.frac_seq)
-                h5dset = traj_subgroup.create_dataset(dataset_name,
-                                                      data=data,
-                                                      dtype='float64')
-
-                dataset_name = 'coords'
-                data = np.asarray(particle.coords)
-                h5dset = traj_subgroup.create_dataset(dataset_name,
-                                                      data=data,
-                                                      dtype='float64')
-        f5file.close()
+                writer.append_particle(particle)
 
     else:
         local_print_log(
@@ -212,7 +391,47 @@ def dump_particle_info(particles, partime_file, frac_id_file, format):
     """
     adv_times, md_times, total_times, length, beta, stuck_cnt = gather_particle_info(
         particles)
+    particle_numbers = [particle.particle_number for particle in particles]
+    frac_seqs = [particle.frac_seq for particle in particles]
+    write_particle_info(particle_numbers, adv_times, md_times, total_times,
+                        length, beta, frac_seqs, partime_file, frac_id_file,
+                        format)
+    return stuck_cnt
+
 
+def write_particle_info(particle_numbers, adv_times, md_times, total_times,
+                        length, beta, frac_seqs, partime_file, frac_id_file,
+                        format):
+    """ Write particle travel times, lengths, and fractures visited to file
+        
+        Parameters
+        ----------
+            particle_numbers : array-like
+                particle number of each entry
+
+            adv_times, md_times, total_times : array of times
+            
+            length : array of lengths
+            
+            beta : array of beta particles
+
+            frac_seqs : list
+                sequence of fractures visited by each particle
+
+            partime_file : string
+                name of file to  which the total travel times and lengths will be written for each particle
+
+            frac_id_file : string
+                name of file to which detailed information of each particle's travel will be written
+            
+            format : string
+                file format for output. Options are hdf5 (default) and ascii. 
+
+        Returns
+        -------
+            None
+
+    """
     if format == 'ascii':
         filename = f"{partime_file}.dat"
         local_print_log(f"--> Writing Data to files: {filename}")
@@ -227,10 +446,10 @@ def dump_particle_info(particles, partime_file, frac_id_file, format):
             filename = f"{frac_id_file}.dat"
             local_print_log(f"--> Writing fractures visted to file: {filename}")
             with open(filename, "w") as fp_frac_id:
-                for particle in particles:
-                    for d in particle.frac_seq[:-1]:
+                for frac_seq in frac_seqs:
+                    for d in frac_seq[:-1]:
                         fp_frac_id.write(f"{d:d},")
-                    fp_frac_id.write(f"{particle.frac_seq[-1]:d}\n")
+                    fp_frac_id.write(f"{frac_seq[-1]:d}\n")
 
     elif format == 'hdf5':
         filename = f"{partime_file}.hdf5"
@@ -255,12 +474,13 @@ def dump_particle_info(particles, partime_file, frac_id_file, format):
             filename = f"{frac_id_file}.hdf5"
             local_print_log(f"--> Writing fractures visted to file: {filename}")
             with h5py.File(filename, "a") as f5file:
-                for particle in particles:
+                for particle_number, frac_seq in zip(particle_numbers,
+                                                     frac_seqs):
                     traj_subgroup = f5file.create_group(
-                        f'particle-{particle.particle_number+1}')
+                        f'particle-{particle_number+1}')
 
                     dataset_name = 'fractures'
-                    data = np.asarray(particle.frac_seq)
+                    data = np.asarray(frac_seq)
                     h5dset = traj_subgroup.create_dataset(dataset_name,
                                                           data=data,
                                                           dtype='float64')
@@ -290,7 +510,6 @@ def dump_particle_info(particles, partime_file, frac_id_file, format):
         df.to_pickle(filename)
 
     local_print_log("--> Writing Data Complete")
-    return stuck_cnt
 
 
 def dump_control_planes(particles, control_planes, filename, format):
@@ -335,6 +554,41 @@ def dump_control_planes(particles, control_planes, filename, format):
         # x1[:,i] = particle.cp_x1
         # x2[:,i] = particle.cp_x2
 
+    write_control_planes(adv_times, total_times, pathline_length,
+                         control_planes, filename, format)
+
+
+def write_control_planes(adv_times, total_times, pathline_length,
+                         control_planes, filename, format):
+    """ write control plane travel time information to files 
+
+        Parameters
+        ------------
+            adv_times, total_times : numpy array
+                travel times at each control plane. Shape is (number of control planes, number of particles)
+
+            pathline_length : numpy array
+                pathline lengths at each control plane. Shape is (number of control planes, number of particles)
+
+            control_planes : list
+                list of control plane values
+
+            filename : str
+                Base name for file.
+
+            format : str
+                File format. Options are hdf5 (Default) and ascii
+            
+        Returns
+        ------------
+            None
+
+        Notes
+        -------------
+            None
+            
+    """
+    num_cp = len(control_planes)
     if format == "ascii":
         local_print_log(
             f'--> Writting travel times at control planes to {filename}_adv.dat & {filename}_total.dat'
@@ -1,20 +1,99 @@
 import numpy as np
 import networkx as nx
+import scipy.sparse
+from scipy.sparse.csgraph import connected_components, maximum_flow
 
 from networkx.algorithms.flow.shortestaugmentingpath import *
 from networkx.algorithms.flow.edmondskarp import *
 from networkx.algorithms.flow.preflowpush import *
 
-from itertools import islice
-
 from pydfnworks.general.logging import local_print_log
+from pydfnworks.dfnGraph.shortest_paths import graph_to_csr, yen_k_shortest_paths
+from pydfnworks.dfnGraph.graph_flow import get_laplacian_sparse_mat, assemble_dirichlet_laplacian
+from pydfnworks.dfnGraph.graph_flow_solvers import solve_pressure
+
+def edge_current(G, source="s", target="t", weight=None, **solver_options):
+    """ Current on every edge for a unit current from source to target, from a single Laplacian solve
+
+    Parameters
+    ----------
+        G : NetworkX Graph
+            NetworkX Graph based on a DFN
+
+        source : node
+            Starting node
+
+        target : node
+            Ending node
+
+        weight : string
+            Edge conductance used in the Laplacian. If None, all conductances are one.
+
+        solver_options :
+            Linear solver options (solver, preconditioner, tol, maxiter), see graph_flow_solvers.solve_pressure
+
+    Returns
+    -------
+        nodes : list
+            node labels, in the order used by u and v
+
+        u, v : numpy array
+            node indices of each edge
+
+        current : numpy array
+            absolute current on each edge
+
+    Notes
+    -----
+        The potential is fixed to one at the source and zero at the target, and the edge currents are divided by the total current leaving the source. Edges that are not in the connected component of the source carry no current.
+    """
+    nodes = list(G.nodes())
+    index = dict(zip(nodes, range(len(nodes))))
+    _, A = get_laplacian_sparse_mat(G,
+                                    nodelist=nodes,
+                                    weight=weight,
+                                    format='csr')
+    # each undirected edge once
+    A = scipy.sparse.triu(A, k=1).tocoo()
+    u, v, w = A.row, A.col, A.data.astype(float)
+    num_nodes = len(nodes)
+    s, t = index[source], index[target]
+
+    # solve on the connected component of the source
+    _, labels = connected_components(scipy.sparse.coo_array(
+        (w, (u, v)), shape=(num_nodes, num_nodes)),
+                                     directed=False)
+    if labels[s] != labels[t]:
+        error = f"Error. No path between {source} and {target}.\nExiting"
+        local_print_log(error, 'error')
+    active = labels == labels[s]
+    boundary = np.zeros(num_nodes, dtype=bool)
+    boundary[[s, t]] = True
+    # nodes outside the component are fixed to zero potential
+    boundary |= ~active
+    L = assemble_dirichlet_laplacian(num_nodes, u, v, w, boundary)
+    rhs = np.zeros(num_nodes)
+    rhs[s] = 1.0
+    potential, _ = solve_pressure(L,
+                                  rhs,
+                                  boundary,
+                                  reuse=False,
+                                  **solver_options)
+
+    current = w * (potential[u] - potential[v])
+    current[~active[u]] = 0
+    total = current[u == s].sum() - current[v == s].sum()
+    return nodes, u, v, np.abs(current) / total
+
 
 def current_flow_threshold(self,
                            G,
                            source="s",
                            target="t",
                            weight=None,
-                           thrs=0.0):
+                           thrs=0.0,
+                           method="laplacian",
+                           **solver_options):
     """ Runs current flow (Potential drop between source and target) on the Graph G, and returns a subgraph such that the current on the edges is greater than the threshold value (thrs).
     
     Parameters
@@ -37,6 +116,12 @@ def current_flow_threshold(self,
         thrs: float
             Threshold value for pruning the graph
 
+        method : string
+            'laplacian' (default) solves for the potential once with a sparse Laplacian. 'networkx' uses nx.edge_current_flow_betweenness_centrality_subset.
+
+        solver_options :
+            Linear solver options for method 'laplacian', see graph_flow_solvers.solve_pressure. The default sparse LU is the robust choice when conductances span many orders of magnitude.
+
     Returns 
     -------
         H : NetworkX graph
@@ -44,21 +129,30 @@ def current_flow_threshold(self,
 
     Notes
     -----
-        Graph attributes (node and edge) are not retained on the subgraph H. 
+        Node, edge, and graph attributes of G are kept on the subgraph H.
+
+        Both methods threshold the same quantity, the normalized current flow betweenness of networkx, 0.5 |I_e| / ((N-1)(N-2)) where I_e is the current on edge e for a unit current from source to target and N is the number of nodes.
     """
 
     self.print_log(
         f'--> Running Current Flow with weight : {weight} and threshold {thrs}'
     )
-    cf = nx.edge_current_flow_betweenness_centrality_subset(G,
-                                                            sources=[source],
-                                                            targets=[target],
-                                                            weight=weight)
+    if method == "laplacian":
+        nodes, u, v, current = edge_current(G, source, target, weight,
+                                            **solver_options)
+        num_nodes = len(nodes)
+        betweenness = 0.5 * current / ((num_nodes - 1.0) * (num_nodes - 2.0))
+        keep = np.nonzero(betweenness > thrs)[0]
+        currentflow_edges = [(nodes[u[i]], nodes[v[i]]) for i in keep]
+    elif method == "networkx":
+        cf = nx.edge_current_flow_betweenness_centrality_subset(
+            G, sources=[source], targets=[target], weight=weight)
+        currentflow_edges = [(u, v) for (u, v), d in cf.items() if d > thrs]
+    else:
+        error = f"Error. Unknown current flow method {method}. Options are 'laplacian' and 'networkx'.\nExiting"
+        self.print_log(error, 'error')
     self.print_log("Current Flow Complete")
-    currentflow_edges = [(u, v) for (u, v), d in cf.items() if d > thrs]
-    H = G.edge_subgraph(currentflow_edges).copy()   
-    H.graph["representation"] = G.graph["representation"]
-    # H = nx.Graph(currentflow_edges, representation=G.graph["representation"])
+    H = G.edge_subgraph(currentflow_edges).copy()
     self.print_log(
         f"--> Of the {G.number_of_nodes()} in the original graph,  {H.number_of_nodes()} are in the thresholded network"
     )
@@ -66,7 +160,7 @@ def current_flow_threshold(self,
     return H
 
 
-def k_shortest_paths(G, k, source, target, weight):
+def k_shortest_paths(G, k, source, target, weight, ncpu=1, max_stall=None):
     """Returns the k shortest paths in a graph 
     
     Parameters
@@ -86,6 +180,12 @@ def k_shortest_paths(G, k, source, target, weight):
         weight : string
             Edge weight used for finding the shortest path
 
+        ncpu : int
+            Number of processes used to compute the paths
+
+        max_stall : int
+            If provided, stop once this many consecutive paths add no new edge to the paths found so far
+
     Returns 
     -------
         paths : sets of nodes
@@ -93,13 +193,25 @@ def k_shortest_paths(G, k, source, target, weight):
 
     Notes
     -----
-    Edge weights must be numerical and non-negative
+    Edge weights must be numerical and non-negative. See shortest_paths.yen_k_shortest_paths
 """
-    return list(
-        islice(nx.shortest_simple_paths(G, source, target, weight=weight), k))
+    return yen_k_shortest_paths(G,
+                                k,
+                                source,
+                                target,
+                                weight=weight,
+                                ncpu=ncpu,
+                                max_stall=max_stall)
 
 
-def k_shortest_paths_backbone(self, G, k, source='s', target='t', weight=None):
+def k_shortest_paths_backbone(self,
+                              G,
+                              k,
+                              source='s',
+                              target='t',
+                              weight=None,
+                              ncpu=None,
+                              max_stall=None):
     """Returns the subgraph made up of the k shortest paths in a graph 
    
     Parameters
@@ -122,6 +234,12 @@ def k_shortest_paths_backbone(self, G, k, source='s', target='t', weight=None):
         weight : string
             Edge weight used for finding the shortest path
 
+        ncpu : int
+            Number of processes used to compute the paths. Default is self.ncpu
+
+        max_stall : int
+            If provided, stop before k paths once this many consecutive paths add no new edge to the backbone
+
     Returns 
     -------
         H : NetworkX Graph
@@ -133,26 +251,73 @@ def k_shortest_paths_backbone(self, G, k, source='s', target='t', weight=None):
 """
 
     self.print_log(f"--> Determining {k} shortest paths in the network")
-    H = G.copy()
-    k_shortest = set([])
-    for path in k_shortest_paths(G, k, source, target, weight):
-        k_shortest |= set(path)
-    k_shortest.remove('s')
-    k_shortest.remove('t')
-    path_nodes = sorted(list(k_shortest))
-    path_nodes.append('s')
-    path_nodes.append('t')
-    nodes = list(G.nodes())
-    secondary = list(set(nodes) - set(path_nodes))
-    for n in secondary:
-        H.remove_node(n)
+    if ncpu is None:
+        ncpu = self.ncpu
+    path_nodes = set([source, target])
+    paths = k_shortest_paths(G, k, source, target, weight, ncpu, max_stall)
+    for path in paths:
+        path_nodes |= set(path)
+    H = G.subgraph(path_nodes).copy()
+    self.print_log(
+        f"--> Backbone of {len(paths)} paths has {H.number_of_nodes()} of the {G.number_of_nodes()} nodes"
+    )
     self.print_log("--> Complete")
     return H
 
 
-def greedy_edge_disjoint(self, G, source='s', target='t', weight='None', k=''):
+def flow_paths(flow, source, target):
+    """ Decompose a unit capacity flow into source to target paths
+
+    Parameters
+    ----------
+        flow : scipy sparse csr matrix
+            net flow on each arc, from scipy.sparse.csgraph.maximum_flow
+
+        source : int
+            index of the source node
+
+        target : int
+            index of the target node
+
+    Returns
+    -------
+        paths : list
+            lists of node indices, one per unit of flow. The paths share no edge.
+
+    Notes
+    -----
+        Each arc with positive flow is used once. Cycles met while walking the flow are cut out of the path.
+    """
+    flow = flow.tocoo()
+    # net flow is antisymmetric, keep the arcs in the direction of flow
+    positive = flow.data > 0
+    u, v = flow.row[positive], flow.col[positive]
+    # unused outgoing arcs of each node
+    out_arcs = {}
+    for a, b in zip(u.tolist(), v.tolist()):
+        out_arcs.setdefault(a, []).append(b)
+
+    paths = []
+    while out_arcs.get(source):
+        path = [source]
+        position = {source: 0}
+        while path[-1] != target:
+            nxt = out_arcs[path[-1]].pop()
+            if nxt in position:
+                # drop the cycle
+                for node in path[position[nxt] + 1:]:
+                    del position[node]
+                del path[position[nxt] + 1:]
+            else:
+                position[nxt] = len(path)
+                path.append(nxt)
+        paths.append(path)
+    return paths
+
+
+def greedy_edge_disjoint(self, G, source='s', target='t', weight=None, k=''):
     """
-    Greedy Algorithm to find edge disjoint subgraph from s to t. 
+    Find edge disjoint paths from s to t. 
     See Hyman et al. 2018 SIAM MMS
 
     Parameters
@@ -161,7 +326,7 @@ def greedy_edge_disjoint(self, G, source='s', target='t', weight='None', k=''):
             DFN Class Object
         
         G : NetworkX graph
-            NetworkX Graph based on the DFN
+            NetworkX Graph based on the DFN 
         
         source : node 
             Starting node
@@ -170,7 +335,7 @@ def greedy_edge_disjoint(self, G, source='s', target='t', weight='None', k=''):
             Ending node
         
         weight : string
-            Edge weight used for finding the shortest path
+            Edge weight used to rank the paths by length
         
         k : int
             Number of edge disjoint paths requested
@@ -184,6 +349,7 @@ def greedy_edge_disjoint(self, G, source='s', target='t', weight='None', k=''):
     -----
         1. Edge weights must be numerical and non-negative.
         2. See Hyman et al. 2018 "Identifying Backbones in Three-Dimensional Discrete Fracture Networks: A Bipartite Graph-Based Approach" SIAM Multiscale Modeling and Simulation for more details 
+        3. A single maximum flow with unit edge capacities (scipy.sparse.csgraph.maximum_flow, Dinic's algorithm) gives a largest set of edge disjoint paths, whose number is the minimum edge cut between source and target. The flow is decomposed into paths and the k shortest are kept. If k is not provided, all paths are kept.
 
     """
     self.print_log("--> Identifying edge disjoint paths")
@@ -192,24 +358,38 @@ def greedy_edge_disjoint(self, G, source='s', target='t', weight='None', k=''):
             "Warning/ Wrong type of DFN graph representation\nRepresentation must be intersection\nReturning Empty Graph\n"
             "warning", 'warning')
         return nx.Graph()
-    Gprime = G.copy()
-    Hprime = nx.Graph()
-    Hprime.graph['representation'] = G.graph['representation']
-    cnt = 0
+    if weight == 'None':
+        weight = None
+
+    csr = graph_to_csr(G, weight)
+    index, nodes = csr["index"], csr["nodes"]
+    capacity = scipy.sparse.csr_matrix(
+        (np.ones(len(csr["indices"]), dtype=np.int32), csr["indices"],
+         csr["indptr"]),
+        shape=(len(nodes), len(nodes)))
+    result = maximum_flow(capacity,
+                          index[source],
+                          index[target],
+                          method='dinic')
+    min_cut = result.flow_value
+    self.print_log(f"--> Minimum edge cut between {source} and {target}: {min_cut}")
 
     # if a number of paths in not provided k will equal the min cut between s and t
-    min_cut = len(nx.minimum_edge_cut(G, 's', 't'))
     if k == '' or k > min_cut:
         k = min_cut
 
-    while nx.has_path(Gprime, source, target):
-        path = nx.shortest_path(Gprime, source, target, weight=weight)
-        H = Gprime.subgraph(path)
-        Hprime.add_edges_from(H.edges(data=True))
-        Gprime.remove_edges_from(list(H.edges()))
+    paths = [[nodes[n] for n in path]
+             for path in flow_paths(result.flow, index[source], index[target])]
+    lengths = [nx.path_weight(G, path, weight) if weight else len(path) - 1
+               for path in paths]
+    order = np.argsort(lengths, kind='stable')[:k]
 
-        cnt += 1
-        if cnt > k:
-            break
+    Hprime = nx.Graph()
+    Hprime.graph['representation'] = G.graph['representation']
+    for i in order:
+        path = paths[i]
+        Hprime.add_edges_from(
+            (a, b, G.edges[a, b]) for a, b in zip(path[:-1], path[1:]))
+    self.print_log(f"--> Kept {len(order)} of {len(paths)} edge disjoint paths")
     self.print_log("--> Complete")
     return Hprime
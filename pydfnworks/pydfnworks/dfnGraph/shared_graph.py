@@ -0,0 +1,246 @@
+"""
+.. module:: shared_graph.py
+   :synopsis: Share a compiled graph between worker processes for batched particle tracking
+.. moduleauthor:: Jeffrey Hyman <jhyman@lanl.gov>
+
+"""
+
+import timeit
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+from pydfnworks.dfnGraph.particle_engine import track_particles_vectorized
+from pydfnworks.general.logging import local_print_log
+
+# compiled graph attached in each worker by init_worker
+_worker_graph = None
+_worker_blocks = None
+_worker_params = None
+
+# upper bound on the default number of particles in a chunk, so the paths of a chunk stay small
+max_chunk_size = 100000
+
+
+def share_compiled_graph(cg):
+    """ Copy the arrays of a compiled graph into shared memory blocks
+
+    Parameters
+    ----------
+        cg : dict
+            compiled graph from compile_flow_graph
+
+    Returns
+    -------
+        blocks : list
+            SharedMemory objects. The caller is responsible for closing and unlinking them.
+
+        spec : dict
+            Picklable description of the shared arrays, used by attach_compiled_graph. Scalar entries are stored directly.
+
+    Notes
+    -----
+        node_ids are not shared, workers only use node indices.
+    """
+    blocks = []
+    spec = {}
+    for key, val in cg.items():
+        if key == "node_ids":
+            continue
+        if not isinstance(val, np.ndarray):
+            spec[key] = val
+            continue
+        shm = shared_memory.SharedMemory(create=True, size=max(val.nbytes, 1))
+        shared = np.ndarray(val.shape, dtype=val.dtype, buffer=shm.buf)
+        shared[...] = val
+        blocks.append(shm)
+        spec[key] = (shm.name, val.shape, val.dtype.str)
+    return blocks, spec
+
+
+def attach_compiled_graph(spec):
+    """ Attach to a compiled graph placed in shared memory by share_compiled_graph
+
+    Parameters
+    ----------
+        spec : dict
+            description of the shared arrays from share_compiled_graph
+
+    Returns
+    -------
+        cg : dict
+            compiled graph whose arrays are views into shared memory
+
+        blocks : list
+            SharedMemory objects that must stay open while cg is in use
+    """
+    cg = {}
+    blocks = []
+    for key, val in spec.items():
+        if isinstance(val, tuple):
+            name, shape, dtype = val
+            shm = shared_memory.SharedMemory(name=name)
+            cg[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+            blocks.append(shm)
+        else:
+            cg[key] = val
+    return cg, blocks
+
+
+def init_worker(spec, params):
+    """ Pool initializer. Attaches the shared graph and stores the tracking parameters once per worker
+
+    Parameters
+    ----------
+        spec : dict
+            description of the shared arrays from share_compiled_graph
+
+        params : dict
+            keyword arguments for track_particles_vectorized
+
+    Returns
+    -------
+        None
+    """
+    global _worker_graph, _worker_blocks, _worker_params
+    _worker_graph, _worker_blocks = attach_compiled_graph(spec)
+    _worker_params = params
+
+
+def track_chunk(args):
+    """ Track one contiguous chunk of particles in a worker process
+
+    Parameters
+    ----------
+        args : tuple
+            (start, initial node indices of the chunk, seed sequence for the chunk)
+
+    Returns
+    -------
+        start : int
+            index of the first particle in the chunk
+
+        results : dict
+            numpy arrays from track_particles_vectorized
+    """
+    start, ip, seed = args
+    results = track_particles_vectorized(_worker_graph,
+                                         ip,
+                                         seed=seed,
+                                         **_worker_params)
+    return start, results
+
+
+def merge_results(blocks, nparticles):
+    """ Combine the per-chunk results into a single set of particle arrays
+
+    Parameters
+    ----------
+        blocks : list
+            list of (start, results) tuples ordered by start
+
+        nparticles : int
+            total number of particles
+
+    Returns
+    -------
+        results : dict
+            numpy arrays for all particles
+    """
+    results = {}
+    for key in blocks[0][1].keys():
+        if key in ["particle_number", "path_offsets", "path_edges"]:
+            continue
+        results[key] = np.concatenate([r[key] for _, r in blocks], axis=-1)
+    results["particle_number"] = np.arange(nparticles)
+
+    if "path_offsets" in blocks[0][1]:
+        counts = np.concatenate([np.diff(r["path_offsets"]) for _, r in blocks])
+        results["path_offsets"] = np.zeros(nparticles + 1, dtype=int)
+        results["path_offsets"][1:] = np.cumsum(counts)
+        results["path_edges"] = np.concatenate(
+            [r["path_edges"] for _, r in blocks])
+    return results
+
+
+def track_particles_shared(cg,
+                           ip,
+                           ncpu,
+                           chunk_size=None,
+                           seed=None,
+                           path_callback=None,
+                           **kwargs):
+    """ Batched particle tracking across a process pool with the compiled graph in shared memory
+
+    Parameters
+    ----------
+        cg : dict
+            compiled graph from compile_flow_graph
+
+        ip : numpy array
+            initial node index (in the compiled graph) of every particle
+
+        ncpu : int
+            number of worker processes
+
+        chunk_size : int
+            number of particles handed to a worker at a time. Default splits the particles into four chunks per worker, with at most max_chunk_size particles each.
+
+        seed : int
+            seed for the random number generator. Each chunk gets an independent stream spawned from this seed.
+
+        path_callback : function
+            If provided, the paths of each chunk are handed to this function as the chunk arrives, with the arguments of retire_paths, and are not kept in the results
+
+        kwargs : dict
+            keyword arguments passed to track_particles_vectorized
+
+    Returns
+    -------
+        results : dict
+            numpy arrays for all particles, see track_particles_vectorized
+
+    Notes
+    -----
+        Workers receive only an index range and the initial positions for that range, and return numpy arrays. The graph is attached once per worker by name, so the pool works with both the fork and spawn start methods.
+    """
+    nparticles = len(ip)
+    if chunk_size is None:
+        chunk_size = min(int(np.ceil(nparticles / (4 * ncpu))),
+                         max_chunk_size)
+    chunk_size = max(chunk_size, 1)
+    starts = list(range(0, nparticles, chunk_size))
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+    chunks = [(start, ip[start:start + chunk_size], seeds[i])
+              for i, start in enumerate(starts)]
+    local_print_log(
+        f"--> Tracking {nparticles} particles in {len(chunks)} chunks on {ncpu} processors"
+    )
+
+    if path_callback is not None:
+        kwargs["record_paths"] = True
+
+    tic = timeit.default_timer()
+    blocks, spec = share_compiled_graph(cg)
+    output = []
+    try:
+        with mp.Pool(min(ncpu, len(chunks)),
+                     initializer=init_worker,
+                     initargs=(spec, kwargs)) as pool:
+            for start, results in pool.imap(track_chunk, chunks):
+                if path_callback is not None:
+                    # write the paths of the chunk and drop them
+                    offsets = results.pop("path_offsets")
+                    edges = results.pop("path_edges")
+                    path_callback(start + np.arange(len(offsets) - 1),
+                                  offsets, edges)
+                output.append((start, results))
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+    elapsed = timeit.default_timer() - tic
+    local_print_log(
+        f"--> Shared memory tracking complete. Time Required {elapsed:0.2e} seconds"
+    )
+    return merge_results(output, nparticles)
@@ -0,0 +1,293 @@
+"""
+.. module:: shortest_paths.py
+   :synopsis: Yen's k shortest loopless paths on an array (CSR) copy of a graph, with spur paths computed in parallel
+.. moduleauthor:: Jeffrey Hyman <jhyman@lanl.gov>
+
+"""
+
+import heapq
+import multiprocessing as mp
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import dijkstra
+
+from pydfnworks.general.logging import local_print_log
+
+# graph arrays shared by the spur path workers, set by _init_worker
+_csr = {}
+
+
+def graph_to_csr(G, weight=None):
+    """ Compressed sparse row (CSR) arrays of a NetworkX graph
+
+    Parameters
+    ----------
+        G : NetworkX Graph or DiGraph
+            graph, undirected edges are stored in both directions
+
+        weight : string
+            edge attribute used as the length of the edge. If None, every edge has length 1.
+
+    Returns
+    -------
+        csr : dict
+            nodes : list of node labels, node i is nodes[i]
+            index : dictionary from node label to index
+            indptr, indices, data : CSR arrays of the (directed) adjacency matrix with edge lengths as entries
+
+    Notes
+    -----
+        Edge lengths must be non-negative. Zero length edges are kept as explicit entries.
+    """
+    nodes = list(G.nodes())
+    index = dict(zip(nodes, range(len(nodes))))
+    # rows of the adjacency dictionary are already grouped by node, undirected edges appear in both rows
+    adj = G.succ if G.is_directed() else G.adj
+    degree = np.fromiter((len(nbrs) for nbrs in adj.values()), int,
+                         len(nodes))
+    nnz = degree.sum()
+    u = np.repeat(np.arange(len(nodes)), degree)
+    v = np.fromiter((index[n] for nbrs in adj.values() for n in nbrs), int,
+                    nnz)
+    if weight is None:
+        w = np.ones(nnz)
+    else:
+        w = np.fromiter(
+            (d[weight] for nbrs in adj.values() for d in nbrs.values()),
+            float, nnz)
+    if np.any(w < 0):
+        error = "Error. Edge weights must be non-negative.\nExiting"
+        local_print_log(error, 'error')
+    # sorted column indices in each row
+    order = np.lexsort((v, u))
+    v, w = v[order], w[order]
+    indptr = np.zeros(len(nodes) + 1, dtype=int)
+    indptr[1:] = np.cumsum(degree)
+    # scipy.sparse.csgraph works with 32 bit indices
+    return {
+        "nodes": nodes,
+        "index": index,
+        "indptr": indptr.astype(np.int32),
+        "indices": v.astype(np.int32),
+        "data": w
+    }
+
+
+def _matrix(data, indices, indptr):
+    n = len(indptr) - 1
+    return sp.csr_matrix((data, indices, indptr), shape=(n, n), copy=False)
+
+
+def _edge_position(indices, indptr, u, v):
+    """ Position of the entry (u, v) in the CSR arrays """
+    start, end = indptr[u], indptr[u + 1]
+    return start + np.searchsorted(indices[start:end], v)
+
+
+def _init_worker(indptr, indices, data, target):
+    _csr["indptr"] = indptr
+    _csr["indices"] = indices
+    _csr["data"] = data
+    _csr["target"] = target
+
+
+def _spur_path(task):
+    """ Shortest path from the spur node to the target avoiding the root path and the banned edges.
+
+    Parameters
+    ----------
+        task : tuple
+            (spur, banned nodes, banned neighbors of spur, maximum length)
+
+    Returns
+    -------
+        path : list or None
+            node indices from spur to target, None if the target cannot be reached within the maximum length
+
+        length : float
+            length of the path
+    """
+    spur, banned_nodes, banned_next, limit = task
+    indptr, indices = _csr["indptr"], _csr["indices"]
+    data = _csr["data"].copy()
+    # a path can enter but never leave a banned node
+    for u in banned_nodes:
+        data[indptr[u]:indptr[u + 1]] = np.inf
+    for v in banned_next:
+        data[_edge_position(indices, indptr, spur, v)] = np.inf
+    dist, pred = dijkstra(_matrix(data, indices, indptr),
+                          directed=True,
+                          indices=spur,
+                          return_predecessors=True,
+                          limit=limit)
+    target = _csr["target"]
+    if not np.isfinite(dist[target]):
+        return None, np.inf
+    path = [target]
+    while path[-1] != spur:
+        path.append(pred[path[-1]])
+    return path[::-1], dist[target]
+
+
+def _path_length(csr, path):
+    indptr, indices, data = csr["indptr"], csr["indices"], csr["data"]
+    return sum(data[_edge_position(indices, indptr, u, v)]
+               for u, v in zip(path[:-1], path[1:]))
+
+
+def yen_k_shortest_paths(G,
+                         k,
+                         source,
+                         target,
+                         weight=None,
+                         ncpu=1,
+                         max_stall=None):
+    """ The k shortest loopless paths from source to target using Yen's algorithm
+
+    Parameters
+    ----------
+        G : NetworkX Graph or DiGraph
+            NetworkX Graph based on a DFN
+
+        k : int
+            Number of requested paths
+
+        source : node
+            Starting node
+
+        target : node
+            Ending node
+
+        weight : string
+            Edge weight used for finding the shortest path. If None, every edge has weight 1.
+
+        ncpu : int
+            Number of processes used to compute spur paths
+
+        max_stall : int
+            If provided, stop once this many consecutive paths add no new edge to the union of the paths found so far
+
+    Returns
+    -------
+        paths : list
+            list of lists of nodes in the shortest paths, in order of length
+
+    Notes
+    -----
+        Edge weights must be numerical and non-negative.
+
+        Distances to the target in the full graph are computed once. They give a lower bound for each spur path, which is used to skip spur nodes that cannot produce one of the k paths. When the shortest path of the full graph from a spur node avoids the banned nodes and edges, it is used directly. Otherwise a Dijkstra search is run, and these searches are spread over ncpu processes.
+
+        Paths of equal length may be returned in a different order than networkx.shortest_simple_paths.
+    """
+    csr = graph_to_csr(G, weight)
+    index = csr["index"]
+    if source not in index or target not in index:
+        error = f"Error. Source {source} or target {target} is not in the graph.\nExiting"
+        local_print_log(error, 'error')
+    s, t = index[source], index[target]
+    indptr, indices, data = csr["indptr"], csr["indices"], csr["data"]
+
+    # distance to the target and next node towards it, from a search on the reversed graph
+    reverse = _matrix(data, indices, indptr).T.tocsr()
+    dist_t, next_hop = dijkstra(reverse,
+                                directed=True,
+                                indices=t,
+                                return_predecessors=True)
+    if not np.isfinite(dist_t[s]):
+        local_print_log(f"--> No path between {source} and {target}",
+                        'warning')
+        return []
+
+    def tree_path(u):
+        path = [u]
+        while path[-1] != t:
+            path.append(next_hop[path[-1]])
+        return path
+
+    pool = None
+    if ncpu > 1:
+        pool = mp.Pool(ncpu,
+                       initializer=_init_worker,
+                       initargs=(indptr, indices, data, t))
+    else:
+        _init_worker(indptr, indices, data, t)
+
+    try:
+        paths = [tree_path(s)]
+        candidates = []
+        seen = {tuple(paths[0])}
+        if G.is_directed():
+            path_edges = lambda p: set(zip(p[:-1], p[1:]))
+        else:
+            path_edges = lambda p: {(min(e), max(e)) for e in zip(p[:-1], p[1:])}
+        backbone = path_edges(paths[0])
+        stall = 0
+        while len(paths) < k:
+            prev = paths[-1]
+            # only the best (k - len(paths)) candidates can still be used
+            needed = k - len(paths)
+            if len(candidates) >= needed:
+                bound = heapq.nsmallest(needed, candidates)[-1][0]
+            else:
+                bound = np.inf
+            root_cost = 0.0
+            tasks, roots = [], []
+            for i in range(len(prev) - 1):
+                spur = prev[i]
+                root = prev[:i + 1]
+                if i > 0:
+                    root_cost += _path_length(csr, prev[i - 1:i + 1])
+                if root_cost + dist_t[spur] > bound:
+                    continue
+                banned_nodes = set(root[:-1])
+                banned_next = {
+                    p[i + 1]
+                    for p in paths if len(p) > i + 1 and p[:i + 1] == root
+                }
+                path = tree_path(spur)
+                if path[1] not in banned_next and banned_nodes.isdisjoint(
+                        path):
+                    candidate = root[:-1] + path
+                    if tuple(candidate) not in seen:
+                        seen.add(tuple(candidate))
+                        heapq.heappush(candidates,
+                                       (root_cost + dist_t[spur], candidate))
+                    continue
+                tasks.append((spur, list(banned_nodes), list(banned_next),
+                              bound - root_cost))
+                roots.append((root, root_cost))
+
+            if pool is None:
+                results = map(_spur_path, tasks)
+            else:
+                results = pool.map(_spur_path, tasks,
+                                   max(1, len(tasks) // (4 * ncpu)))
+            for (root, root_cost), (path, length) in zip(roots, results):
+                if path is None:
+                    continue
+                candidate = root[:-1] + path
+                if tuple(candidate) not in seen:
+                    seen.add(tuple(candidate))
+                    heapq.heappush(candidates, (root_cost + length, candidate))
+
+            if not candidates:
+                break
+            _, path = heapq.heappop(candidates)
+            paths.append(path)
+
+            new_edges = path_edges(path) - backbone
+            backbone |= new_edges
+            stall = 0 if new_edges else stall + 1
+            if max_stall is not None and stall >= max_stall:
+                local_print_log(
+                    f"--> Backbone unchanged by the last {stall} paths, stopping after {len(paths)} paths"
+                )
+                break
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    nodes = csr["nodes"]
+    return [[nodes[u] for u in path] for path in paths]
@@ -0,0 +1,317 @@
+"""
+.. module:: dfngen_output_cache.py
+   :synopsis: Binary cache of the text files written by dfnGen. Each file is parsed once and stored as typed arrays in an HDF5 file next to it
+.. moduleauthor:: Jeffrey Hyman <jhyman@lanl.gov>
+
+"""
+
+import os
+import hashlib
+import numpy as np
+import h5py
+
+from pydfnworks.general.logging import local_print_log
+
+DFNGEN_CACHE_VERSION = 2
+dfngen_cache_name = "dfnGen_output_cache.h5"
+# set DFNWORKS_OUTPUT_CACHE=0 to always parse the text files
+output_cache_enabled = os.environ.get("DFNWORKS_OUTPUT_CACHE", "1") != "0"
+
+
+def _read_table(filename, skip_header=0, ndmin=2):
+    """ Numeric table. np.loadtxt is much faster than np.genfromtxt, which is kept for irregular files """
+    try:
+        return np.loadtxt(filename, skiprows=skip_header, ndmin=ndmin)
+    except ValueError:
+        return np.genfromtxt(filename, skip_header=skip_header, ndmin=ndmin)
+
+
+def parse_translations(filename):
+    """ Fracture centers from translations.dat. Lines of rejected fractures contain R and are skipped """
+    centers = []
+    with open(filename, "r") as fp:
+        fp.readline()  # header
+        for line in fp.readlines():
+            if "R" not in line:
+                line = line.split()
+                centers.append([float(line[0]), float(line[1]), float(line[2])])
+    return np.array(centers, dtype=float).reshape(-1, 3)
+
+
+def parse_boundary(filename):
+    """ List of fractures on a domain boundary (left.dat, right.dat, ...). Returns an empty array for an empty file """
+    if os.path.isfile(filename) and os.path.getsize(filename) > 0:
+        return np.atleast_1d(np.genfromtxt(filename))
+    return np.array([])
+
+
+# characters of polygons.dat that are not numbers
+_polygon_delete = str.maketrans("{},", "   ")
+
+
+def _split_polygons(values):
+    """ Split the numbers of consecutive polygon lines, n x1 y1 z1 ... xn yn zn, into vertex counts and coordinates """
+    counts = []
+    pos = 0
+    while pos < len(values):
+        n = int(values[pos])
+        counts.append(n)
+        pos += 1 + 3 * n
+    if pos != len(values):
+        error = "Error. polygons.dat is not in the format n {x, y, z} ...\nExiting\n"
+        local_print_log(error, 'error')
+    counts = np.array(counts, dtype=int)
+    # drop the vertex count at the start of each polygon
+    keep = np.ones(len(values), dtype=bool)
+    keep[np.cumsum(1 + 3 * counts) - 1 - 3 * counts] = False
+    return counts, values[keep].reshape(-1, 3)
+
+
+def parse_polygons(filename, chunk_size=1 << 24):
+    """ Polygon vertices from polygons.dat
+
+    Parameters
+    ----------
+        filename : string
+            name of the polygon file
+
+        chunk_size : int
+            approximate number of characters parsed at once
+
+    Returns
+    -------
+        polygons : dict
+            num_vertices : number of vertices of each polygon
+            offsets : vertices of polygon i are rows offsets[i] to offsets[i+1] - 1 of vertices
+            vertices : (total number of vertices, 3) array, polygons stored one after the other
+
+    Notes
+    -----
+        The file is read in blocks of whole lines, so memory use is bounded by chunk_size plus the output arrays.
+    """
+    num_vertices = []
+    vertices = []
+    with open(filename, "r") as fp:
+        fp.readline()  # header
+        while True:
+            lines = fp.readlines(chunk_size)
+            if not lines:
+                break
+            text = "".join(lines).translate(_polygon_delete)
+            values = np.array(text.split(), dtype=float)
+            counts, coords = _split_polygons(values)
+            num_vertices.append(counts)
+            vertices.append(coords)
+    if num_vertices:
+        num_vertices = np.concatenate(num_vertices)
+        vertices = np.concatenate(vertices)
+    else:
+        num_vertices = np.zeros(0, dtype=int)
+        vertices = np.zeros((0, 3))
+    offsets = np.zeros(len(num_vertices) + 1, dtype=int)
+    offsets[1:] = np.cumsum(num_vertices)
+    return {
+        "num_vertices": num_vertices,
+        "offsets": offsets,
+        "vertices": vertices
+    }
+
+
+# parser of each kind of dfnGen output file
+dfngen_parsers = {
+    "radii": lambda f: _read_table(f, skip_header=2),
+    "surface_area": lambda f: _read_table(f, skip_header=1, ndmin=1),
+    "normal_vectors": lambda f: _read_table(f),
+    "translations": parse_translations,
+    "poly_info": lambda f: _read_table(f),
+    "fracture_info": lambda f: _read_table(f, skip_header=1),
+    "intersection_list": lambda f: _read_table(f, skip_header=1),
+    "polygons": parse_polygons,
+    "boundary": parse_boundary
+}
+
+# kind of the files written by dfnGen, keyed by file name
+dfngen_files = {
+    "radii_Final.dat": "radii",
+    "surface_area_Final.dat": "surface_area",
+    "normal_vectors.dat": "normal_vectors",
+    "translations.dat": "translations",
+    "poly_info.dat": "poly_info",
+    "fracture_info.dat": "fracture_info",
+    "intersection_list.dat": "intersection_list",
+    "polygons.dat": "polygons"
+}
+for _face in ["left", "right", "front", "back", "top", "bottom"]:
+    dfngen_files[f"{_face}.dat"] = "boundary"
+
+
+def file_sha1(filename):
+    """ sha1 hex digest of a file """
+    h = hashlib.sha1()
+    with open(filename, "rb") as fp:
+        for block in iter(lambda: fp.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _stamp(filename):
+    st = os.stat(filename)
+    return st.st_mtime_ns, st.st_size
+
+
+def _read_dataset(dset, filename, mmap):
+    """ Read a dataset, or map it into memory if it is stored contiguously """
+    if mmap and dset.size > 0:
+        offset = dset.id.get_offset()
+        if offset is not None:
+            return np.memmap(filename,
+                             dtype=dset.dtype,
+                             mode='r',
+                             offset=offset,
+                             shape=dset.shape)
+    return dset[()]
+
+
+def _read_entry(group, cache_file, mmap):
+    if "data" in group:
+        return _read_dataset(group["data"], cache_file, mmap)
+    return {key: _read_dataset(group[key], cache_file, mmap) for key in group}
+
+
+def _cache_lookup(cache_file, name, filename, mmap):
+    """ Return the cached value of filename, or None if there is no current entry """
+    if not os.path.isfile(cache_file):
+        return None
+    mtime, size = _stamp(filename)
+    refresh = False
+    try:
+        with h5py.File(cache_file, "r") as f5:
+            if f5.attrs.get("version") != DFNGEN_CACHE_VERSION or name not in f5:
+                return None
+            group = f5[name]
+            if (group.attrs["mtime_ns"], group.attrs["size"]) != (mtime, size):
+                # touched or copied, but possibly unchanged
+                if group.attrs["size"] != size or group.attrs[
+                        "sha1"] != file_sha1(filename):
+                    return None
+                refresh = True
+            value = _read_entry(group, cache_file, mmap and not refresh)
+    except (OSError, KeyError):
+        return None
+    if refresh:
+        try:
+            with h5py.File(cache_file, "a") as f5:
+                f5[name].attrs["mtime_ns"] = mtime
+        except OSError:
+            pass
+    return value
+
+
+def _cache_store(cache_file, name, filename, value):
+    """ Write the parsed value of filename into the cache. Failures (read only directory, file in use) only skip caching """
+    mtime, size = _stamp(filename)
+    try:
+        with h5py.File(cache_file, "a") as f5:
+            if f5.attrs.get("version") != DFNGEN_CACHE_VERSION:
+                for key in list(f5.keys()):
+                    del f5[key]
+                f5.attrs["version"] = DFNGEN_CACHE_VERSION
+            if name in f5:
+                del f5[name]
+            group = f5.create_group(name)
+            if isinstance(value, dict):
+                for key, val in value.items():
+                    group.create_dataset(key, data=val)
+            else:
+                group.create_dataset("data", data=value)
+            group.attrs["mtime_ns"] = mtime
+            group.attrs["size"] = size
+            group.attrs["sha1"] = file_sha1(filename)
+    except OSError as e:
+        local_print_log(
+            f"--> Warning. Could not write dfnGen output cache {cache_file}: {e}",
+            'warning')
+
+
+def load_dfngen_file(filename, kind=None, mmap=False, use_cache=None):
+    """ Parsed contents of a dfnGen output file, taken from the binary cache when it is current
+
+    Parameters
+    ----------
+        filename : string
+            path of the dfnGen output file, e.g., dfnGen_output/intersection_list.dat
+
+        kind : string
+            key of dfngen_parsers. Default is looked up from the file name in dfngen_files.
+
+        mmap : bool
+            If True, arrays are memory mapped from the cache (read only) instead of read into memory
+
+        use_cache : bool
+            If False, the text file is parsed and the cache is neither read nor written. Default is output_cache_enabled.
+
+    Returns
+    -------
+        value : numpy array or dict of numpy arrays
+            output of the parser of the file
+
+    Notes
+    -----
+        The cache is dfnGen_output_cache.h5 in the directory of the file. An entry is current if the modification time and size of the file match, or if the sha1 of the file matches after it was touched. Changed files are parsed again and their entry replaced.
+    """
+    name = os.path.basename(filename)
+    if kind is None:
+        kind = dfngen_files.get(name)
+    if kind not in dfngen_parsers:
+        error = f"Error. Unknown kind of dfnGen output file {filename}.\nExiting\n"
+        local_print_log(error, 'error')
+    if not os.path.isfile(filename):
+        error = f"Error. Cannot find dfnGen output file {filename}.\nExiting\n"
+        local_print_log(error, 'error')
+    if use_cache is None:
+        use_cache = output_cache_enabled
+    parser = dfngen_parsers[kind]
+    if not use_cache:
+        return parser(filename)
+
+    cache_file = os.path.join(os.path.dirname(os.path.abspath(filename)),
+                              dfngen_cache_name)
+    value = _cache_lookup(cache_file, name, filename, mmap)
+    if value is None:
+        value = parser(filename)
+        _cache_store(cache_file, name, filename, value)
+        if mmap:
+            mapped = _cache_lookup(cache_file, name, filename, mmap)
+            if mapped is not None:
+                value = mapped
+    return value
+
+
+def cache_dfngen_output(self, path="."):
+    """ Convert all dfnGen output text files into the binary cache
+
+    Parameters
+    ----------
+        self : object
+            DFN Class
+
+        path : string
+            directory that contains poly_info.dat and dfnGen_output/
+
+    Returns
+    -------
+        None
+
+    Notes
+    -----
+        Only needed to build the cache ahead of time, load_dfngen_file fills it on first use.
+    """
+    self.print_log("--> Caching dfnGen output")
+    for name in dfngen_files.keys():
+        if name == "poly_info.dat":
+            filename = os.path.join(path, name)
+        else:
+            filename = os.path.join(path, "dfnGen_output", name)
+        if os.path.isfile(filename):
+            load_dfngen_file(filename, use_cache=True)
+    self.print_log("--> Caching dfnGen output: Complete")
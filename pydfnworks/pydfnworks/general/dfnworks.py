@@ -75,6 +75,7 @@ class DFNWORKS():
     from pydfnworks.dfnGen.generation.generator import dfn_gen, make_working_directory, create_network
     from pydfnworks.dfnGen.generation.process_generator_output import parse_params_file, gather_dfn_gen_output, assign_hydraulic_properties, grab_polygon_data, compute_fracture_p21
     from pydfnworks.dfnGen.generation.output_report.gen_output import output_report
+    from pydfnworks.general.dfngen_output_cache import cache_dfngen_output
 
     from pydfnworks.dfnGen.generation.hydraulic.dfn_methods import generate_hydraulic_values, set_fracture_hydraulic_values
     from pydfnworks.dfnGen.generation.hydraulic.io import dump_hydraulic_values, dump_aperture, dump_perm, dump_transmissivity, dump_fracture_info
@@ -89,6 +90,7 @@ class DFNWORKS():
     from pydfnworks.dfnGen.meshing.mesh_dfn.mesh_dfn import mesh_network
     from pydfnworks.dfnGen.meshing.mesh_dfn.mesh_dfn_helper import inp2gmv, create_mesh_links, inp2vtk_python, gather_mesh_information
     from pydfnworks.dfnGen.meshing.mesh_dfn.poisson_driver import create_lagrit_parameters_file
+    from pydfnworks.dfnGen.meshing.poisson_disc.poisson_network import poisson_sample_network
     from pydfnworks.dfnGen.meshing.mesh_dfn.lagrit_merge_mesh import create_merge_poly_scripts, create_final_merge_script
     from pydfnworks.dfnGen.meshing.mesh_dfn.run_meshing import mesh_fractures_header,merge_network, check_for_missing_edges
     
@@ -132,9 +134,11 @@ class DFNWORKS():
     # dfnGraph
     import pydfnworks.dfnGraph
     from pydfnworks.dfnGraph.dfn2graph import create_graph, dump_json_graph, load_json_graph, plot_graph, dump_fractures, add_fracture_source, add_fracture_target
+    from pydfnworks.dfnGraph.graph_io import dump_graph, load_graph
     from pydfnworks.dfnGraph.pruning import k_shortest_paths_backbone, greedy_edge_disjoint, current_flow_threshold
-    from pydfnworks.dfnGraph.graph_flow import run_graph_flow, compute_dQ
+    from pydfnworks.dfnGraph.graph_flow import run_graph_flow, run_graph_flow_cases, compute_dQ
     from pydfnworks.dfnGraph.graph_transport import run_graph_transport
+    from pydfnworks.dfnGraph.fracture_properties import get_fracture_properties
 
     def __init__(self,
                  jobname=None,
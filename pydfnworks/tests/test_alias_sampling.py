@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from pydfnworks.dfnGraph.alias_sampling import build_alias_table, build_alias_tables, sample_alias
+
+
+def implied_probabilities(alias_prob, alias, offsets):
+    """ Probability of each outcome under the alias tables of every row """
+    prob = np.zeros(len(alias_prob))
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        n = end - start
+        for i in range(start, end):
+            assert start <= alias[i] < end
+            prob[i] += alias_prob[i] / n
+            prob[alias[i]] += (1.0 - alias_prob[i]) / n
+    return prob
+
+
+def expected_probabilities(weights, offsets):
+    prob = np.zeros(len(weights))
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        total = np.sum(weights[start:end])
+        if total > 0:
+            prob[start:end] = weights[start:end] / total
+        else:
+            prob[start:end] = 1.0 / (end - start)
+    return prob
+
+
+rows = [
+    [1, 2, 3],
+    [0, 1, 2],
+    [2, 2, 2, 2],
+    [1, 3, 1, 3],
+    [4, 1, 4, 1, 5],
+    [3, 1, 2, 2, 2],
+    [0, 0, 5],
+    [0, 0, 0],
+    [7],
+    [0],
+    [0.1, 0.2, 0.3],
+    [1e-12, 1.0, 1e12],
+]
+
+
+@pytest.mark.parametrize("weights", rows)
+def test_single_row(weights):
+    weights = np.array(weights, dtype=float)
+    offsets = [0, len(weights)]
+    alias_prob, alias = build_alias_table(weights)
+    np.testing.assert_allclose(implied_probabilities(alias_prob, alias,
+                                                     offsets),
+                               expected_probabilities(weights, offsets),
+                               atol=1e-12)
+
+
+def test_many_rows():
+    rng = np.random.default_rng(0)
+    parts = list(rows)
+    for _ in range(300):
+        n = int(rng.integers(1, 9))
+        # small integers make ties with the row mean and zero weights common
+        parts.append(rng.integers(0, 4, size=n).tolist())
+        parts.append(rng.pareto(1.0, size=n).tolist())
+    weights = np.concatenate([np.array(p, dtype=float) for p in parts])
+    offsets = np.concatenate(([0], np.cumsum([len(p) for p in parts])))
+    alias_prob, alias = build_alias_tables(weights, offsets)
+    np.testing.assert_allclose(implied_probabilities(alias_prob, alias,
+                                                     offsets),
+                               expected_probabilities(weights, offsets),
+                               atol=1e-12)
+
+
+def test_rows_do_not_share_round_off():
+    # a large surplus in the first row must not change the ties of the second
+    parts = [[1e6, 1.0, 3.0], [0.2, 0.3, 0.4], [1, 2, 3]]
+    weights = np.concatenate([np.array(p, dtype=float) for p in parts])
+    offsets = np.array([0, 3, 6, 9])
+    alias_prob, alias = build_alias_tables(weights, offsets)
+    np.testing.assert_allclose(implied_probabilities(alias_prob, alias,
+                                                     offsets),
+                               expected_probabilities(weights, offsets),
+                               atol=1e-12)
+
+
+def test_zero_weight_is_never_drawn():
+    alias_prob, alias = build_alias_table([0, 1, 2])
+    draws = [
+        sample_alias(alias_prob, alias, xi)
+        for xi in np.linspace(0, 1, 3001, endpoint=False)
+    ]
+    counts = np.bincount(draws, minlength=3)
+    assert counts[0] == 0
+    np.testing.assert_allclose(counts[1:] / len(draws), [1 / 3, 2 / 3],
+                               atol=1e-3)
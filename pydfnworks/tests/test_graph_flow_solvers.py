@@ -0,0 +1,148 @@
+import numpy as np
+import pytest
+import scipy.sparse.linalg
+
+from pydfnworks.dfnGraph.graph_flow import assemble_dirichlet_laplacian
+from pydfnworks.dfnGraph.graph_flow_solvers import solve_pressure, solve_pressure_cases, clear_solver_cache, _solver_cache
+
+num_nodes = 400
+
+
+def random_edges(seed=0, isolated=None):
+    """ Connected graph with conductances over several orders of magnitude. Edges of the node isolated are removed. """
+    rng = np.random.default_rng(seed)
+    # a path keeps the graph connected, random chords add cycles
+    u = np.concatenate((np.arange(num_nodes - 1),
+                        rng.integers(0, num_nodes, 3 * num_nodes)))
+    v = np.concatenate((np.arange(1, num_nodes),
+                        rng.integers(0, num_nodes, 3 * num_nodes)))
+    keep = (u != v) & (u != isolated) & (v != isolated)
+    weight = 10**rng.uniform(-3, 3, len(u))
+    return u[keep], v[keep], weight[keep]
+
+
+def dirichlet_system(u, v, weight, pressures):
+    """ Laplacian, right hand side and boundary mask for the Dirichlet nodes and values in the dict pressures """
+    boundary = np.zeros(num_nodes, dtype=bool)
+    boundary[list(pressures)] = True
+    rhs = np.zeros(num_nodes)
+    rhs[list(pressures)] = list(pressures.values())
+    L = assemble_dirichlet_laplacian(num_nodes, u, v, weight, boundary)
+    return L, rhs, boundary
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    clear_solver_cache()
+    yield
+    clear_solver_cache()
+
+
+@pytest.mark.parametrize("solver,preconditioner", [("direct", None),
+                                                   ("cg", None),
+                                                   ("cg", "jacobi"),
+                                                   ("cg", "ilu"),
+                                                   ("cg", "amg")])
+def test_solve_pressure_matches_spsolve(solver, preconditioner):
+    if preconditioner == "amg":
+        pytest.importorskip("pyamg")
+    L, rhs, boundary = dirichlet_system(*random_edges(), {0: 2.0, -1: 1.0})
+    expected = scipy.sparse.linalg.spsolve(L, rhs)
+    pressure, info = solve_pressure(L,
+                                    rhs,
+                                    boundary,
+                                    solver=solver,
+                                    preconditioner=preconditioner,
+                                    tol=1e-12)
+    np.testing.assert_allclose(pressure, expected, rtol=1e-8)
+    assert info["residual"] < 1e-8
+
+
+def test_solve_pressure_does_not_cache_by_default():
+    L, rhs, boundary = dirichlet_system(*random_edges(), {0: 2.0, -1: 1.0})
+    solve_pressure(L, rhs, boundary)
+    solve_pressure(L, rhs, boundary, solver="cg", preconditioner="jacobi")
+    assert len(_solver_cache) == 0
+
+
+@pytest.mark.parametrize("solver", ["direct", "cg"])
+def test_solve_pressure_reuse(solver):
+    L, rhs, boundary = dirichlet_system(*random_edges(), {0: 2.0, -1: 1.0})
+    first, _ = solve_pressure(L, rhs, boundary, solver=solver, reuse=True)
+    assert len(_solver_cache) == 1
+    second, _ = solve_pressure(L, rhs, boundary, solver=solver, reuse=True)
+    assert len(_solver_cache) == 1
+    np.testing.assert_allclose(first, second, rtol=1e-8)
+
+
+@pytest.mark.parametrize("preconditioner", ["jacobi", "ilu"])
+def test_zero_diagonal_falls_back_to_spsolve(preconditioner):
+    L, rhs, boundary = dirichlet_system(*random_edges(isolated=1), {
+        0: 2.0,
+        -1: 1.0
+    })
+    assert L.diagonal()[1] == 0
+    with pytest.warns(scipy.sparse.linalg.MatrixRankWarning):
+        _, info = solve_pressure(L,
+                                 rhs,
+                                 boundary,
+                                 solver="cg",
+                                 preconditioner=preconditioner)
+    assert info["solver"] == "spsolve"
+    assert info["iterations"] is None
+
+
+@pytest.mark.parametrize("max_schur_nodes,solver,num_factorizations",
+                         [(1000, "schur", 1), (2, "lu", 2)])
+def test_solve_pressure_cases_matches_spsolve(max_schur_nodes, solver,
+                                              num_factorizations):
+    u, v, weight = random_edges()
+    # the last two cases share their Dirichlet nodes
+    cases = [{
+        0: 2.0,
+        num_nodes - 1: 1.0
+    }, {
+        0: 1.0,
+        7: 3.0,
+        200: 0.5
+    }, {
+        0: 0.0,
+        7: 1.0,
+        200: 2.0
+    }]
+    L = assemble_dirichlet_laplacian(num_nodes, u, v, weight,
+                                     np.zeros(num_nodes, dtype=bool))
+    dirichlet = []
+    rhs = []
+    for pressures in cases:
+        _, b, mask = dirichlet_system(u, v, weight, pressures)
+        dirichlet.append(mask)
+        rhs.append(b)
+    pressures, info = solve_pressure_cases(L,
+                                           dirichlet,
+                                           rhs,
+                                           max_schur_nodes=max_schur_nodes)
+    assert info["solver"] == solver
+    assert info["num_factorizations"] == num_factorizations
+    for case, pressure in zip(cases, pressures):
+        expected = scipy.sparse.linalg.spsolve(
+            *dirichlet_system(u, v, weight, case)[:2])
+        np.testing.assert_allclose(pressure, expected, rtol=1e-8)
+    assert np.all(info["residual"] < 1e-8)
+
+
+def test_solve_pressure_cases_same_dirichlet_nodes_factorize_once():
+    u, v, weight = random_edges()
+    L = assemble_dirichlet_laplacian(num_nodes, u, v, weight,
+                                     np.zeros(num_nodes, dtype=bool))
+    dirichlet = []
+    rhs = []
+    for pressures in [{0: 2.0, 5: 1.0}, {0: 1.0, 5: 2.0}]:
+        _, b, mask = dirichlet_system(u, v, weight, pressures)
+        dirichlet.append(mask)
+        rhs.append(b)
+    pressures, info = solve_pressure_cases(L, dirichlet, rhs)
+    assert info["solver"] == "lu"
+    assert info["num_factorizations"] == 1
+    # swapping the boundary pressures mirrors the solution
+    np.testing.assert_allclose(pressures[0] + pressures[1], 3.0, rtol=1e-8)
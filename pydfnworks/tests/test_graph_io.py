@@ -0,0 +1,126 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from pydfnworks.dfnGraph.graph_io import write_graph, read_graph
+
+
+def assert_same_value(a, b):
+    """ Equal and of the same type, element by element for tuples, lists, and dicts """
+    assert type(a) is type(b), (a, b)
+    if isinstance(a, (tuple, list)):
+        assert len(a) == len(b)
+        for x, y in zip(a, b):
+            assert_same_value(x, y)
+    elif isinstance(a, dict):
+        assert list(a) == list(b)
+        for key in a:
+            assert_same_value(a[key], b[key])
+    elif isinstance(a, (float, np.floating)) and np.isnan(a):
+        assert np.isnan(b)
+    else:
+        assert a == b
+
+
+def assert_same_graph(G, H):
+    assert G.is_directed() == H.is_directed()
+    assert_same_value(G.graph, H.graph)
+    assert list(G.nodes) == list(H.nodes)
+    for (n, a), (m, b) in zip(G.nodes(data=True), H.nodes(data=True)):
+        assert_same_value(n, m)
+        assert_same_value(a, b)
+    assert list(G.edges) == list(H.edges)
+    for (_, _, a), (_, _, b) in zip(G.edges(data=True), H.edges(data=True)):
+        assert_same_value(a, b)
+
+
+def intersection_like_graph(directed):
+    """ Graph with the attributes of an intersection graph after graph flow, plus columns of mixed types """
+    rng = np.random.default_rng(0)
+    G = nx.DiGraph(representation="intersection") if directed else nx.Graph(
+        representation="intersection")
+    G.add_node('s', frac=('s', 's'))
+    G.add_node('t', frac=('t', 't'))
+    for i in range(20):
+        G.add_node(i,
+                   frac=(int(rng.integers(1, 5)), int(rng.integers(5, 9))),
+                   x=np.float64(rng.random()),
+                   length=float(rng.random()),
+                   inletflag=bool(i < 3),
+                   label=np.int32(i))
+    G.nodes[0]['frac'] = (1, 's')
+    # a column of integers and floats
+    G.nodes[1]['mixed'] = 2
+    G.nodes[2]['mixed'] = 2.5
+    G.nodes[3]['mixed'] = float('nan')
+    # values only stored as JSON
+    G.nodes[4]['history'] = {'steps': [1, 2.0, None], 'pair': (1, 'a')}
+    G.nodes[5]['history'] = [(1, 2), [3]]
+    nx.add_path(G, ['s'] + list(range(20)) + ['t'])
+    for u, v in G.edges():
+        G.edges[u, v]['perm'] = float(rng.random())
+        G.edges[u, v]['frac'] = int(rng.integers(1, 9))
+        G.edges[u, v]['coords'] = (float(rng.random()), 1.0)
+    G.edges['s', 0]['frac'] = 's'
+    G.edges[3, 4]['coords'] = (0.5, 2)
+    return G
+
+
+@pytest.mark.parametrize("directed", [False, True])
+def test_round_trip(tmp_path, directed):
+    G = intersection_like_graph(directed)
+    write_graph(G, tmp_path / "graph.hdf5")
+    assert_same_graph(G, read_graph(tmp_path / "graph.hdf5"))
+
+
+def test_node_attribute_order(tmp_path):
+    G = nx.Graph()
+    G.add_node(1, z=1.0, a=2.0, m=3)
+    G.add_node(2, m=1, z=0.0)
+    write_graph(G, tmp_path / "graph.hdf5")
+    H = read_graph(tmp_path / "graph.hdf5")
+    assert list(H.nodes[1]) == ['z', 'a', 'm']
+    assert list(H.nodes[2]) == ['z', 'm']
+
+
+def test_empty_graph(tmp_path):
+    G = nx.DiGraph()
+    write_graph(G, tmp_path / "graph.hdf5")
+    assert_same_graph(G, read_graph(tmp_path / "graph.hdf5"))
+
+
+@pytest.mark.parametrize("value", [np.zeros(3), {1: 'a'}, 1 + 2j])
+def test_unsupported_values_raise(tmp_path, value):
+    G = nx.Graph()
+    G.add_node(1, a=value)
+    with pytest.raises(TypeError, match="of 'a'"):
+        write_graph(G, tmp_path / "graph.hdf5")
+
+
+@pytest.mark.parametrize("values,expected", [
+    ([np.float64(1.5), 2.0], [1.5, 2.0]),
+    ([np.int64(1), 2], [1, 2]),
+    ([np.float32(0.5), np.float64(2.0)], [0.5, 2.0]),
+    ([np.bool_(True), False], [True, False]),
+    ([np.int64(1), 's'], [1, 's']),
+    ([(np.int64(1), 2), (3, np.int64(4))], [(1, 2), (3, 4)]),
+    ([(np.float64(0.5), 1.0), (np.int32(3), 's')], [(0.5, 1.0), (3, 's')]),
+    ([{'x': np.float64(1.0)}, [np.int64(2)]], [{'x': 1.0}, [2]]),
+])
+def test_mixed_numpy_and_python_values(tmp_path, values, expected):
+    """ numpy scalars mixed with other values are read back as Python scalars """
+    G = nx.Graph(scale=np.float64(2.0))
+    for i, x in enumerate(values):
+        G.add_node(i, a=x)
+    write_graph(G, tmp_path / "graph.hdf5")
+    H = read_graph(tmp_path / "graph.hdf5")
+    assert_same_value(H.graph, {'scale': 2.0})
+    assert_same_value([H.nodes[i]['a'] for i in H], expected)
+
+
+def test_single_numpy_dtype_is_kept(tmp_path):
+    G = nx.Graph()
+    G.add_node(1, a=np.float32(1.5), b=(np.int64(1), np.int64(2)))
+    G.add_node(2, a=np.float32(2.5), b=(np.int64(3), np.int64(4)))
+    write_graph(G, tmp_path / "graph.hdf5")
+    assert_same_graph(G, read_graph(tmp_path / "graph.hdf5"))
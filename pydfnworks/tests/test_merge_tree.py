@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from pydfnworks.dfnGen.meshing.mesh_dfn.lagrit_merge_mesh import balanced_groups, merge_tree
+
+
+def assert_partition(groups, num_items, max_size):
+    """ Groups are non-empty, hold at most max_size items, and cover every item once, in order """
+    assert all(0 < len(group) <= max_size for group in groups)
+    assert [i for group in groups for i in group] == list(range(num_items))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_balanced_groups_partition(seed):
+    rng = np.random.default_rng(seed)
+    weights = rng.pareto(1.5, size=200)
+    groups = balanced_groups(weights, 25, 8)
+    assert_partition(groups, len(weights), 8)
+    assert len(groups) >= 25
+
+
+def test_balanced_groups_equal_weights():
+    groups = balanced_groups(np.ones(32), 4, 8)
+    assert groups == [list(range(i, i + 8)) for i in range(0, 32, 8)]
+
+
+def test_balanced_groups_heavy_item_alone():
+    weights = np.ones(30)
+    weights[10] = 100.0
+    groups = balanced_groups(weights, 4, 10)
+    assert_partition(groups, len(weights), 10)
+    assert [10] in groups
+
+
+def test_balanced_groups_zero_weights():
+    groups = balanced_groups(np.zeros(10), 3, 4)
+    assert_partition(groups, 10, 4)
+    assert len(groups) == 3
+
+
+@pytest.mark.parametrize("num_frac,fan_in", [(1, 2), (7, 8), (8, 8), (9, 8),
+                                              (100, 2), (1000, 8), (513, 4)])
+def test_merge_tree_reduces_to_final_merge(num_frac, fan_in):
+    rng = np.random.default_rng(num_frac)
+    weights = rng.lognormal(size=num_frac)
+    levels = merge_tree(weights, fan_in)
+    num_items = num_frac
+    for groups in levels:
+        assert_partition(groups, num_items, fan_in)
+        num_items = len(groups)
+    assert len(levels[-1]) <= fan_in
+    # every level but the last has more than fan_in groups
+    assert all(len(groups) > fan_in for groups in levels[:-1])
+
+
+def test_merge_tree_depth_is_logarithmic():
+    levels = merge_tree(np.ones(4096), 8)
+    assert [len(groups) for groups in levels] == [512, 64, 8]
+
+
+def test_merge_tree_fan_in_below_two_exits():
+    with pytest.raises(SystemExit):
+        merge_tree(np.ones(4), 1)
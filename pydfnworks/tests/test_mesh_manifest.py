@@ -0,0 +1,159 @@
+import json
+import os
+import types
+
+import pytest
+
+from pydfnworks.dfnGen.meshing.mesh_dfn import mesh_manifest as mm
+from pydfnworks.dfnGen.meshing.mesh_dfn import run_meshing
+
+num_frac = 3
+digits = 1
+
+
+def write(filename, text):
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    with open(filename, "w") as fp:
+        fp.write(text)
+
+
+def read(filename):
+    with open(filename) as fp:
+        return fp.read()
+
+
+@pytest.fixture
+def network(tmp_path, monkeypatch):
+    """ Run directory with the inputs of three fractures, and a stand-in for the LaGriT runs that records which fractures were meshed """
+    monkeypatch.chdir(tmp_path)
+    write("user_resolution.mlgi", "resolution\n")
+    for i in range(1, num_frac + 1):
+        write(f"polys/poly_{i}.inp", f"poly {i}\n")
+        write(f"intersections/intersections_{i}.inp", f"intersections {i}\n")
+        write(f"lagrit_scripts/parameters_{i}.mlgi", f"parameters {i}\n")
+        write(f"lagrit_scripts/mesh_poly_{i}.lgi", f"mesh_poly {i}\n")
+
+    meshed = []
+    # error index of each fracture, by default every fracture succeeds
+    status = {}
+
+    def mesh_fractures(fracture_list, ncpu, visual_mode, num_frac, r_fram,
+                       quiet, record):
+        results = {}
+        for i in fracture_list:
+            meshed.append(i)
+            params = read(f"lagrit_scripts/parameters_{i}.mlgi")
+            results[i] = status.get((i, params), 0)
+            if results[i] == 0:
+                write(mm.mesh_file_name(i, digits), f"mesh of {params}")
+            record(i, results[i])
+        return results
+
+    monkeypatch.setattr(run_meshing, "_mesh_fractures", mesh_fractures)
+
+    def create_lagrit_parameters_file(fracture_id, index, digits, slope,
+                                      intercept, max_resolution_factor):
+        write(f"lagrit_scripts/parameters_{fracture_id}.mlgi",
+              f"relaxed {fracture_id}\n")
+
+    dfn = types.SimpleNamespace(
+        print_log=lambda *args, **kwargs: None,
+        num_frac=num_frac,
+        fracture_list=list(range(1, num_frac + 1)),
+        h=0.1,
+        visual_mode=False,
+        r_fram=False,
+        ncpu=1,
+        create_lagrit_parameters_file=create_lagrit_parameters_file)
+    return dfn, meshed, status
+
+
+def mesh(dfn, **kwargs):
+    return run_meshing.mesh_fractures_header(dfn,
+                                             slope=0.5,
+                                             intercept=0.1,
+                                             max_resolution_factor=4,
+                                             **kwargs)
+
+
+def test_rerun_skips_current_fractures(network):
+    dfn, meshed, _ = network
+    assert not mesh(dfn)
+    assert meshed == [1, 2, 3]
+    meshed.clear()
+    assert not mesh(dfn)
+    assert meshed == []
+
+
+def test_rerun_meshes_changed_inputs(network):
+    dfn, meshed, _ = network
+    mesh(dfn)
+    meshed.clear()
+    write("polys/poly_2.inp", "poly 2 changed\n")
+    mesh(dfn)
+    assert meshed == [2]
+    meshed.clear()
+    # a different meshing parameter changes every fracture
+    run_meshing.mesh_fractures_header(dfn,
+                                      slope=0.5,
+                                      intercept=0.2,
+                                      max_resolution_factor=4)
+    assert meshed == [1, 2, 3]
+
+
+def test_rerun_meshes_changed_or_missing_mesh(network):
+    dfn, meshed, _ = network
+    mesh(dfn)
+    meshed.clear()
+    write(mm.mesh_file_name(1, digits), "edited mesh, longer than before\n")
+    os.remove(mm.mesh_file_name(3, digits))
+    mesh(dfn)
+    assert meshed == [1, 3]
+
+
+def test_resume_false_meshes_everything(network):
+    dfn, meshed, _ = network
+    mesh(dfn)
+    meshed.clear()
+    mesh(dfn, resume=False)
+    assert meshed == [1, 2, 3]
+
+
+def test_failed_fracture_is_meshed_again(network):
+    dfn, meshed, status = network
+    status[(2, "parameters 2\n")] = -4
+    assert mesh(dfn, retry_relaxed=False)
+    assert meshed == [1, 2, 3]
+    assert mm.read_mesh_manifest()[2]["status"] == -4
+    meshed.clear()
+    del status[(2, "parameters 2\n")]
+    assert not mesh(dfn)
+    assert meshed == [2]
+
+
+def test_relaxed_retry_restores_parameters(network):
+    dfn, meshed, status = network
+    status[(2, "parameters 2\n")] = -4
+    assert not mesh(dfn)
+    assert meshed == [1, 2, 3, 2]
+    # the retry meshed with the relaxed parameters, the original file is back
+    assert read(mm.mesh_file_name(2, digits)) == "mesh of relaxed 2\n"
+    assert read("lagrit_scripts/parameters_2.mlgi") == "parameters 2\n"
+    entry = mm.read_mesh_manifest()[2]
+    assert entry["status"] == 0 and entry["relaxed"]
+    # the relaxed mesh is current for the recorded inputs
+    meshed.clear()
+    assert not mesh(dfn)
+    assert meshed == []
+
+
+def test_manifest_ignores_cut_off_lines_and_other_versions(network):
+    dfn, _, _ = network
+    mesh(dfn)
+    with open(mm.mesh_manifest_name, "a") as fp:
+        fp.write('{"fracture_id": 1, "inp')
+    assert sorted(mm.read_mesh_manifest()) == [1, 2, 3]
+    lines = read(mm.mesh_manifest_name).splitlines()
+    lines[0] = json.dumps({"version": mm.MESH_MANIFEST_VERSION + 1})
+    write(mm.mesh_manifest_name, "\n".join(lines) + "\n")
+    assert mm.read_mesh_manifest() == {}
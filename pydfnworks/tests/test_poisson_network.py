@@ -0,0 +1,71 @@
+import h5py
+import numpy as np
+import pytest
+
+from pydfnworks.dfnGen.meshing.poisson_disc.poisson_network import PoissonPointsWriter, write_poisson_points, read_poisson_points, schedule_by_area
+
+
+def point_sets(seed=0):
+    rng = np.random.default_rng(seed)
+    fracture_ids = [4, 1, 7, 2]
+    # fracture 7 has no points
+    points = [rng.random((n, 3)) for n in [5, 130, 0, 17]]
+    runtimes = [0.5, 2.0, 0.0, 1.25]
+    return fracture_ids, points, runtimes
+
+
+def test_round_trip(tmp_path):
+    filename = tmp_path / "points.h5"
+    fracture_ids, points, runtimes = point_sets()
+    write_poisson_points(filename, fracture_ids, points, runtimes)
+    result = read_poisson_points(filename)
+    assert list(result) == fracture_ids
+    for fid, p in zip(fracture_ids, points):
+        np.testing.assert_array_equal(result[fid], p)
+        np.testing.assert_array_equal(read_poisson_points(filename, fid), p)
+
+
+def test_writer_appends_in_arrival_order(tmp_path):
+    filename = tmp_path / "points.h5"
+    fracture_ids, points, runtimes = point_sets()
+    # a chunk smaller than one point set
+    with PoissonPointsWriter(filename, chunk_size=8) as writer:
+        for fid, p, t in zip(fracture_ids, points, runtimes):
+            writer.append(fid, p, t)
+    with h5py.File(filename, "r") as f5:
+        np.testing.assert_array_equal(f5["fracture_id"][()], fracture_ids)
+        np.testing.assert_array_equal(f5["time"][()], runtimes)
+        np.testing.assert_array_equal(f5["offsets"][()],
+                                      np.cumsum([0] + [len(p) for p in points]))
+        np.testing.assert_array_equal(f5["index"][()],
+                                      [-1, 1, 3, -1, 0, -1, -1, 2])
+
+
+def test_empty_file(tmp_path):
+    filename = tmp_path / "points.h5"
+    write_poisson_points(filename, [], [], [])
+    assert read_poisson_points(filename) == {}
+
+
+def test_missing_fracture_exits(tmp_path):
+    filename = tmp_path / "points.h5"
+    write_poisson_points(filename, *point_sets())
+    with pytest.raises(SystemExit):
+        read_poisson_points(filename, 3)
+    with pytest.raises(SystemExit):
+        read_poisson_points(filename, 100)
+
+
+def test_unfinished_file_is_rejected(tmp_path):
+    filename = tmp_path / "points.h5"
+    fracture_ids, points, runtimes = point_sets()
+    with pytest.raises(RuntimeError):
+        with PoissonPointsWriter(filename) as writer:
+            writer.append(fracture_ids[0], points[0], runtimes[0])
+            raise RuntimeError("sampling failed")
+    with pytest.raises(SystemExit):
+        read_poisson_points(filename)
+
+
+def test_schedule_by_area():
+    assert schedule_by_area([1, 2, 3, 4], [1.0, 3.0, 1.0, 2.0]) == [2, 4, 1, 3]
@@ -0,0 +1,97 @@
+import random
+
+import numpy as np
+import pytest
+
+from pydfnworks.dfnGen.meshing.poisson_disc import poisson_class as pc
+from pydfnworks.dfnGen.meshing.poisson_disc import poisson_functions as pf
+
+params = {
+    "h": 0.25,
+    "R": 40,
+    "A": 0.1,
+    "F": 1,
+    "concurrent_samples": 10,
+    "grid_size": 2,
+    "well_flag": False
+}
+
+
+def write_fracture(radius=5.0, num_vertices=7):
+    """ Polygon and intersections of fracture 1 in the current directory, in the format written by dfnGen """
+    angle = np.linspace(0, 2 * np.pi, num_vertices, endpoint=False) + 0.3
+    vertices = radius * np.column_stack((np.cos(angle), np.sin(angle)))
+    with open("polys/poly_1.inp", "w") as fp:
+        fp.write(f"{num_vertices} 0 0 0 0\n")
+        for i, (x, y) in enumerate(vertices):
+            fp.write(f"{i + 1} {x} {y} 0.0\n")
+    # a long, a short, a vertical, and a horizontal intersection, as
+    # polylines of several points
+    lines = [((-3.0, -2.0), (3.0, 1.5), 5), ((1.0, -1.0), (1.6, -0.7), 2),
+             ((-1.0, -3.0), (-1.0, 2.5), 4), ((-2.5, 3.0), (2.0, 3.0), 3)]
+    points = []
+    labels = []
+    segments = []
+    for label, (a, b, num_points) in enumerate(lines, start=1):
+        first = len(points) + 1
+        for t in np.linspace(0, 1, num_points):
+            points.append(np.array(a) + t * (np.array(b) - np.array(a)))
+            labels.append(label)
+        segments += [(k, k + 1) for k in range(first, first + num_points - 1)]
+    with open("intersections/intersections_1.inp", "w") as fp:
+        fp.write(f"{len(points)} {len(segments)} 2 0 0\n")
+        for i, (x, y) in enumerate(points):
+            fp.write(f"{i + 1} {x} {y} 0.0\n")
+        for i, (a, b) in enumerate(segments):
+            fp.write(f"{i + 1} 1 line {a} {b}\n")
+        fp.write("2 1 1\nb_a, integer\nfrac_id, integer\n")
+        for i, label in enumerate(labels):
+            fp.write(f"{i + 1} 1 {label}\n")
+    return vertices
+
+
+def seed(value):
+    random.seed(value)
+    np.random.seed(value)
+
+
+@pytest.mark.parametrize("trial", range(3))
+def test_sample_fracture(tmp_path, monkeypatch, trial):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "polys").mkdir()
+    (tmp_path / "intersections").mkdir()
+    vertices = write_fracture()
+    seed(trial)
+    points, _ = pf.sample_fracture(1, params)
+    X = points[:, :2]
+
+    # the same initial nodes, to look up the exclusion radii and to tell the
+    # nodes placed along the boundary and the intersections from the others
+    seed(trial)
+    c = pc.Poisson_Variables(1, "polys/poly_1.inp",
+                             "intersections/intersections_1.inp",
+                             params["h"], params["R"], params["A"],
+                             params["F"], params["concurrent_samples"],
+                             params["grid_size"], params["well_flag"])
+    pf.main_init(c)
+    num_initial = c.no_of_nodes
+    np.testing.assert_array_equal(X[:num_initial],
+                                  c.coordinates[:num_initial, :2])
+    assert len(X) > 10 * num_initial
+
+    ex_rad = pf.exclusion_radii(c, X)
+    dist = np.sqrt(((X[:, None, :] - X[None, :, :])**2).sum(axis=2))
+    np.fill_diagonal(dist, np.inf)
+    ratio = dist / np.minimum(ex_rad[:, None], ex_rad[None, :])
+    sampled = np.arange(len(X)) >= num_initial
+    assert ratio[sampled].min() >= 1 - 1e-9
+    # nodes along a line are spaced by the exclusion radius of the node
+    # before them, which is up to a few percent smaller where the radius
+    # grows along the line
+    assert ratio[~sampled][:, ~sampled].min() >= 1 - 2 * params["A"]
+
+    # every node is inside the (counterclockwise, convex) polygon
+    edge = np.roll(vertices, -1, axis=0) - vertices
+    rel = X[:, None, :] - vertices[None, :, :]
+    cross = edge[None, :, 0] * rel[:, :, 1] - edge[None, :, 1] * rel[:, :, 0]
+    assert cross.min() >= -1e-9
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from pydfnworks.dfnGen.meshing.poisson_disc.segment_index import SegmentGrid
+
+
+def brute_force_distance_sq(X, start, end):
+    """ Square distance from every point to every segment """
+    d = (end - start)[None, :, :]
+    to_start = X[:, None, :] - start[None, :, :]
+    length_sq = np.broadcast_to((d * d).sum(axis=2), (len(X), len(start)))
+    t = np.divide((to_start * d).sum(axis=2),
+                  length_sq,
+                  out=np.zeros(length_sq.shape),
+                  where=length_sq > 0)
+    q = to_start - np.clip(t, 0, 1)[:, :, None] * d
+    return (q * q).sum(axis=2)
+
+
+def random_segments(rng, n):
+    """ Short, long, vertical, horizontal, and degenerate segments """
+    start = rng.uniform(-10, 10, (n, 2))
+    kind = rng.integers(0, 5, n)
+    length = np.where(kind == 1, rng.uniform(5, 30, n), rng.uniform(0, 2, n))
+    angle = rng.uniform(0, 2 * np.pi, n)
+    angle[kind == 2] = np.pi / 2
+    angle[kind == 3] = 0.0
+    end = start + length[:, None] * np.column_stack(
+        (np.cos(angle), np.sin(angle)))
+    end[kind == 4] = start[kind == 4]
+    # vertical and horizontal segments keep one coordinate exactly
+    end[kind == 2, 0] = start[kind == 2, 0]
+    end[kind == 3, 1] = start[kind == 3, 1]
+    return start, end
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    start, end = random_segments(rng, int(rng.integers(1, 40)))
+    # points on, near, and far outside the segments
+    X = np.vstack((rng.uniform(-25, 25, (int(rng.integers(1, 200)), 2)),
+                   start[:5], end[:5]))
+    cell_size = [None, rng.uniform(0.05, 5.0)][seed % 2]
+    grid = SegmentGrid(start, end, cell_size=cell_size)
+    expected = brute_force_distance_sq(X, start, end)
+    if seed % 3 == 0:
+        max_distance = None
+        closest = expected.min(axis=1)
+    else:
+        max_distance = rng.uniform(0.01, 8.0)
+        closest = expected.min(axis=1)
+        closest[closest > max_distance**2] = np.inf
+
+    dist_sq, segment = grid.nearest(X, max_distance=max_distance)
+    found = np.isfinite(closest)
+    np.testing.assert_array_equal(np.isfinite(dist_sq), found)
+    np.testing.assert_allclose(dist_sq[found], closest[found], atol=1e-9)
+    assert np.all(segment[~found] == -1)
+    # ties may give any of the closest segments
+    np.testing.assert_allclose(expected[found, segment[found]],
+                               closest[found],
+                               atol=1e-9)
+    only_dist_sq = grid.distance_sq(X, max_distance=max_distance)
+    np.testing.assert_array_equal(np.isfinite(only_dist_sq), found)
+    np.testing.assert_allclose(only_dist_sq[found], closest[found], atol=1e-9)
+
+
+def test_no_segments():
+    grid = SegmentGrid(np.zeros((0, 2)), np.zeros((0, 2)))
+    dist_sq, segment = grid.nearest(np.ones((3, 2)))
+    assert np.all(np.isinf(dist_sq)) and np.all(segment == -1)
+    assert np.all(np.isinf(grid.distance_sq(np.ones((3, 2)), 1.0)))
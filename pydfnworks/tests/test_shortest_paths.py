@@ -0,0 +1,68 @@
+from itertools import islice
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from pydfnworks.dfnGraph.shortest_paths import yen_k_shortest_paths
+
+
+def random_graph(directed, weighted, seed):
+    """ Connected random graph with integer weights, including zeros, so paths of equal length are common """
+    rng = np.random.default_rng(seed)
+    G = nx.gnm_random_graph(40, 120, seed=seed, directed=directed)
+    nx.add_path(G, range(40))
+    if weighted:
+        for u, v in G.edges():
+            G.edges[u, v]['weight'] = int(rng.integers(0, 5))
+    return G
+
+
+def path_length(G, path, weight):
+    return sum(G.edges[u, v][weight] for u, v in zip(path[:-1], path[1:]))
+
+
+@pytest.mark.parametrize("directed", [False, True])
+@pytest.mark.parametrize("weight", [None, "weight"])
+@pytest.mark.parametrize("seed", range(3))
+def test_yen_matches_networkx(directed, weight, seed):
+    G = random_graph(directed, weight is not None, seed)
+    k = 25
+    expected = list(
+        islice(nx.shortest_simple_paths(G, 0, 39, weight=weight), k))
+    paths = yen_k_shortest_paths(G, k, 0, 39, weight=weight)
+    assert len(paths) == len(expected)
+    # equal length paths may come in a different order
+    if weight is None:
+        nx.set_edge_attributes(G, 1, "weight")
+    assert [path_length(G, p, "weight") for p in paths
+            ] == [path_length(G, p, "weight") for p in expected]
+    for path in paths:
+        assert path[0] == 0 and path[-1] == 39
+        assert len(set(path)) == len(path)
+        assert nx.is_path(G, path)
+    assert len(set(map(tuple, paths))) == len(paths)
+
+
+def test_yen_returns_every_path_of_a_small_graph():
+    G = nx.Graph()
+    nx.add_path(G, ['s', 1, 2, 't'])
+    nx.add_path(G, ['s', 3, 't'])
+    G.add_edge(1, 3)
+    paths = yen_k_shortest_paths(G, 10, 's', 't')
+    assert set(map(tuple, paths)) == set(
+        map(tuple, nx.all_simple_paths(G, 's', 't')))
+
+
+def test_yen_parallel_matches_serial():
+    G = random_graph(False, True, 7)
+    serial = yen_k_shortest_paths(G, 30, 0, 39, weight="weight")
+    parallel = yen_k_shortest_paths(G, 30, 0, 39, weight="weight", ncpu=2)
+    assert serial == parallel
+
+
+def test_yen_no_path():
+    G = nx.Graph()
+    G.add_edge('s', 1)
+    G.add_edge(2, 't')
+    assert yen_k_shortest_paths(G, 5, 's', 't') == []